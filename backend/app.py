@@ -1,52 +1,106 @@
 import os
 
-from flask import Flask, g
+from flask import Flask, Response, g, request
 from loguru import logger
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from backend.db.engines import (
+    DATABASE_READ_URL,
+    SAFE_METHODS,
+    create_read_engine,
+    pin_reads_to_primary,
+    reads_pinned_to_primary,
+)
 from backend.logging_config import setup_logging
-from backend.models.base import Base
-from backend.models.journal import JournalEntry  # noqa: F401 – ensures table is created
+from backend.metrics import DB_SESSIONS, init_metrics, instrument_engine as instrument_engine_metrics
+from backend.migrations import migrate
+from backend.profiling import init_profiling
+from backend.query_inspector import (
+    QUERY_INSPECTOR,
+    finish_request_log,
+    instrument_engine,
+    start_request_log,
+)
+from backend.routes.batch import batch_bp
 from backend.routes.journal import journal_bp
 from backend.routes.user import user_bp
 from backend.routes.waypoint import waypoint_bp
+from backend.tracing import init_tracing
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///branch.db")
 
-engine = create_engine(DATABASE_URL, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+def create_app(database_url: str | None = None, read_database_url: str | None = None) -> Flask:
+    """Build the Flask app with its own engines; nothing touches the database at import time.
 
-def create_app() -> Flask:
+    The primary engine and session factory are exposed as app.extensions["db_engine"]
+    and app.extensions["db_sessionmaker"] for scripts, and the read side as
+    "db_read_engine" / "db_read_sessionmaker" (the primary ones when no read URL is
+    configured). Serve with e.g. `gunicorn "backend.app:create_app()"`.
+    """
     setup_logging()
     app = Flask(__name__)
 
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database schema ensured.")
+    engine = create_engine(database_url or DATABASE_URL, future=True)
+    session_local = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    app.extensions["db_engine"] = engine
+    app.extensions["db_sessionmaker"] = session_local
+
+    instrument_engine(engine)
+    migrate(engine)
+
+    read_url = read_database_url or DATABASE_READ_URL
+    if read_url:
+        read_engine = create_read_engine(read_url)
+        read_session_local = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+        instrument_engine(read_engine)
+        instrument_engine_metrics(read_engine, pool_name="db_read")
+    else:
+        read_engine, read_session_local = engine, session_local
+    app.extensions["db_read_engine"] = read_engine
+    app.extensions["db_read_sessionmaker"] = read_session_local
 
     @app.before_request
     def open_db_session() -> None:
-        """Create a database session for the request."""
-        g.db = SessionLocal()
+        """Create a database session for the request, on the read engine for read-only routes."""
+        view = app.view_functions.get(request.endpoint or "")
+        if read_url and getattr(view, "read_only", False):
+            pinned = reads_pinned_to_primary(request)
+            g.db = session_local() if pinned else read_session_local()
+            DB_SESSIONS.labels("pinned" if pinned else "read").inc()
+        else:
+            g.db = session_local()
+            DB_SESSIONS.labels("primary").inc()
+        if QUERY_INSPECTOR:
+            start_request_log()
+
+    @app.after_request
+    def pin_after_write(response: Response) -> Response:
+        """After a successful mutation, keep this client's reads on the primary for a while."""
+        if read_url and request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_reads_to_primary(response)
+        return response
 
     @app.teardown_request
     def close_db_session(exception: BaseException | None) -> None:
         """Close request session and roll back on errors."""
         session = g.pop("db", None)
-        if session is None:
-            return
-        if exception:
-            logger.warning("Request failed; rolling back session.")
-            session.rollback()
-        session.close()
+        if session is not None:
+            if exception:
+                logger.warning("Request failed; rolling back session.")
+                session.rollback()
+            session.close()
+        if QUERY_INSPECTOR:
+            finish_request_log(request.endpoint or "unmatched")
 
+    init_metrics(app, engine)
+    init_profiling(app)
+    init_tracing(app)
     app.register_blueprint(user_bp)
     app.register_blueprint(waypoint_bp)
     app.register_blueprint(journal_bp)
+    app.register_blueprint(batch_bp)
     logger.info("Registered API blueprints.")
 
     return app
-
-
-app = create_app()
@@ -0,0 +1,76 @@
+"""Read/write engine split: read-only routes on a replica, with read-your-writes stickiness.
+
+Set DATABASE_READ_URL to a replica (e.g. a MySQL read replica) or to a second
+URL for the same SQLite file; its connections are made read-only at the
+database level, so a stray write fails instead of diverging from the primary.
+Routes marked `@read_only` get a session on the read engine; every other route,
+and every route when no read URL is configured, uses the primary.
+
+Replicas lag, so a client that just changed something must not read the old
+state back. Any successful mutating request sets a short-lived cookie, and
+while it is valid that client's reads go to the primary too.
+"""
+
+import os
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+from flask import Request, Response
+from sqlalchemy import Engine, create_engine, event
+
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")  # unset: reads use the primary
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+
+STICKY_COOKIE = "branch_read_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Statement run on each new read connection to refuse writes for its lifetime.
+_READ_ONLY_SQL = {
+    "sqlite": "PRAGMA query_only = ON",
+    "mysql": "SET SESSION TRANSACTION READ ONLY",
+    "postgresql": "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY",
+}
+
+F = TypeVar("F", bound=Callable)
+
+
+def read_only(view: F) -> F:
+    """Mark a route as never writing, so it may be served from the read engine."""
+    view.read_only = True  # type: ignore[attr-defined]
+    return view
+
+
+def create_read_engine(url: str) -> Engine:
+    """Create an engine whose connections reject writes where the dialect allows it."""
+    engine = create_engine(url, future=True)
+    statement = _READ_ONLY_SQL.get(engine.dialect.name)
+    if statement:
+
+        @event.listens_for(engine, "connect")
+        def _read_only_connection(dbapi_conn, _record) -> None:
+            cursor = dbapi_conn.cursor()
+            cursor.execute(statement)
+            cursor.close()
+
+    return engine
+
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    """Whether this client wrote recently enough that a replica might not show it yet."""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_reads_to_primary(response: Response) -> None:
+    """Send this client's reads to the primary for READ_AFTER_WRITE_SECONDS."""
+    until = time.time() + READ_AFTER_WRITE_SECONDS
+    response.set_cookie(
+        STICKY_COOKIE,
+        f"{until:.3f}",
+        max_age=int(READ_AFTER_WRITE_SECONDS) + 1,
+        httponly=True,
+        samesite="Lax",
+    )
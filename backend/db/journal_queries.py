@@ -1,34 +1,188 @@
 """Database query helpers for journal entries."""
 
+import re
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from backend.models.journal import JournalEntry
 
 
+def _insert_if_absent(session: Session, values: dict):
+    """Build an INSERT that silently keeps the existing row on a (user, waypoint) conflict."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert(JournalEntry).values(**values).on_conflict_do_nothing(
+            index_elements=["user_id", "waypoint_id"]
+        )
+    if dialect == "mysql":
+        return mysql_insert(JournalEntry).values(**values).prefix_with("IGNORE")
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(JournalEntry).values(**values).on_conflict_do_nothing(
+            index_elements=["user_id", "waypoint_id"]
+        )
+    return insert(JournalEntry).values(**values)
+
+
 def create_journal_entry(
-    session: Session, waypoint_id: int, user_id: int, content: str
-) -> JournalEntry:
-    """Create a journal entry for a (user, waypoint) pair. Idempotent: returns existing if found."""
-    existing = (
-        session.query(JournalEntry)
-        .filter(JournalEntry.waypoint_id == waypoint_id, JournalEntry.user_id == user_id)
-        .first()
-    )
-    if existing:
-        return existing
-    entry = JournalEntry(waypoint_id=waypoint_id, user_id=user_id, content=content)
-    session.add(entry)
-    session.commit()
-    session.refresh(entry)
-    return entry
+    session: Session, waypoint_id: int, user_id: int, content: str, commit: bool = True
+) -> JournalEntry | None:
+    """Create a journal entry for a (user, waypoint) pair. Idempotent: returns existing if found.
+
+    The insert and the conflict check are one statement against the unique
+    (user_id, waypoint_id) index, so concurrent saves cannot create duplicates.
+    Returns None if no row exists afterwards: MySQL's INSERT IGNORE also skips
+    rows whose user or waypoint does not exist.
+    """
+    values = {"waypoint_id": waypoint_id, "user_id": user_id, "content": content}
+    session.execute(_insert_if_absent(session, values))
+    if commit:
+        session.commit()
+    return get_journal_entry(session, waypoint_id, user_id)
+
+
+def bulk_create_journal_entries(
+    session: Session, user_id: int, contents: dict[int, str], commit: bool = True
+) -> None:
+    """Insert one entry per {waypoint_id: content} for a user in a single executemany."""
+    if contents:
+        session.execute(
+            insert(JournalEntry),
+            [
+                {"waypoint_id": waypoint_id, "user_id": user_id, "content": content}
+                for waypoint_id, content in contents.items()
+            ],
+        )
+    if commit:
+        session.commit()
+    else:
+        session.flush()
 
 
 def get_journal_entry(
     session: Session, waypoint_id: int, user_id: int
 ) -> JournalEntry | None:
     """Return the journal entry for a (user, waypoint) pair, or None if not found."""
-    return (
-        session.query(JournalEntry)
-        .filter(JournalEntry.waypoint_id == waypoint_id, JournalEntry.user_id == user_id)
-        .first()
-    )
+    return session.scalars(
+        select(JournalEntry).where(
+            JournalEntry.user_id == user_id, JournalEntry.waypoint_id == waypoint_id
+        )
+    ).first()
+
+
+def list_journal_entries(
+    session: Session,
+    user_id: int,
+    waypoint_ids: list[int] | None = None,
+    after_waypoint_id: int | None = None,
+    limit: int = 100,
+) -> list[JournalEntry]:
+    """Return up to `limit` of a user's entries ordered by waypoint ID, after the cursor.
+
+    Walks the (user_id, waypoint_id) unique index, so each page is a range scan
+    regardless of how many pages precede it.
+    """
+    query = select(JournalEntry).where(JournalEntry.user_id == user_id)
+    if waypoint_ids is not None:
+        query = query.where(JournalEntry.waypoint_id.in_(waypoint_ids))
+    if after_waypoint_id is not None:
+        query = query.where(JournalEntry.waypoint_id > after_waypoint_id)
+    return list(session.scalars(query.order_by(JournalEntry.waypoint_id.asc()).limit(limit)))
+
+
+SEARCH_MAX_TERMS = 8
+SNIPPET_WORDS = 12
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _search_terms(query: str) -> list[str]:
+    """Lower-cased word tokens of a free-text query; operators and punctuation are dropped."""
+    return [term.lower() for term in _WORD.findall(query)][:SEARCH_MAX_TERMS]
+
+
+def _snippet(content: str, terms: list[str], words: int = SNIPPET_WORDS) -> str:
+    """Return about `words` words around the first term match, matches wrapped in [ ]."""
+    tokens = content.split()
+
+    def matches(token: str) -> bool:
+        word = "".join(_WORD.findall(token)).lower()
+        return any(word.startswith(term) for term in terms)
+
+    first = next((i for i, token in enumerate(tokens) if matches(token)), 0)
+    start = max(0, first - words // 3)
+    end = min(len(tokens), start + words)
+    shown = [f"[{token}]" if matches(token) else token for token in tokens[start:end]]
+    return ("…" if start > 0 else "") + " ".join(shown) + ("…" if end < len(tokens) else "")
+
+
+def search_journal_entries(session: Session, user_id: int, query: str, limit: int = 20) -> list[dict]:
+    """
+    Rank a user's journal entries against a free-text query.
+
+    Every word must match; the last one also matches as a prefix, so results
+    update while the user types. SQLite uses the journal_fts FTS5 index (BM25
+    ranking, native snippets), MySQL the FULLTEXT index in boolean mode; other
+    dialects fall back to LIKE with unranked results.
+
+    Parameters
+    ----------
+    session : Session
+        Active database session.
+    user_id : int
+        Only this user's entries are searched.
+    query : str
+        Free text, e.g. "that ramen place".
+    limit : int, optional
+        Maximum number of results (default: 20).
+
+    Returns
+    -------
+    list[dict]
+        {"waypoint_id", "snippet", "score"} dicts, best match first. Matched
+        words in the snippet are wrapped in square brackets.
+    """
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    dialect = session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        rows = session.execute(
+            text(
+                "SELECT e.waypoint_id, snippet(journal_fts, 0, '[', ']', '…', :words) AS snippet, "
+                "bm25(journal_fts) AS rank "
+                "FROM journal_fts JOIN journal_entries e ON e.id = journal_fts.rowid "
+                "WHERE journal_fts MATCH :match AND e.user_id = :user_id "
+                "ORDER BY rank LIMIT :limit"
+            ),
+            {"match": match, "user_id": user_id, "limit": limit, "words": SNIPPET_WORDS},
+        ).all()
+        return [{"waypoint_id": row.waypoint_id, "snippet": row.snippet, "score": -row.rank} for row in rows]
+
+    if dialect == "mysql":
+        # InnoDB skips stopwords and words shorter than innodb_ft_min_token_size (3).
+        against = " ".join(f"+{term}" for term in terms) + "*"
+        rows = session.execute(
+            text(
+                "SELECT waypoint_id, content, MATCH(content) AGAINST (:against IN BOOLEAN MODE) AS score "
+                "FROM journal_entries "
+                "WHERE user_id = :user_id AND MATCH(content) AGAINST (:against IN BOOLEAN MODE) "
+                "ORDER BY score DESC LIMIT :limit"
+            ),
+            {"against": against, "user_id": user_id, "limit": limit},
+        ).all()
+        return [
+            {"waypoint_id": row.waypoint_id, "snippet": _snippet(row.content, terms), "score": float(row.score)}
+            for row in rows
+        ]
+
+    fallback = select(JournalEntry).where(JournalEntry.user_id == user_id)
+    for term in terms:
+        fallback = fallback.where(JournalEntry.content.ilike(f"%{term}%"))
+    entries = session.scalars(fallback.order_by(JournalEntry.waypoint_id).limit(limit))
+    return [{"waypoint_id": entry.waypoint_id, "snippet": _snippet(entry.content, terms), "score": 0.0} for entry in entries]
@@ -1,7 +1,10 @@
 """Database query helpers for users."""
 
+import sys
+
 from sqlalchemy.orm import Session
 
+from backend.events import queue_tree_event
 from backend.models.user import User
 
 
@@ -10,9 +13,32 @@ def get_user(session: Session, user_id: int) -> User | None:
     return session.query(User).filter(User.id == user_id).first()
 
 
-def list_users(session: Session) -> list[User]:
-    """Return all users sorted by ID."""
-    return session.query(User).order_by(User.id.asc()).all()
+def list_users(session: Session, after_id: int | None = None, limit: int = 100) -> list[User]:
+    """Return up to `limit` users with ID greater than `after_id`, sorted by ID."""
+    query = session.query(User)
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    return query.order_by(User.id.asc()).limit(limit).all()
+
+
+def search_users_by_prefix(
+    session: Session, prefix: str, after_username: str | None = None, limit: int = 100
+) -> list[User]:
+    """Return up to `limit` users whose username starts with `prefix`, sorted by username.
+
+    The prefix becomes a half-open range on username, so the lookup is a range
+    scan of its unique index that stops after `limit` rows; the LIKE only
+    rechecks rows inside that range. Matching follows the column's collation
+    (case-sensitive on SQLite).
+    """
+    query = session.query(User).filter(
+        User.username >= prefix, User.username.startswith(prefix, autoescape=True)
+    )
+    if ord(prefix[-1]) < sys.maxunicode:  # A prefix ending in U+10FFFF has no next code point.
+        query = query.filter(User.username < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    if after_username is not None:
+        query = query.filter(User.username > after_username)
+    return query.order_by(User.username.asc()).limit(limit).all()
 
 
 def get_user_by_username(session: Session, username: str) -> User | None:
@@ -26,21 +52,44 @@ def create_user(
     lat: float,
     lon: float,
     root_waypoint_id: int | None = None,
+    commit: bool = True,
 ) -> User:
-    """Create and persist a user, optionally with a root waypoint."""
+    """Create and persist a user, optionally with a root waypoint whose tree they claim."""
+    from backend.db.waypoint_queries import claim_tree  # waypoint_queries imports this module
+
     user = User(username=username, lat=lat, lon=lon, root_waypoint_id=root_waypoint_id)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    if root_waypoint_id is not None:
+        session.flush()
+        claim_tree(session, root_waypoint_id, user.id)
+    if commit:
+        session.commit()
+        session.refresh(user)
+    else:
+        session.flush()
     return user
 
 
-def set_user_root(session: Session, user_id: int, waypoint_id: int) -> User | None:
-    """Assign a root waypoint to a user. Returns the updated user or None if not found."""
+def set_user_root(
+    session: Session, user_id: int, waypoint_id: int, commit: bool = True
+) -> User | None:
+    """Assign a root waypoint to a user and claim its unowned subtree for them.
+
+    Returns the updated user or None if not found.
+    """
+    from backend.db.waypoint_queries import claim_tree  # waypoint_queries imports this module
+
     user = get_user(session, user_id)
     if not user:
         return None
     user.root_waypoint_id = waypoint_id
-    session.commit()
-    session.refresh(user)
+    claim_tree(session, waypoint_id, user_id)
+    queue_tree_event(
+        session, {"type": "root_changed", "user_id": user_id, "root_waypoint_id": waypoint_id}
+    )
+    if commit:
+        session.commit()
+        session.refresh(user)
+    else:
+        session.flush()
     return user
@@ -1,12 +1,22 @@
 """Database query helpers for waypoints and tree expansion."""
 
+from collections.abc import Iterator
 from datetime import datetime
 
+from loguru import logger
+from sqlalchemy import Integer, Row, cast, func, insert, or_, select, update
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
 
 from backend.db.user_queries import get_user
+from backend.events import queue_tree_event
 from backend.models.waypoint import Waypoint, TreeDict
+from backend.tracing import span
+
+CHILD_APPEND_MAX_RETRIES = 20
+
+
+class ChildAppendConflict(Exception):
+    """Raised when a child append keeps losing compare-and-swap races."""
 
 
 def get_waypoint(session: Session, waypoint_id: int) -> Waypoint | None:
@@ -15,75 +25,419 @@ def get_waypoint(session: Session, waypoint_id: int) -> Waypoint | None:
 
 
 def set_waypoint_visited(
-    session: Session, waypoint_id: int, visited: bool = True
+    session: Session, waypoint_id: int, visited: bool = True, commit: bool = True
 ) -> Waypoint | None:
-    """Set visited status for one waypoint and return the updated row."""
+    """Set visited status for one waypoint and return the updated row.
+
+    With commit=False the change is only flushed, leaving the caller to commit.
+    """
     waypoint = get_waypoint(session, waypoint_id)
     if not waypoint:
         return None
     waypoint.visited = visited
     waypoint.visited_at = datetime.utcnow() if visited else None
-    session.commit()
-    session.refresh(waypoint)
+    queue_tree_event(
+        session,
+        {
+            "type": "visited",
+            "waypoint_id": waypoint_id,
+            "visited": visited,
+            "visited_at": waypoint.visited_at.isoformat() if waypoint.visited_at else None,
+        },
+    )
+    if commit:
+        session.commit()
+        session.refresh(waypoint)
+    else:
+        session.flush()
     return waypoint
 
 
 def create_waypoint(
-    session: Session, api_id: str, lat: float, lon: float, name: str, category: str | None = None
+    session: Session,
+    api_id: str,
+    lat: float,
+    lon: float,
+    name: str,
+    category: str | None = None,
+    commit: bool = True,
 ) -> Waypoint:
-    """Create and persist a new waypoint."""
+    """Create and persist a new waypoint; with commit=False it is only flushed."""
     waypoint = Waypoint(
         api_id=api_id, lat=lat, lon=lon, name=name, category=category, children=[], visited=False
     )
     session.add(waypoint)
-    session.commit()
-    session.refresh(waypoint)
+    if commit:
+        session.commit()
+        session.refresh(waypoint)
+    else:
+        session.flush()
     return waypoint
 
 
+def _insert_many_returning(session: Session) -> bool:
+    """Whether the session's database can return rows from a multi-row INSERT."""
+    return session.get_bind().dialect.insert_executemany_returning
+
+
+def create_waypoints_from_pois(
+    session: Session, pois: list[dict], commit: bool = True
+) -> list[Waypoint]:
+    """Create one waypoint per `query_nearby` result with a single multi-row INSERT."""
+    if not pois:
+        return []
+    rows = [
+        {
+            "api_id": str(poi["id"]),
+            "lat": poi["lat"],
+            "lon": poi["lon"],
+            "name": poi["name"],
+            "category": poi.get("category"),
+            "children": [],
+            "visited": False,
+            "version": 0,
+        }
+        for poi in pois
+    ]
+    with span("db.insert_waypoints", rows=len(rows)):
+        if _insert_many_returning(session):
+            waypoints = list(session.scalars(insert(Waypoint).returning(Waypoint), rows))
+            # RETURNING order is not guaranteed for multi-row inserts; restore the input order.
+            position = {row["api_id"]: i for i, row in enumerate(rows)}
+            waypoints.sort(key=lambda waypoint: position[waypoint.api_id])
+        else:
+            # No RETURNING for executemany (MySQL): the unit of work fetches each new ID.
+            waypoints = [Waypoint(**row) for row in rows]
+            session.add_all(waypoints)
+            session.flush()
+    if not commit:
+        return waypoints
+
+    ids = [waypoint.id for waypoint in waypoints]
+    with span("db.commit"):
+        session.commit()
+    # Reload all rows in one SELECT instead of one refresh per expired instance.
+    by_id = {waypoint.id: waypoint for waypoint in get_waypoints_by_ids(session, ids)}
+    return [by_id[waypoint_id] for waypoint_id in ids]
+
+
+def get_waypoints_in_bbox(
+    session: Session,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    limit: int,
+    owner_id: int | None = None,
+) -> list[Waypoint]:
+    """Return up to `limit` waypoints inside a bounding box, using the (lat, lon) index.
+
+    With owner_id, only waypoints claimed by that user's tree are returned.
+    """
+    query = session.query(Waypoint).filter(
+        Waypoint.lat.between(min_lat, max_lat), Waypoint.lon.between(min_lon, max_lon)
+    )
+    if owner_id is not None:
+        query = query.filter(Waypoint.owner_id == owner_id)
+    return query.order_by(Waypoint.id.asc()).limit(limit).all()
+
+
+def get_waypoint_clusters_in_bbox(
+    session: Session,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    cell_lat: float,
+    cell_lon: float,
+    owner_id: int | None = None,
+) -> list[dict]:
+    """Aggregate waypoints inside a bounding box into a grid of cells, in SQL.
+
+    Each returned cell carries its member count, centroid, bounds and lowest member ID,
+    so the result size depends on the viewport grid, not on how many rows it covers.
+    With owner_id, only waypoints claimed by that user's tree are counted.
+    """
+    in_bbox = [Waypoint.lat.between(min_lat, max_lat), Waypoint.lon.between(min_lon, max_lon)]
+    if owner_id is not None:
+        in_bbox.append(Waypoint.owner_id == owner_id)
+    cell_y = cast((Waypoint.lat - min_lat) / cell_lat, Integer).label("cell_y")
+    cell_x = cast((Waypoint.lon - min_lon) / cell_lon, Integer).label("cell_x")
+    rows = session.execute(
+        select(
+            func.count(Waypoint.id),
+            func.avg(Waypoint.lat),
+            func.avg(Waypoint.lon),
+            func.min(Waypoint.lat),
+            func.min(Waypoint.lon),
+            func.max(Waypoint.lat),
+            func.max(Waypoint.lon),
+            func.min(Waypoint.id),
+        )
+        .where(*in_bbox)
+        .group_by(cell_y, cell_x)
+    )
+    return [
+        {
+            "count": count,
+            "lat": float(lat),
+            "lon": float(lon),
+            "bounds": [lat_lo, lon_lo, lat_hi, lon_hi],
+            "first_id": first_id,
+        }
+        for count, lat, lon, lat_lo, lon_lo, lat_hi, lon_hi, first_id in rows
+    ]
+
+
+def get_waypoints_by_ids(session: Session, waypoint_ids: list[int]) -> list[Waypoint]:
+    """Return waypoints for the given IDs in one query, ordered by ID."""
+    if not waypoint_ids:
+        return []
+    return (
+        session.query(Waypoint)
+        .filter(Waypoint.id.in_(waypoint_ids))
+        .order_by(Waypoint.id.asc())
+        .all()
+    )
+
+
 def add_children_to_waypoint(
-    session: Session, parent_id: int, child_ids: list[int]
+    session: Session, parent_id: int, child_ids: list[int], commit: bool = True
 ) -> Waypoint | None:
-    """Append child IDs to a parent waypoint's children list."""
-    parent = get_waypoint(session, parent_id)
-    if not parent:
-        return None
-    existing = set(parent.children)
-    parent.children = parent.children + [cid for cid in child_ids if cid not in existing]
-    flag_modified(parent, "children")
-    session.commit()
-    session.refresh(parent)
+    """Append child IDs to a parent waypoint's children list without losing concurrent appends.
+
+    The write is a compare-and-swap on `version`: if another writer committed first the
+    UPDATE matches no row, and the children list is re-read and the append retried.
+    """
+    for attempt in range(CHILD_APPEND_MAX_RETRIES):
+        query = select(Waypoint.children, Waypoint.version, Waypoint.owner_id).where(
+            Waypoint.id == parent_id
+        )
+        if attempt > 0:
+            # A locking read sees the latest committed row even under snapshot isolation. It is
+            # exclusive: two shared locks upgrading to write on the same row deadlock on MySQL.
+            query = query.with_for_update()
+        row = session.execute(query).first()
+        if row is None:
+            return None
+
+        children, version = list(row.children or []), row.version
+        existing = set(children)
+        additions = [cid for cid in dict.fromkeys(child_ids) if cid not in existing]
+        if not additions:
+            break
+
+        result = session.execute(
+            update(Waypoint)
+            .where(Waypoint.id == parent_id, Waypoint.version == version)
+            .values(children=children + additions, version=version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            if row.owner_id is not None:
+                _claim_waypoints(session, additions, row.owner_id)
+            queue_tree_event(
+                session, {"type": "children_added", "waypoint_id": parent_id, "child_ids": additions}
+            )
+            break
+        logger.debug(f"Child append on waypoint {parent_id} lost a race (attempt {attempt + 1})")
+    else:
+        raise ChildAppendConflict(
+            f"Could not append children to waypoint {parent_id} after "
+            f"{CHILD_APPEND_MAX_RETRIES} attempts"
+        )
+
+    if commit:
+        session.commit()
+    parent = session.get(Waypoint, parent_id, populate_existing=True)
     return parent
 
 
-def _build_tree(session: Session, waypoint_id: int, seen: set[int]) -> TreeDict | None:
-    """Build a nested waypoint tree from a root waypoint ID."""
-    if waypoint_id in seen:
-        return None
-    seen.add(waypoint_id)
+TREE_FETCH_CHUNK = 900  # IDs per IN (...) query; stays under SQLite's bound-parameter limit
 
-    waypoint = get_waypoint(session, waypoint_id)
-    if not waypoint:
-        return None
 
-    child_nodes: list[TreeDict] = []
-    for child_id in waypoint.children:
-        child_tree = _build_tree(session, child_id, seen)
-        if child_tree is not None:
-            child_nodes.append(child_tree)
-
-    node: TreeDict = {
-        "id": waypoint.id,
-        "children": child_nodes,
-        "visited": waypoint.visited,
-        "visited_at": waypoint.visited_at.isoformat() if waypoint.visited_at else None,
-        "api_id": waypoint.api_id,
-        "lat": waypoint.lat,
-        "lon": waypoint.lon,
-        "name": waypoint.name,
-        "category": waypoint.category,
+def _claim_waypoints(session: Session, waypoint_ids: list[int], owner_id: int) -> None:
+    """Set owner_id on those of the given waypoints that have no owner yet."""
+    for i in range(0, len(waypoint_ids), TREE_FETCH_CHUNK):
+        session.execute(
+            update(Waypoint)
+            .where(Waypoint.id.in_(waypoint_ids[i : i + TREE_FETCH_CHUNK]), Waypoint.owner_id.is_(None))
+            .values(owner_id=owner_id)
+            .execution_options(synchronize_session=False)
+        )
+
+
+TREE_COLUMNS = (
+    Waypoint.id,
+    Waypoint.children,
+    Waypoint.visited,
+    Waypoint.visited_at,
+    Waypoint.api_id,
+    Waypoint.lat,
+    Waypoint.lon,
+    Waypoint.name,
+    Waypoint.category,
+)
+
+
+def iter_subtree_chunks(session: Session, root_id: int) -> Iterator[list[tuple[Row, int | None, int]]]:
+    """Yield every waypoint reachable from root_id breadth-first, one IN query's rows at a time.
+
+    Each item is (row, parent_id, depth) with TREE_COLUMNS; siblings keep their
+    order in the parent's children list and each node appears once, under the
+    first parent that reaches it. Only IDs are kept between chunks, so memory
+    does not grow with the size of the rows already yielded.
+    """
+    requested: set[int] = {root_id}
+    frontier: list[tuple[int, int | None]] = [(root_id, None)]
+    depth = 0
+    while frontier:
+        next_frontier: list[tuple[int, int | None]] = []
+        for i in range(0, len(frontier), TREE_FETCH_CHUNK):
+            chunk = frontier[i : i + TREE_FETCH_CHUNK]
+            rows = {
+                row.id: row
+                for row in session.execute(
+                    select(*TREE_COLUMNS).where(Waypoint.id.in_([node_id for node_id, _ in chunk]))
+                )
+            }
+            batch: list[tuple[Row, int | None, int]] = []
+            for node_id, parent_id in chunk:
+                row = rows.get(node_id)
+                if row is None:
+                    continue
+                batch.append((row, parent_id, depth))
+                for child_id in row.children or []:
+                    if child_id not in requested:
+                        requested.add(child_id)
+                        next_frontier.append((child_id, node_id))
+            if batch:
+                yield batch
+        frontier = next_frontier
+        depth += 1
+
+
+def _load_subtree_rows(session: Session, root_id: int) -> dict[int, tuple]:
+    """Fetch every waypoint reachable from root_id, one IN query per level and chunk."""
+    return {
+        row.id: tuple(row)
+        for batch in iter_subtree_chunks(session, root_id)
+        for row, _, _ in batch
     }
-    return node
+
+
+def _build_tree(session: Session, waypoint_id: int) -> TreeDict | None:
+    """Build a nested waypoint tree from a root waypoint ID.
+
+    Nodes are placed in depth-first order, and a node reachable along several paths
+    appears only under the first parent that reaches it.
+    """
+    rows = _load_subtree_rows(session, waypoint_id)
+    if waypoint_id not in rows:
+        return None
+
+    root_holder: list[TreeDict] = []
+    seen: set[int] = set()
+    stack: list[tuple[int, list[TreeDict]]] = [(waypoint_id, root_holder)]
+    while stack:
+        node_id, siblings = stack.pop()
+        if node_id in seen or node_id not in rows:
+            continue
+        seen.add(node_id)
+        _, children, visited, visited_at, api_id, lat, lon, name, category = rows[node_id]
+        node: TreeDict = {
+            "id": node_id,
+            "children": [],
+            "visited": visited,
+            "visited_at": visited_at.isoformat() if visited_at else None,
+            "api_id": api_id,
+            "lat": lat,
+            "lon": lon,
+            "name": name,
+            "category": category,
+        }
+        siblings.append(node)
+        for child_id in reversed(children or []):
+            stack.append((child_id, node["children"]))
+    return root_holder[0]
+
+
+TREE_IMPORT_BATCH = 5_000  # rows per multi-row INSERT when importing a tree
+
+
+def import_waypoint_tree(
+    session: Session, nodes: list[dict], owner_id: int | None = None, commit: bool = True
+) -> dict[int, int]:
+    """Insert an exported tree under fresh IDs and return {exported_id: new_id}.
+
+    `nodes` carry "id", "parent_id" and "depth" from the export plus the
+    waypoint columns. Levels are inserted deepest first, so every parent's
+    children list is complete when its row is written and no UPDATE pass is
+    needed. Every row is stamped with owner_id. With commit=False the rows
+    are only flushed.
+    """
+    children_of: dict[int, list[int]] = {}
+    levels: dict[int, list[dict]] = {}
+    for node in nodes:
+        levels.setdefault(node["depth"], []).append(node)
+        if node["parent_id"] is not None:
+            children_of.setdefault(node["parent_id"], []).append(node["id"])
+
+    new_ids: dict[int, int] = {}
+    with span("db.import_tree", rows=len(nodes)):
+        for depth in sorted(levels, reverse=True):
+            level = levels[depth]
+            for i in range(0, len(level), TREE_IMPORT_BATCH):
+                batch = level[i : i + TREE_IMPORT_BATCH]
+                rows = [
+                    {
+                        "api_id": node["api_id"],
+                        "lat": node["lat"],
+                        "lon": node["lon"],
+                        "name": node["name"],
+                        "category": node["category"],
+                        "visited": node["visited"],
+                        "visited_at": node["visited_at"],
+                        "children": [new_ids[child] for child in children_of.get(node["id"], [])],
+                        "version": 0,
+                        "owner_id": owner_id,
+                    }
+                    for node in batch
+                ]
+                if _insert_many_returning(session):
+                    inserted = list(
+                        session.scalars(insert(Waypoint).returning(Waypoint.id, sort_by_parameter_order=True), rows)
+                    )
+                else:
+                    waypoints = [Waypoint(**row) for row in rows]
+                    session.add_all(waypoints)
+                    session.flush()
+                    inserted = [waypoint.id for waypoint in waypoints]
+                for node, new_id in zip(batch, inserted):
+                    new_ids[node["id"]] = new_id
+    if commit:
+        session.commit()
+    else:
+        session.flush()
+    return new_ids
+
+
+def claim_tree(session: Session, root_id: int, owner_id: int) -> None:
+    """Stamp owner_id on every unowned waypoint reachable from root_id.
+
+    A fresh root costs one SELECT and one UPDATE; re-rooting onto an existing
+    subtree walks it once. Waypoints already owned by another tree keep their owner.
+    """
+    for batch in iter_subtree_chunks(session, root_id):
+        _claim_waypoints(session, [row.id for row, _, _ in batch], owner_id)
+
+
+def get_tree_waypoint_ids(session: Session, user_id: int) -> set[int] | None:
+    """Return the IDs of every waypoint in the user's tree, or None if there is no tree."""
+    user = get_user(session, user_id)
+    if not user or user.root_waypoint_id is None:
+        return None
+    return set(_load_subtree_rows(session, user.root_waypoint_id))
 
 
 def get_waypoint_tree_for_user(session: Session, user_id: int) -> TreeDict | None:
@@ -91,4 +445,38 @@ def get_waypoint_tree_for_user(session: Session, user_id: int) -> TreeDict | Non
     user = get_user(session, user_id)
     if not user:
         return None
-    return _build_tree(session, user.root_waypoint_id, set())
+    if user.root_waypoint_id is None:
+        return None
+    return _build_tree(session, user.root_waypoint_id)
+
+
+def list_visits(
+    session: Session,
+    owner_id: int | None = None,
+    before: tuple[datetime, int] | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 100,
+) -> list[Waypoint]:
+    """Return up to `limit` visited waypoints, most recent first, optionally for one owner.
+
+    Pages are keyset-paginated on (visited_at, id): pass the last row's pair as
+    `before` to continue. `since` is inclusive and `until` exclusive. Each page
+    is one range scan of the (owner_id, visited_at) or (visited_at) index that
+    stops after `limit` rows, however many visits exist.
+    """
+    query = session.query(Waypoint).filter(Waypoint.visited_at.is_not(None))
+    if owner_id is not None:
+        query = query.filter(Waypoint.owner_id == owner_id)
+    if since is not None:
+        query = query.filter(Waypoint.visited_at >= since)
+    if until is not None:
+        query = query.filter(Waypoint.visited_at < until)
+    if before is not None:
+        visited_at, waypoint_id = before
+        # The <= bound drives the index range; the OR only breaks ties on the boundary timestamp.
+        query = query.filter(
+            Waypoint.visited_at <= visited_at,
+            or_(Waypoint.visited_at < visited_at, Waypoint.id < waypoint_id),
+        )
+    return query.order_by(Waypoint.visited_at.desc(), Waypoint.id.desc()).limit(limit).all()
@@ -0,0 +1,138 @@
+"""In-process pub/sub of waypoint tree changes for the SSE stream.
+
+Mutation helpers in backend.db queue small node-level events on their session
+with `queue_tree_event`; they are published only after that session commits, so
+a rolled-back batch never reaches a client. Each SSE connection holds a
+`TreeSubscription` that tracks the waypoint IDs in its user's tree and receives
+only events about those nodes, through a bounded queue. A subscriber that falls
+behind is not allowed to stall publishers: its queue is dropped and it is told
+to resync by refetching the tree.
+
+Events are plain dicts with a "type":
+
+    {"type": "visited", "waypoint_id": 5, "visited": true, "visited_at": "..."}
+    {"type": "children_added", "waypoint_id": 5, "child_ids": [9, 10]}
+    {"type": "root_changed", "user_id": 1, "root_waypoint_id": 9}
+
+State is per process: with several workers, a client only sees changes made
+through the worker serving its stream.
+"""
+
+import os
+import queue
+import threading
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+TREE_EVENTS_QUEUE_SIZE = int(os.getenv("TREE_EVENTS_QUEUE_SIZE", "256"))
+TREE_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("TREE_EVENTS_MAX_SUBSCRIBERS", "100"))
+
+RESYNC: dict[str, Any] = {"type": "resync"}
+
+_PENDING_KEY = "pending_tree_events"
+
+
+class TreeSubscription:
+    """One client's view of one user's tree: tracked waypoint IDs plus a bounded queue."""
+
+    def __init__(self, user_id: int, maxsize: int = TREE_EVENTS_QUEUE_SIZE):
+        self.user_id = user_id
+        self.waypoint_ids: set[int] | None = None  # None until the tree is loaded: accept all
+        self.overflowed = False
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue(maxsize)
+
+    def track(self, waypoint_ids: set[int]) -> None:
+        """Start filtering on the given tree; called once the initial tree is loaded."""
+        self.waypoint_ids = waypoint_ids
+
+    def wants(self, tree_event: dict[str, Any]) -> bool:
+        if tree_event["type"] == "root_changed":
+            return tree_event["user_id"] == self.user_id
+        return self.waypoint_ids is None or tree_event["waypoint_id"] in self.waypoint_ids
+
+    def offer(self, tree_event: dict[str, Any]) -> None:
+        """Queue an event without blocking; on overflow, replace the backlog with RESYNC."""
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(tree_event)
+        except queue.Full:
+            self.overflowed = True
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            # Publishers hold the bus lock, so the emptied queue has room; this wakes a waiting reader.
+            self._queue.put_nowait(RESYNC)
+
+    def get(self, timeout: float) -> dict[str, Any] | None:
+        """Return the next event (RESYNC right after an overflow), or None on timeout."""
+        try:
+            tree_event = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if tree_event is RESYNC:
+            # The backlog was discarded; the caller refetches, so later events apply cleanly.
+            self.overflowed = False
+        return tree_event
+
+
+class TreeEventBus:
+    """Fan-out of committed tree events to the subscriptions that track the affected nodes."""
+
+    def __init__(self, max_subscribers: int = TREE_EVENTS_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscriptions: set[TreeSubscription] = set()
+
+    def subscribe(self, user_id: int) -> TreeSubscription | None:
+        """Register a subscription, or return None if the subscriber limit is reached."""
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                return None
+            subscription = TreeSubscription(user_id)
+            self._subscriptions.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: TreeSubscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, tree_events: list[dict[str, Any]]) -> None:
+        """Deliver events in order; children_added also extends each receiver's tracked IDs."""
+        with self._lock:
+            for tree_event in tree_events:
+                for subscription in self._subscriptions:
+                    if not subscription.wants(tree_event):
+                        continue
+                    if tree_event["type"] == "children_added" and subscription.waypoint_ids is not None:
+                        subscription.waypoint_ids.update(tree_event["child_ids"])
+                    subscription.offer(tree_event)
+
+
+TREE_EVENTS = TreeEventBus()
+
+
+def queue_tree_event(session: Session, tree_event: dict[str, Any]) -> None:
+    """Hold an event on the session until it commits; cheap no-op when nobody listens."""
+    if TREE_EVENTS.subscriber_count():
+        session.info.setdefault(_PENDING_KEY, []).append(tree_event)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        TREE_EVENTS.publish(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,318 @@
+"""In-process Prometheus metrics: request latency, SQL, Photon calls and DB pool usage.
+
+Collectors are plain thread-safe counters and fixed-bucket histograms. Label sets are
+resolved once and cached, so recording on the hot path is a dict lookup, a bisect and
+a locked increment. Everything is rendered lazily when `/metrics` is scraped.
+"""
+
+import bisect
+import threading
+from collections.abc import Callable, Iterable
+from time import perf_counter
+
+from flask import Flask, Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label block such as {route="/x",method="GET"}."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_le(bound: float) -> str:
+    """Render a bucket bound the way Prometheus clients do (1.0 → "1.0", 5 → "5.0")."""
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class _CounterChild:
+    """One labelled counter series."""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+
+class _HistogramChild:
+    """One labelled histogram series with fixed upper bounds."""
+
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+
+class _Metric:
+    """Base for labelled metric families; children are created once per label set."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> object:
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Return the child series for these label values, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    """Monotonic counter family."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled series."""
+        self.labels().inc(amount)
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for values, child in list(self._children.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, values)} {child._value}"
+
+
+class Histogram(_Metric):
+    """Cumulative histogram family with fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Record into the unlabelled series."""
+        self.labels().observe(value)
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child._counts), child._sum
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_le(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge(_Metric):
+    """Gauge family whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float | None]):
+        super().__init__(name, documentation)
+        self._read = read
+
+    def render(self) -> Iterable[str]:
+        value = self._read()
+        if value is None:
+            return
+        yield from super().render()
+        yield f"{self.name} {value}"
+
+
+class Registry:
+    """Ordered collection of metric families rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "branch_http_request_duration_seconds",
+        "HTTP request latency by blueprint, route, method and status.",
+        ("blueprint", "route", "method", "status"),
+    )
+)
+SQL_STATEMENTS = REGISTRY.register(
+    Counter("branch_sql_statements", "SQL statements executed, by blueprint.", ("blueprint",))
+)
+SQL_STATEMENT_DURATION = REGISTRY.register(
+    Histogram("branch_sql_statement_duration_seconds", "Latency of single SQL statements.")
+)
+SQL_STATEMENTS_PER_REQUEST = REGISTRY.register(
+    Histogram(
+        "branch_sql_statements_per_request",
+        "SQL statements issued by one HTTP request.",
+        ("blueprint", "route"),
+        buckets=COUNT_BUCKETS,
+    )
+)
+SQL_TIME_PER_REQUEST = REGISTRY.register(
+    Histogram(
+        "branch_sql_time_per_request_seconds",
+        "Total SQL time spent by one HTTP request.",
+        ("blueprint", "route"),
+    )
+)
+DB_SESSIONS = REGISTRY.register(
+    Counter(
+        "branch_db_sessions",
+        "Request sessions opened, by engine (primary, read, or primary pinned after a write).",
+        ("engine",),
+    )
+)
+POI_CATEGORY_FETCHES = REGISTRY.register(
+    Counter(
+        "branch_poi_category_fetches",
+        "Per-category POI fetches in discovery rounds, by whether they were sent or skipped.",
+        ("outcome",),
+    )
+)
+POI_FEATURES = REGISTRY.register(
+    Counter(
+        "branch_poi_features",
+        "POI features returned by providers, by whether they reached the discovery result.",
+        ("outcome",),
+    )
+)
+PHOTON_REQUESTS = REGISTRY.register(
+    Counter("branch_photon_requests", "Photon HTTP attempts by outcome.", ("outcome",))
+)
+PHOTON_REQUEST_DURATION = REGISTRY.register(
+    Histogram("branch_photon_request_duration_seconds", "Latency of single Photon HTTP attempts.")
+)
+PHOTON_RETRIES = REGISTRY.register(
+    Counter("branch_photon_retries", "Photon attempts retried after a transient failure.")
+)
+
+_request_state = threading.local()
+
+
+def _on_before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._metrics_start = perf_counter()
+
+
+def _on_after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = perf_counter() - context._metrics_start
+    SQL_STATEMENT_DURATION.observe(elapsed)
+    if getattr(_request_state, "active", False):
+        _request_state.sql_count += 1
+        _request_state.sql_time += elapsed
+
+
+def instrument_engine(engine: Engine, pool_name: str = "db") -> None:
+    """Count and time every SQL statement executed through engine.
+
+    Pool gauges are named branch_<pool_name>_pool_*, so a second engine needs its own pool_name.
+    """
+    if event.contains(engine, "before_cursor_execute", _on_before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _on_before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _on_after_cursor_execute)
+
+    pool = engine.pool
+    for attr, help_text in (
+        ("checkedout", "DB connections currently checked out of the pool."),
+        ("checkedin", "Idle DB connections held by the pool."),
+        ("size", "Configured DB pool size."),
+        ("overflow", "DB connections opened beyond the pool size."),
+    ):
+        read = getattr(pool, attr, None)
+        if callable(read):
+            REGISTRY.register(Gauge(f"branch_{pool_name}_pool_{attr}", help_text, read))
+
+
+def init_metrics(app: Flask, engine: Engine) -> None:
+    """Record per-request metrics for app and SQL metrics for engine, and serve /metrics."""
+    instrument_engine(engine)
+
+    @app.before_request
+    def start_request_timer() -> None:
+        """Start the request clock and reset per-request SQL counters."""
+        g.metrics_start = perf_counter()
+        _request_state.active = True
+        _request_state.sql_count = 0
+        _request_state.sql_time = 0.0
+
+    @app.after_request
+    def record_request_metrics(response: Response) -> Response:
+        """Observe latency and SQL usage for the finished request."""
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        _request_state.active = False
+        blueprint = request.blueprint or "app"
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_DURATION.labels(
+            blueprint, route, request.method, str(response.status_code)
+        ).observe(perf_counter() - start)
+        SQL_STATEMENTS.labels(blueprint).inc(_request_state.sql_count)
+        SQL_STATEMENTS_PER_REQUEST.labels(blueprint, route).observe(_request_state.sql_count)
+        SQL_TIME_PER_REQUEST.labels(blueprint, route).observe(_request_state.sql_time)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics() -> Response:
+        """Serve all metrics in the Prometheus text exposition format."""
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,330 @@
+"""Versioned schema migrations.
+
+The applied version is stored in a one-row `schema_version` table. `migrate()`
+reads it with a single query and returns immediately when it matches the newest
+migration, so a normal startup issues no reflection or DDL. Otherwise it takes a
+migration lock (MySQL GET_LOCK, or a write lock on the version row elsewhere),
+re-reads the version so concurrent workers apply each step once, and runs the
+pending steps in order.
+
+Migrations must be idempotent: databases created before versioning start at
+version 0 and replay every step against tables that may already be up to date.
+Append new steps to MIGRATIONS; never edit or reorder applied ones. Each step
+spells out the tables, columns and indexes it adds, never the current models,
+so a version means the same schema whenever and wherever it is applied.
+
+    python -m backend.migrations            # upgrade DATABASE_URL to the latest version
+    python -m backend.migrations --status   # print current and latest versions
+"""
+
+import argparse
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn
+
+MIGRATION_LOCK_TIMEOUT = 60  # seconds to wait for another worker's migration
+BACKFILL_CHUNK = 900  # IDs per IN (...) during data backfills; under SQLite's parameter limit
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One schema step, applied inside a transaction on conn."""
+
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+# Schema as of migration 1, frozen: model changes after it belong in new migrations.
+_baseline_metadata = MetaData()
+_baseline_waypoints = Table(
+    "waypoints",
+    _baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("children", JSON, nullable=False),
+    Column("version", Integer, server_default=text("0"), nullable=False),
+    Column("visited", Boolean, nullable=False),
+    Column("visited_at", DateTime, nullable=True),
+    Column("api_id", String(255), nullable=False, index=True),
+    Column("lat", Float, nullable=False, index=True),
+    Column("lon", Float, nullable=False, index=True),
+    Column("name", String(255), nullable=False),
+    Column("category", String(64), nullable=True),
+    Index("ix_waypoints_lat_lon", "lat", "lon"),
+)
+_baseline_users = Table(
+    "users",
+    _baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(80), nullable=False, unique=True, index=True),
+    Column("lat", Float, nullable=False, index=True),
+    Column("lon", Float, nullable=False, index=True),
+    Column("root_waypoint_id", Integer, ForeignKey("waypoints.id"), nullable=True),
+)
+_baseline_journal_entries = Table(
+    "journal_entries",
+    _baseline_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("waypoint_id", Integer, ForeignKey("waypoints.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+# Index added by migration 2.
+_paired_journal_entries = Table(
+    "journal_entries",
+    MetaData(),
+    Column("user_id", Integer, nullable=False),
+    Column("waypoint_id", Integer, nullable=False),
+    Index("uq_journal_entries_user_waypoint", "user_id", "waypoint_id", unique=True),
+)
+
+# Columns and indexes added by migration 4, with the existing columns its backfill reads.
+_owned_waypoints = Table(
+    "waypoints",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("children", JSON, nullable=False),
+    Column("visited_at", DateTime, nullable=True),
+    Column("owner_id", Integer, nullable=True),
+    Index("ix_waypoints_owner_visited_at", "owner_id", "visited_at"),
+    Index("ix_waypoints_visited_at", "visited_at"),
+)
+
+
+def add_missing_columns(conn: Connection, table: Table) -> None:
+    """ALTER TABLE ADD COLUMN for every column of table that the database lacks."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        logger.info(f"Added column {table.name}.{column.name}")
+
+
+def create_missing_indexes(conn: Connection, table: Table) -> None:
+    """Create any non-unique index declared on table that does not exist yet.
+
+    Unique indexes can fail on existing data, so each gets its own migration that
+    cleans up duplicates first.
+    """
+    for index in table.indexes:
+        if not index.unique:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _baseline(conn: Connection) -> None:
+    """Create the baseline tables, or bring a pre-versioning database up to them."""
+    _baseline_metadata.create_all(bind=conn)
+    for table in _baseline_metadata.sorted_tables:
+        add_missing_columns(conn, table)
+        create_missing_indexes(conn, table)
+
+
+def _unique_journal_pairs(conn: Connection) -> None:
+    """Keep the oldest entry per (user, waypoint), then enforce one entry per pair."""
+    conn.execute(
+        text(
+            "DELETE FROM journal_entries WHERE id NOT IN ("
+            "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM journal_entries "
+            "GROUP BY user_id, waypoint_id) AS keep)"
+        )
+    )
+    for index in _paired_journal_entries.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _journal_search_index(conn: Connection) -> None:
+    """Full-text index over journal content: FTS5 table + triggers on SQLite, FULLTEXT on MySQL."""
+    if conn.dialect.name == "sqlite":
+        # External-content table: the text lives only in journal_entries; triggers keep
+        # the index in step with every write path, including bulk Core inserts.
+        conn.execute(
+            text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5("
+                "content, content='journal_entries', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TRIGGER IF NOT EXISTS journal_fts_insert AFTER INSERT ON journal_entries BEGIN "
+                "INSERT INTO journal_fts(rowid, content) VALUES (new.id, new.content); END"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TRIGGER IF NOT EXISTS journal_fts_delete AFTER DELETE ON journal_entries BEGIN "
+                "INSERT INTO journal_fts(journal_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TRIGGER IF NOT EXISTS journal_fts_update AFTER UPDATE OF content ON journal_entries BEGIN "
+                "INSERT INTO journal_fts(journal_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+                "INSERT INTO journal_fts(rowid, content) VALUES (new.id, new.content); END"
+            )
+        )
+        conn.execute(text("INSERT INTO journal_fts(journal_fts) VALUES ('rebuild')"))
+    elif conn.dialect.name == "mysql":
+        indexes = {index["name"] for index in inspect(conn).get_indexes("journal_entries")}
+        if "ft_journal_entries_content" not in indexes:
+            conn.execute(text("ALTER TABLE journal_entries ADD FULLTEXT INDEX ft_journal_entries_content (content)"))
+
+
+def _waypoint_owners(conn: Connection) -> None:
+    """Add waypoints.owner_id and the visit-time indexes, then claim each user's tree.
+
+    Users are processed in ID order and only unowned rows are stamped, matching
+    what `claim_tree` does at runtime when a waypoint sits in several trees.
+    """
+    add_missing_columns(conn, _owned_waypoints)
+    create_missing_indexes(conn, _owned_waypoints)
+    waypoints, users = _owned_waypoints, _baseline_users
+    roots = conn.execute(
+        select(users.c.id, users.c.root_waypoint_id)
+        .where(users.c.root_waypoint_id.is_not(None))
+        .order_by(users.c.id)
+    ).all()
+    for user_id, root_id in roots:
+        seen, frontier = {root_id}, [root_id]
+        while frontier:
+            next_frontier: list[int] = []
+            for i in range(0, len(frontier), BACKFILL_CHUNK):
+                chunk = frontier[i : i + BACKFILL_CHUNK]
+                conn.execute(
+                    update(waypoints)
+                    .where(waypoints.c.id.in_(chunk), waypoints.c.owner_id.is_(None))
+                    .values(owner_id=user_id)
+                )
+                for (children,) in conn.execute(select(waypoints.c.children).where(waypoints.c.id.in_(chunk))):
+                    for child_id in children or []:
+                        if child_id not in seen:
+                            seen.add(child_id)
+                            next_frontier.append(child_id)
+            frontier = next_frontier
+    logger.info(f"Claimed waypoint trees for {len(roots)} users")
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline tables, columns and indexes", _baseline),
+    Migration(2, "unique (user_id, waypoint_id) journal entries", _unique_journal_pairs),
+    Migration(3, "full-text search index on journal content", _journal_search_index),
+    Migration(4, "waypoint owners and visit-time indexes", _waypoint_owners),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    """Return the applied schema version, or 0 for an unversioned database."""
+    try:
+        return int(conn.execute(text("SELECT version FROM schema_version WHERE id = 1")).scalar() or 0)
+    except (OperationalError, ProgrammingError):
+        conn.rollback()
+        return 0
+
+
+def _ensure_version_table(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("CREATE TABLE IF NOT EXISTS schema_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+        )
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO schema_version (id, version) VALUES (1, 0)"))
+    except IntegrityError:
+        pass  # Another worker or an earlier run created the row.
+
+
+@contextmanager
+def _migration_lock(conn: Connection) -> Iterator[None]:
+    """Serialize migrations across processes for the duration of the block."""
+    if conn.dialect.name == "mysql":
+        # MySQL commits implicitly on DDL, so a row lock would not survive; use a named lock.
+        acquired = conn.execute(
+            text("SELECT GET_LOCK('branch_schema_migration', :timeout)"),
+            {"timeout": MIGRATION_LOCK_TIMEOUT},
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError("Timed out waiting for another schema migration")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK('branch_schema_migration')"))
+    else:
+        # Writing the version row takes the write lock until this transaction ends.
+        conn.execute(text("UPDATE schema_version SET version = version WHERE id = 1"))
+        yield
+
+
+def migrate(engine: Engine) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        with _migration_lock(conn):
+            version = current_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+                logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+                migration.upgrade(conn)
+                conn.execute(
+                    text("UPDATE schema_version SET version = :version WHERE id = 1"),
+                    {"version": migration.version},
+                )
+                version = migration.version
+            conn.commit()
+    logger.info(f"Database schema at version {version}")
+    return version
+
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    parser.add_argument("--db", default=os.getenv("DATABASE_URL", "sqlite:///branch.db"))
+    parser.add_argument("--status", action="store_true", help="Only print versions")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db)
+    if args.status:
+        with engine.connect() as conn:
+            print(f"current={current_version(conn)} latest={LATEST_VERSION}")
+        return
+    migrate(engine)
+
+
+if __name__ == "__main__":
+    main()
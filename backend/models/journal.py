@@ -2,7 +2,7 @@
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from backend.models.base import Base
@@ -12,6 +12,10 @@ class JournalEntry(Base):
     """One journal entry per (user, waypoint) pair."""
 
     __tablename__ = "journal_entries"
+    # One entry per pair; (user_id, waypoint_id) order also serves per-user keyset pages.
+    __table_args__ = (
+        Index("uq_journal_entries_user_waypoint", "user_id", "waypoint_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     waypoint_id: Mapped[int] = mapped_column(Integer, ForeignKey("waypoints.id"), nullable=False)
@@ -3,7 +3,7 @@
 from datetime import datetime
 from typing import TypedDict
 
-from sqlalchemy import Boolean, DateTime, Float, Integer, JSON, String
+from sqlalchemy import Boolean, DateTime, Float, Index, Integer, JSON, String, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from backend.models.base import Base
@@ -27,11 +27,20 @@ class Waypoint(Base):
     """Waypoint model representing a location node in the skill tree."""
 
     __tablename__ = "waypoints"
+    __table_args__ = (
+        Index("ix_waypoints_lat_lon", "lat", "lon"),  # viewport queries
+        Index("ix_waypoints_owner_visited_at", "owner_id", "visited_at"),  # per-user visit timeline
+        Index("ix_waypoints_visited_at", "visited_at"),  # global recent-visits feed
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     children: Mapped[list[int]] = mapped_column(JSON, default=list)
+    # Bumped on every children write; appends compare-and-swap on it instead of locking.
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"), nullable=False)
     visited: Mapped[bool] = mapped_column(Boolean, default=False)
     visited_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # User whose tree first claimed this waypoint; stamped when it becomes a root or child.
+    owner_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     api_id: Mapped[str] = mapped_column(String(255), index=True)
     lat: Mapped[float] = mapped_column(Float, index=True)  # cached from api
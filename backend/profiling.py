@@ -0,0 +1,235 @@
+"""On-demand wall-clock profiling for single requests, scripts and hot functions.
+
+A background thread samples the profiled thread's Python stack every
+PROFILE_INTERVAL_MS and counts identical stacks. The result is written in the
+collapsed-stack format ("frame;frame;frame count") read by flamegraph.pl,
+speedscope and inferno. Each sample is also bucketed by the innermost library
+frame into db, network, serialization or app time.
+
+Requests are profiled only when PROFILE_SECRET is set and the request carries it
+in an `X-Profile` header or a `profile` query parameter. Add
+`X-Profile-Output: inline` (or `profile_output=inline`) to get the collapsed
+stacks back as the response body instead of the normal response.
+
+Scripts and functions decorated with `@profiled(name)` are profiled when name
+is listed in PROFILE_TARGETS (comma separated, "*" for all), e.g.
+`PROFILE_TARGETS=seed python seed.py`.
+"""
+
+import hmac
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from time import perf_counter
+from types import FrameType
+from typing import Any, TypeVar
+
+from flask import Flask, Response, g, request
+from loguru import logger
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TARGETS = {
+    target.strip() for target in os.getenv("PROFILE_TARGETS", "").split(",") if target.strip()
+}
+
+# Innermost matching module prefix decides where a sample's wall time is attributed.
+_CATEGORY_PREFIXES: list[tuple[str, tuple[str, ...]]] = [
+    ("serialization", ("json", "flask.json", "simplejson")),
+    ("network", ("requests", "urllib3", "http.client", "socket", "ssl", "selectors")),
+    ("db", ("sqlalchemy", "sqlite3", "pymysql", "MySQLdb")),
+]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _module_name(frame: FrameType) -> str:
+    return frame.f_globals.get("__name__", "?")
+
+
+def _category(frames: list[FrameType]) -> str:
+    """Return the time bucket for a stack given innermost-first frames."""
+    for frame in frames:
+        module = _module_name(frame)
+        for category, prefixes in _CATEGORY_PREFIXES:
+            if any(module == prefix or module.startswith(prefix + ".") for prefix in prefixes):
+                return category
+    return "app"
+
+
+class Profile:
+    """Stack samples collected for one profiled request, block or function call."""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.categories: Counter[str] = Counter()
+        self.elapsed = 0.0
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Render samples as collapsed stacks, one "root;...;leaf count" line per stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> str:
+        """Return e.g. "db=41% network=52% serialization=2% app=5% (812 ms, 160 samples)"."""
+        total = self.sample_count or 1
+        shares = " ".join(
+            f"{category}={self.categories[category] * 100 // total}%"
+            for category in ("db", "network", "serialization", "app")
+        )
+        return f"{shares} ({self.elapsed * 1000:.0f} ms, {self.sample_count} samples)"
+
+    def save(self, directory: str | Path = PROFILE_DIR) -> Path:
+        """Write the collapsed stacks to a timestamped file in directory and return its path."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.name).strip("_") or "profile"
+        target = path / f"{stamp}-{slug}.collapsed"
+        target.write_text(self.collapsed(), encoding="utf-8")
+        return target
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a daemon thread until stopped."""
+
+    def __init__(self, name: str, thread_id: int | None = None, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.profile = Profile(name, interval_ms / 1000)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{name}", daemon=True)
+        self._start = 0.0
+
+    def start(self) -> "StackSampler":
+        _sampled_threads.add(self.thread_id)
+        self._start = perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        self.profile.elapsed = perf_counter() - self._start
+        _sampled_threads.discard(self.thread_id)
+        return self.profile
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.profile.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames: list[FrameType] = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            stack = ";".join(
+                f"{_module_name(f)}:{f.f_code.co_name}" for f in reversed(frames)
+            )
+            self.profile.stacks[stack] += 1
+            self.profile.categories[_category(frames)] += 1
+
+
+_sampled_threads: set[int] = set()
+
+
+def is_profiling() -> bool:
+    """Return True if the current thread is already being sampled."""
+    return threading.get_ident() in _sampled_threads
+
+
+@contextmanager
+def profile_block(name: str, directory: str | Path = PROFILE_DIR) -> Iterator[Profile]:
+    """Profile the enclosed block, save its collapsed stacks and log the time breakdown."""
+    sampler = StackSampler(name).start()
+    try:
+        yield sampler.profile
+    finally:
+        profile = sampler.stop()
+        path = profile.save(directory)
+        logger.info(f"Profiled {name}: {profile.summary()} → {path}")
+
+
+def profiled(name: str) -> Callable[[F], F]:
+    """Profile calls of the decorated function when name is listed in PROFILE_TARGETS.
+
+    Calls made while the thread is already sampled (e.g. inside a profiled request)
+    are not profiled again; they show up in the outer profile instead.
+    """
+
+    def decorator(func: F) -> F:
+        if name not in PROFILE_TARGETS and "*" not in PROFILE_TARGETS:
+            return func
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if is_profiling():
+                return func(*args, **kwargs)
+            with profile_block(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _requested_secret() -> str:
+    return request.headers.get("X-Profile") or request.args.get("profile") or ""
+
+
+def _wants_inline() -> bool:
+    output = request.headers.get("X-Profile-Output") or request.args.get("profile_output")
+    return output == "inline"
+
+
+def init_profiling(app: Flask) -> None:
+    """Profile requests that carry PROFILE_SECRET; a no-op when no secret is configured."""
+    if not PROFILE_SECRET:
+        return
+
+    @app.before_request
+    def start_request_profile() -> None:
+        """Start sampling this request's thread if it presented the profiling secret."""
+        secret = _requested_secret()
+        if not secret or not hmac.compare_digest(secret.encode(), PROFILE_SECRET.encode()):
+            return
+        g.profile_sampler = StackSampler(f"{request.method} {request.path}").start()
+
+    @app.after_request
+    def finish_request_profile(response: Response) -> Response:
+        """Stop sampling and save the profile, or return it inline."""
+        sampler = g.pop("profile_sampler", None)
+        if sampler is None:
+            return response
+        profile = sampler.stop()
+        summary = profile.summary()
+        if _wants_inline():
+            logger.info(f"Profiled {profile.name}: {summary} (inline)")
+            inline = Response(profile.collapsed(), mimetype="text/plain")
+            inline.headers["X-Profile-Summary"] = summary
+            inline.headers["X-Profile-Status"] = str(response.status_code)
+            return inline
+        path = profile.save()
+        logger.info(f"Profiled {profile.name}: {summary} → {path}")
+        response.headers["X-Profile-Summary"] = summary
+        response.headers["X-Profile-File"] = path.name
+        return response
+
+    @app.teardown_request
+    def stop_abandoned_profile(exception: BaseException | None) -> None:
+        """Stop a sampler left running when the request failed before after_request."""
+        sampler = g.pop("profile_sampler", None)
+        if sampler is not None:
+            sampler.stop()
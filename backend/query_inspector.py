@@ -0,0 +1,170 @@
+"""Opt-in per-request SQL inspector: N+1 detection, slow-query logging, query budgets.
+
+Enable with QUERY_INSPECTOR=1. Each request's statements are recorded between
+`open_db_session` and `close_db_session`; at the end of the request, statements
+repeated more than N_PLUS_ONE_THRESHOLD times are reported, and any statement slower
+than SLOW_QUERY_MS is logged with its parameters and call site as it happens.
+
+Routes can declare a budget with `@query_budget(n)`. Exceeding it is logged, and with
+QUERY_INSPECTOR_STRICT=1 raises QueryBudgetExceeded so test runs fail. Tests and scripts
+can also wrap any block in `assert_max_queries(n)` regardless of QUERY_INSPECTOR.
+"""
+
+import os
+import threading
+import traceback
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from time import perf_counter
+from typing import Any, TypeVar
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_INSPECTOR = os.getenv("QUERY_INSPECTOR", "0") == "1"
+QUERY_INSPECTOR_STRICT = os.getenv("QUERY_INSPECTOR_STRICT", "0") == "1"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+_BACKEND_DIR = str(Path(__file__).resolve().parent)
+_THIS_FILE = str(Path(__file__).resolve())
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or block issues more SQL statements than its budget."""
+
+
+class QueryLog:
+    """Statements recorded for one request or `assert_max_queries` block."""
+
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, float]] = []
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.statements.append((statement, elapsed))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Return (statement, times) for statements issued more than threshold times."""
+        counts = Counter(statement for statement, _ in self.statements)
+        return [(statement, n) for statement, n in counts.most_common() if n > threshold]
+
+
+_local = threading.local()
+
+
+def _active_logs() -> list[QueryLog]:
+    """Return the logs currently recording on this thread (request + nested blocks)."""
+    logs = getattr(_local, "logs", None)
+    if logs is None:
+        logs = _local.logs = []
+    return logs
+
+
+def _call_site() -> str:
+    """Return the innermost backend frames that led to the current statement."""
+    frames = [
+        frame
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(_BACKEND_DIR) and frame.filename != _THIS_FILE
+    ]
+    return " <- ".join(
+        f"{Path(frame.filename).name}:{frame.lineno} {frame.name}" for frame in reversed(frames[-4:])
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._inspector_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    logs = getattr(_local, "logs", None)
+    if not logs:
+        return
+    elapsed = perf_counter() - context._inspector_start
+    for log in logs:
+        log.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            f"Slow query ({elapsed * 1000:.1f} ms): {statement} | params={parameters!r} "
+            f"| at {_call_site()}"
+        )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Feed statements executed through engine to any active query logs."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def query_budget(max_statements: int) -> Callable[[F], F]:
+    """Declare the most SQL statements one call of a route may issue."""
+
+    def decorator(view: F) -> F:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            _local.budget = max_statements
+            return view(*args, **kwargs)
+
+        wrapper.query_budget = max_statements  # type: ignore[attr-defined]
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def start_request_log() -> None:
+    """Begin recording statements for the current request."""
+    _local.budget = None
+    _local.request_log = QueryLog()
+    _active_logs().append(_local.request_log)
+
+
+def finish_request_log(endpoint: str) -> None:
+    """Stop recording and report N+1 patterns and budget overruns for the request."""
+    log = getattr(_local, "request_log", None)
+    if log is None:
+        return
+    _local.request_log = None
+    logs = _active_logs()
+    if log in logs:
+        logs.remove(log)
+
+    for statement, times in log.repeated(N_PLUS_ONE_THRESHOLD):
+        logger.warning(f"Possible N+1 in {endpoint}: {times}x {statement}")
+
+    budget = getattr(_local, "budget", None)
+    if budget is not None and log.count > budget:
+        message = f"{endpoint} issued {log.count} SQL statements (budget {budget})"
+        logger.error(message)
+        if QUERY_INSPECTOR_STRICT:
+            raise QueryBudgetExceeded(message)
+
+
+@contextmanager
+def assert_max_queries(max_statements: int) -> Iterator[QueryLog]:
+    """Fail if the enclosed block issues more than max_statements SQL statements.
+
+    The engine must have been passed to `instrument_engine` (create_app does this).
+    """
+    log = QueryLog()
+    _active_logs().append(log)
+    try:
+        yield log
+    finally:
+        _active_logs().remove(log)
+    if log.count > max_statements:
+        detail = "\n".join(f"  {n}x {statement}" for statement, n in log.repeated(0))
+        raise QueryBudgetExceeded(
+            f"{log.count} SQL statements issued (budget {max_statements}):\n{detail}"
+        )
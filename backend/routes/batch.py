@@ -0,0 +1,360 @@
+"""Batch mutation API route: many operations, one transaction."""
+
+from collections.abc import Callable
+from typing import Any
+
+from flask import Blueprint, g, jsonify, request, Response
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from backend.db.journal_queries import create_journal_entry
+from backend.db.user_queries import (
+    create_user,
+    get_user_by_username,
+    set_user_root,
+)
+from backend.db.waypoint_queries import (
+    ChildAppendConflict,
+    add_children_to_waypoint,
+    create_waypoint,
+    create_waypoints_from_pois,
+    get_waypoint_tree_for_user,
+    set_waypoint_visited,
+)
+from backend.models.waypoint import TreeDict
+from backend.services.osm import discover_for_points, query_nearby
+from backend.services.scoring import assign_nearest
+
+batch_bp = Blueprint("batch", __name__, url_prefix="/api/batch")
+
+MAX_BATCH_OPERATIONS = 100
+MAX_EXPLORE_LEAVES = 50
+EXCLUDE_OVERFETCH = 5  # Fetch this many times the wanted POIs when exclusions may discard some
+
+
+class BatchError(Exception):
+    """An operation failed; the whole batch is rolled back."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _require(args: dict[str, Any], *names: str) -> list[Any]:
+    """Return the named args, raising BatchError if any is missing."""
+    missing = [name for name in names if args.get(name) is None]
+    if missing:
+        raise BatchError(f"missing required args: {', '.join(missing)}")
+    return [args[name] for name in names]
+
+
+def _resolve(value: Any, refs: dict[str, Any]) -> Any:
+    """Replace `{"$ref": name}` markers with the ID(s) produced by an earlier operation."""
+    if isinstance(value, dict):
+        if set(value) == {"$ref"}:
+            name = value["$ref"]
+            if name not in refs:
+                raise BatchError(f"unknown $ref {name!r}")
+            result = refs[name]
+            if isinstance(result, list):
+                return [item["id"] for item in result]
+            return result["id"]
+        return {key: _resolve(item, refs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve(item, refs) for item in value]
+    return value
+
+
+def _has_ref(value: Any) -> bool:
+    """Return True if value contains a `$ref` marker anywhere."""
+    if isinstance(value, dict):
+        return "$ref" in value or any(_has_ref(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_has_ref(item) for item in value)
+    return False
+
+
+def _tree_api_ids_and_names(tree: TreeDict | None) -> tuple[set[str], set[str]]:
+    """Collect every api_id and name in a nested tree."""
+    api_ids: set[str] = set()
+    names: set[str] = set()
+    stack = [tree] if tree else []
+    while stack:
+        node = stack.pop()
+        if node["api_id"]:
+            api_ids.add(node["api_id"])
+        names.add(node["name"])
+        stack.extend(node["children"])
+    return api_ids, names
+
+
+def _discover_pois(args: dict[str, Any]) -> list[dict]:
+    """Run the POI discovery for a `discover` operation (network only, no DB)."""
+    lat, lon = _require(args, "lat", "lon")
+    try:
+        lat, lon, radius = float(lat), float(lon), int(args.get("radius", 500))
+    except (TypeError, ValueError):
+        raise BatchError("lat, lon and radius must be numbers") from None
+    num = _discover_num(args)
+    # Over-fetch so exclusions below can still fill `num`, as prepareChildren does client-side.
+    fetch = num * EXCLUDE_OVERFETCH if _has_excludes(args) else num
+    return query_nearby(lat, lon, limit=fetch, radius=radius, categories=args.get("categories"))
+
+
+def _discover_num(args: dict[str, Any]) -> int:
+    """Return a `discover` operation's `num` (default 10), raising BatchError if it is not a number."""
+    try:
+        return int(args.get("num", 10))
+    except (TypeError, ValueError):
+        raise BatchError("num must be a number") from None
+
+
+def _has_excludes(args: dict[str, Any]) -> bool:
+    return bool(args.get("user_id") or args.get("exclude_api_ids") or args.get("exclude_names"))
+
+
+def _exclude_known(session: Session, args: dict[str, Any], pois: list[dict]) -> list[dict]:
+    """Drop POIs in exclude_api_ids / exclude_names or already in user_id's tree."""
+    exclude_api_ids = set(args.get("exclude_api_ids") or [])
+    exclude_names = set(args.get("exclude_names") or [])
+    if args.get("user_id") is not None:
+        tree_api_ids, tree_names = _tree_api_ids_and_names(
+            get_waypoint_tree_for_user(session, int(args["user_id"]))
+        )
+        exclude_api_ids |= tree_api_ids
+        exclude_names |= tree_names
+    return [
+        poi
+        for poi in pois
+        if str(poi["id"]) not in exclude_api_ids and poi["name"] not in exclude_names
+    ]
+
+
+def _op_discover(session: Session, args: dict[str, Any]) -> list[dict]:
+    """Create waypoints for nearby POIs, skipping ones already known to the caller."""
+    pois = args.pop("_prefetched", None)
+    if pois is None:
+        pois = _discover_pois(args)
+
+    fresh = _exclude_known(session, args, pois)[: _discover_num(args)]
+    return [w.to_dict() for w in create_waypoints_from_pois(session, fresh, commit=False)]
+
+
+def _explore_leaves(args: dict[str, Any]) -> list[tuple[int, float, float, int]]:
+    """Validate an `explore` operation's leaves as (waypoint_id, lat, lon, num) tuples."""
+    (leaves,) = _require(args, "leaves")
+    if not isinstance(leaves, list) or not leaves:
+        raise BatchError("leaves must be a non-empty list")
+    if len(leaves) > MAX_EXPLORE_LEAVES:
+        raise BatchError(f"at most {MAX_EXPLORE_LEAVES} leaves per explore")
+    try:
+        num = int(args.get("num", 3))
+    except (TypeError, ValueError):
+        raise BatchError("num must be a number") from None
+    parsed = []
+    for leaf in leaves:
+        if not isinstance(leaf, dict):
+            raise BatchError("each leaf must be an object")
+        waypoint_id, lat, lon = _require(leaf, "waypoint_id", "lat", "lon")
+        try:
+            parsed.append((int(waypoint_id), float(lat), float(lon), int(leaf.get("num", num))))
+        except (TypeError, ValueError):
+            raise BatchError("leaf waypoint_id, lat, lon and num must be numbers") from None
+    return parsed
+
+
+def _explore_pois(args: dict[str, Any]) -> list[dict]:
+    """Run the shared POI discovery for an `explore` operation (network only, no DB)."""
+    leaves = _explore_leaves(args)
+    try:
+        radius = int(args.get("radius", 500))
+    except (TypeError, ValueError):
+        raise BatchError("radius must be a number") from None
+    per_leaf = max(num for *_, num in leaves)
+    fetch = per_leaf * EXCLUDE_OVERFETCH if _has_excludes(args) else per_leaf
+    return discover_for_points(
+        [(lat, lon) for _, lat, lon, _ in leaves],
+        limit=fetch,
+        radius=radius,
+        categories=args.get("categories"),
+    )
+
+
+def _op_explore(session: Session, args: dict[str, Any]) -> list[dict]:
+    """Discover and link children for several leaves from one shared discovery.
+
+    Args: leaves [{waypoint_id, lat, lon, num?}], num (default 3), radius,
+    categories, and the same exclusions as `discover`. Nearby leaves share one
+    category fan-out, and each POI goes to at most one leaf, nearest first.
+    Returns [{"id": leaf_id, "children": [waypoint, ...]}] in leaf order.
+    """
+    leaves = _explore_leaves(args)
+    pois = args.pop("_prefetched", None)
+    if pois is None:
+        pois = _explore_pois(args)
+
+    assigned = assign_nearest(
+        [(lat, lon) for _, lat, lon, _ in leaves],
+        [num for *_, num in leaves],
+        _exclude_known(session, args, pois),
+    )
+    created = iter(
+        create_waypoints_from_pois(session, [poi for group in assigned for poi in group], commit=False)
+    )
+    results = []
+    for (waypoint_id, *_), group in zip(leaves, assigned):
+        children = [next(created) for _ in group]
+        if add_children_to_waypoint(session, waypoint_id, [child.id for child in children], commit=False) is None:
+            raise BatchError(f"Waypoint {waypoint_id} not found", 404)
+        results.append({"id": waypoint_id, "children": [child.to_dict() for child in children]})
+    return results
+
+
+def _op_create_waypoint(session: Session, args: dict[str, Any]) -> dict:
+    """Create one waypoint."""
+    lat, lon, name, api_id = _require(args, "lat", "lon", "name", "api_id")
+    waypoint = create_waypoint(
+        session, api_id, lat, lon, name, category=args.get("category"), commit=False
+    )
+    return waypoint.to_dict()
+
+
+def _op_set_visited(session: Session, args: dict[str, Any]) -> dict:
+    """Set visited status for one waypoint."""
+    (waypoint_id,) = _require(args, "waypoint_id")
+    waypoint = set_waypoint_visited(
+        session, int(waypoint_id), bool(args.get("visited", True)), commit=False
+    )
+    if not waypoint:
+        raise BatchError(f"Waypoint {waypoint_id} not found", 404)
+    return waypoint.to_dict()
+
+
+def _op_add_children(session: Session, args: dict[str, Any]) -> dict:
+    """Append child IDs to a waypoint."""
+    waypoint_id, child_ids = _require(args, "waypoint_id", "child_ids")
+    if not isinstance(child_ids, list):
+        raise BatchError("child_ids must be a list")
+    waypoint = add_children_to_waypoint(session, int(waypoint_id), child_ids, commit=False)
+    if not waypoint:
+        raise BatchError(f"Waypoint {waypoint_id} not found", 404)
+    return waypoint.to_dict()
+
+
+def _op_save_journal(session: Session, args: dict[str, Any]) -> dict:
+    """Save a journal entry for a (user, waypoint) pair."""
+    waypoint_id, user_id, content = _require(args, "waypoint_id", "user_id", "content")
+    if not str(content).strip():
+        raise BatchError("content must not be empty")
+    entry = create_journal_entry(
+        session, int(waypoint_id), int(user_id), str(content).strip(), commit=False
+    )
+    if entry is None:
+        raise BatchError(f"Waypoint {waypoint_id} or user {user_id} not found", 404)
+    return entry.to_dict()
+
+
+def _op_create_user(session: Session, args: dict[str, Any]) -> dict:
+    """Create a user."""
+    username, lat, lon = _require(args, "username", "lat", "lon")
+    if get_user_by_username(session, str(username)) is not None:
+        raise BatchError("username already exists", 409)
+    user = create_user(session, str(username), float(lat), float(lon), commit=False)
+    return user.to_dict()
+
+
+def _op_set_root(session: Session, args: dict[str, Any]) -> dict:
+    """Assign a user's root waypoint."""
+    user_id, root_waypoint_id = _require(args, "user_id", "root_waypoint_id")
+    user = set_user_root(session, int(user_id), int(root_waypoint_id), commit=False)
+    if not user:
+        raise BatchError(f"User {user_id} not found", 404)
+    return user.to_dict()
+
+
+def _op_get_tree(session: Session, args: dict[str, Any]) -> TreeDict:
+    """Return a user's tree as of this point in the batch."""
+    (user_id,) = _require(args, "user_id")
+    tree = get_waypoint_tree_for_user(session, int(user_id))
+    if tree is None:
+        raise BatchError("User or root waypoint not found", 404)
+    return tree
+
+
+OPERATIONS: dict[str, Callable[[Session, dict[str, Any]], Any]] = {
+    "discover": _op_discover,
+    "explore": _op_explore,
+    "create_waypoint": _op_create_waypoint,
+    "set_visited": _op_set_visited,
+    "add_children": _op_add_children,
+    "save_journal": _op_save_journal,
+    "create_user": _op_create_user,
+    "set_root": _op_set_root,
+    "get_tree": _op_get_tree,
+}
+
+# Network-only discovery run for ref-free operations before the transaction starts.
+PREFETCHERS: dict[str, Callable[[dict[str, Any]], list[dict]]] = {
+    "discover": _discover_pois,
+    "explore": _explore_pois,
+}
+
+
+# POST /api/batch
+@batch_bp.route("", methods=["POST"])
+def run_batch() -> tuple[Response, int]:
+    """Run an ordered list of operations in one transaction and return all results.
+
+    Body: {"operations": [{"op": str, "args": {...}, "ref": str?}, ...]}. Any arg may be
+    {"$ref": name} to use the ID (or list of IDs) produced by an earlier operation.
+    `discover` and `explore` operations without refs query POI providers before any row
+    is written, so the transaction never stays open across network calls it does not
+    depend on.
+    """
+    payload = request.get_json(silent=True) or {}
+    operations = payload.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"error": f"at most {MAX_BATCH_OPERATIONS} operations per batch"}), 400
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            return jsonify({"error": f"operation {index}: unknown op", "index": index}), 400
+        if not isinstance(operation.get("args", {}), dict):
+            return jsonify({"error": f"operation {index}: args must be an object", "index": index}), 400
+
+    for index, operation in enumerate(operations):
+        args = operation.setdefault("args", {})
+        args.pop("_prefetched", None)
+        prefetch = PREFETCHERS.get(operation["op"])
+        if prefetch is not None and not _has_ref(args):
+            try:
+                args["_prefetched"] = prefetch(args)
+            except BatchError as e:
+                return jsonify({"error": e.message, "index": index}), e.status
+
+    refs: dict[str, Any] = {}
+    results: list[Any] = []
+    for index, operation in enumerate(operations):
+        try:
+            args = _resolve(operation["args"], refs)
+            result = OPERATIONS[operation["op"]](g.db, args)
+        except BatchError as e:
+            g.db.rollback()
+            logger.warning(f"Batch rolled back at operation {index} ({operation['op']}): {e.message}")
+            return jsonify({"error": e.message, "index": index}), e.status
+        except ChildAppendConflict as e:
+            g.db.rollback()
+            logger.warning(f"Batch rolled back at operation {index} ({operation['op']}): {e}")
+            return jsonify({"error": "Too many concurrent changes to a waypoint, try again", "index": index}), 409
+        except (TypeError, ValueError) as e:
+            g.db.rollback()
+            return jsonify({"error": f"invalid args: {e}", "index": index}), 400
+        if operation.get("ref"):
+            refs[str(operation["ref"])] = result
+        results.append(result)
+
+    g.db.commit()
+    logger.info(f"Committed batch of {len(operations)} operations")
+    return jsonify({"results": results}), 200
@@ -3,13 +3,26 @@
 from flask import Blueprint, g, jsonify, request, Response
 from loguru import logger
 
-from backend.db.journal_queries import create_journal_entry, get_journal_entry
+from backend.db.engines import read_only
+from backend.db.journal_queries import (
+    create_journal_entry,
+    get_journal_entry,
+    list_journal_entries,
+    search_journal_entries,
+)
+from backend.query_inspector import query_budget
 
 journal_bp = Blueprint("journal", __name__, url_prefix="/api/journal")
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_WAYPOINT_IDS = 500
+MAX_SEARCH_RESULTS = 100
+
 
 # POST /api/journal
 @journal_bp.route("", methods=["POST"])
+@query_budget(4)
 def create_entry() -> tuple[Response, int]:
     """Create a journal entry for a (user, waypoint) pair."""
     payload = request.get_json(silent=True) or {}
@@ -21,15 +34,70 @@ def create_entry() -> tuple[Response, int]:
         return jsonify({"error": "waypoint_id, user_id, and content are required"}), 400
 
     entry = create_journal_entry(g.db, waypoint_id, user_id, content)
+    if entry is None:
+        return jsonify({"error": "Waypoint or user not found"}), 404
     logger.info(f"Journal entry saved for user {user_id}, waypoint {waypoint_id}")
     return jsonify(entry.to_dict()), 201
 
 
+# GET /api/journal/search?q=<text>&user_id=<id>&limit=<n>
+@journal_bp.route("/search", methods=["GET"])
+@read_only
+@query_budget(1)
+def search_entries() -> tuple[Response, int]:
+    """Full-text search over one user's journal, best match first.
+
+    Returns the matching waypoint IDs (for highlighting on the map) and a
+    snippet per match.
+    """
+    q = request.args.get("q", "").strip()
+    user_id = request.args.get("user_id", type=int)
+    if not q or user_id is None:
+        return jsonify({"error": "q and user_id are required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), MAX_SEARCH_RESULTS))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    results = search_journal_entries(g.db, user_id, q, limit)
+    return jsonify({"waypoint_ids": [hit["waypoint_id"] for hit in results], "results": results}), 200
+
+
 # GET /api/journal/<waypoint_id>/<user_id>
 @journal_bp.route("/<int:waypoint_id>/<int:user_id>", methods=["GET"])
+@read_only
+@query_budget(2)
 def get_entry(waypoint_id: int, user_id: int) -> tuple[Response, int]:
     """Return the journal entry for a (user, waypoint) pair."""
     entry = get_journal_entry(g.db, waypoint_id, user_id)
     if not entry:
         return jsonify({"error": "Journal entry not found"}), 404
     return jsonify(entry.to_dict()), 200
+
+
+# GET /api/journal/user/<user_id>?waypoint_ids=<id,id,...>&after=<waypoint_id>&limit=<n>
+@journal_bp.route("/user/<int:user_id>", methods=["GET"])
+@read_only
+@query_budget(1)
+def list_user_entries(user_id: int) -> tuple[Response, int]:
+    """Return a page of a user's journal entries, optionally only for the given waypoints.
+
+    Pages are ordered by waypoint ID; pass the response's `next_after` as `after`
+    to fetch the next page. `next_after` is null on the last page.
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        after = request.args.get("after", type=int)
+        raw_ids = request.args.get("waypoint_ids")
+        waypoint_ids = (
+            [int(part) for part in raw_ids.split(",") if part.strip()] if raw_ids else None
+        )
+    except ValueError:
+        return jsonify({"error": "limit, after and waypoint_ids must be integers"}), 400
+    if waypoint_ids is not None and len(waypoint_ids) > MAX_WAYPOINT_IDS:
+        return jsonify({"error": f"at most {MAX_WAYPOINT_IDS} waypoint_ids per request"}), 400
+
+    entries = list_journal_entries(g.db, user_id, waypoint_ids, after, limit + 1)
+    page = entries[:limit]
+    next_after = page[-1].waypoint_id if len(entries) > limit else None
+    return jsonify({"entries": [entry.to_dict() for entry in page], "next_after": next_after}), 200
@@ -1,30 +1,102 @@
 """User API routes."""
 
-from flask import Blueprint, g, jsonify, request, Response
+import json
+from collections.abc import Iterator
+from typing import Any
+
+from flask import Blueprint, g, jsonify, request, Response, stream_with_context
 from loguru import logger
+from sqlalchemy.orm import Session
 
+from backend.db.engines import read_only
+from backend.db.journal_queries import bulk_create_journal_entries, list_journal_entries
 from backend.db.user_queries import (
     create_user as create_user_query,
     get_user as get_user_query,
     get_user_by_username as get_user_by_username_query,
     list_users as list_users_query,
+    search_users_by_prefix,
     set_user_root as set_user_root_query,
 )
-from backend.services.osm import search_address
+from backend.db.waypoint_queries import import_waypoint_tree, iter_subtree_chunks, list_visits
+from backend.query_inspector import query_budget
+from backend.routes.visit_paging import parse_visit_page_args, split_visit_page
+from backend.services.autocomplete import autocomplete_address
+from backend.services.tree_io import geojson_chunks, gpx_chunks, parse_geojson_tree
 
 user_bp = Blueprint("user", __name__, url_prefix="/api/user")
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+EXPORT_FORMATS = {
+    "geojson": (geojson_chunks, "application/geo+json", "geojson"),
+    "gpx": (gpx_chunks, "application/gpx+xml", "gpx"),
+}
+
+
+def _export_batches(session: Session, user_id: int, root_id: int) -> Iterator[list[dict[str, Any]]]:
+    """Yield export nodes for a user's tree, one waypoint query (plus its journal entries) at a time."""
+    for chunk in iter_subtree_chunks(session, root_id):
+        ids = [row.id for row, _, _ in chunk]
+        journals = {
+            entry.waypoint_id: entry.content
+            for entry in list_journal_entries(session, user_id, ids, limit=len(ids))
+        }
+        yield [
+            {
+                "id": row.id,
+                "parent_id": parent_id,
+                "depth": depth,
+                "lat": row.lat,
+                "lon": row.lon,
+                "name": row.name,
+                "api_id": row.api_id,
+                "category": row.category,
+                "visited": row.visited,
+                "visited_at": row.visited_at.isoformat() if row.visited_at else None,
+                "journal": journals.get(row.id),
+            }
+            for row, parent_id, depth in chunk
+        ]
+
 
-# GET /api/user
+# GET /api/user?after_id=<id>&limit=<n>
+# GET /api/user?prefix=<text>&after_username=<name>&limit=<n>
 @user_bp.route("", methods=["GET"])
+@read_only
+@query_budget(1)
 def list_users() -> tuple[Response, int]:
-    """Return all users."""
-    users = list_users_query(g.db)
-    return jsonify([user.to_dict() for user in users]), 200
+    """Return one page of users.
+
+    Without `prefix`, users are ordered by ID and `next_after_id` is the cursor
+    for the next page. With `prefix`, only usernames starting with it are
+    returned, ordered by username, and `next_after_username` is the cursor.
+    The cursor is null on the last page.
+    """
+    prefix = request.args.get("prefix", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        after_id = int(request.args["after_id"]) if "after_id" in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit and after_id must be integers"}), 400
+
+    # Fetch one extra row to learn whether another page exists.
+    if prefix:
+        users = search_users_by_prefix(g.db, prefix, request.args.get("after_username"), limit + 1)
+        page = users[:limit]
+        cursor = {"next_after_username": page[-1].username if len(users) > limit else None}
+    else:
+        users = list_users_query(g.db, after_id, limit + 1)
+        page = users[:limit]
+        cursor = {"next_after_id": page[-1].id if len(users) > limit else None}
+    return jsonify({"users": [user.to_dict() for user in page], **cursor}), 200
 
 
 # GET /api/user/<id>
 @user_bp.route("/<int:user_id>", methods=["GET"])
+@read_only
+@query_budget(2)
 def get_user(user_id: int) -> tuple[Response, int]:
     """Return one user by ID."""
     user = get_user_query(g.db, user_id)
@@ -33,8 +105,31 @@ def get_user(user_id: int) -> tuple[Response, int]:
     return jsonify(user.to_dict()), 200
 
 
+# GET /api/user/<id>/visits?since=&until=&before=&before_id=&limit=
+@user_bp.route("/<int:user_id>/visits", methods=["GET"])
+@read_only
+@query_budget(2)
+def list_user_visits(user_id: int) -> tuple[Response, int]:
+    """Return a page of the waypoints a user has visited, most recent first.
+
+    `since` (inclusive) and `until` (exclusive) are ISO timestamps bounding
+    visited_at. Pass the response's `next_before` and `next_before_id` back as
+    `before` and `before_id` for the next page; both are null on the last page.
+    """
+    try:
+        limit, cursor, since, until = parse_visit_page_args(request.args, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not get_user_query(g.db, user_id):
+        return jsonify({"error": "User not found"}), 404
+    page, next_cursor = split_visit_page(list_visits(g.db, user_id, cursor, since, until, limit + 1), limit)
+    return jsonify({"visits": [waypoint.to_dict() for waypoint in page], **next_cursor}), 200
+
+
 # POST /api/user
 @user_bp.route("", methods=["POST"])
+@query_budget(4)
 def create_user() -> tuple[Response, int]:
     """Create a user from request payload."""
     payload = request.get_json(silent=True) or {}
@@ -67,8 +162,9 @@ def create_user() -> tuple[Response, int]:
 
 # GET /api/user/address-search?q=<query>&limit=<n>
 @user_bp.route("/address-search", methods=["GET"])
+@query_budget(0)
 def address_search() -> tuple[Response, int]:
-    """Return geocoded address suggestions from Photon."""
+    """Return geocoded address suggestions, served from cache where possible."""
     query = request.args.get("q", "").strip()
     limit_str = request.args.get("limit", "5")
     if not query:
@@ -80,7 +176,7 @@ def address_search() -> tuple[Response, int]:
         return jsonify({"error": "limit must be an integer"}), 400
 
     try:
-        results = search_address(query, limit=limit)
+        results = autocomplete_address(query, limit=limit)
     except Exception:
         logger.exception("Address search failed")
         return jsonify({"error": "address search failed"}), 502
@@ -90,6 +186,7 @@ def address_search() -> tuple[Response, int]:
 
 # PATCH /api/user/<id>/root
 @user_bp.route("/<int:user_id>/root", methods=["PATCH"])
+@query_budget(5)  # user SELECT, claim_tree's SELECT + UPDATE, root UPDATE, refresh
 def set_user_root(user_id: int) -> tuple[Response, int]:
     """Assign a root waypoint to a user."""
     payload = request.get_json(silent=True) or {}
@@ -103,3 +200,65 @@ def set_user_root(user_id: int) -> tuple[Response, int]:
         return jsonify({"error": "User not found"}), 404
     logger.info(f"User {user_id} assigned root waypoint {root_waypoint_id}")
     return jsonify(user.to_dict()), 200
+
+
+# GET /api/user/<id>/export?format=geojson|gpx
+@user_bp.route("/<int:user_id>/export", methods=["GET"])
+@read_only
+def export_tree(user_id: int) -> tuple[Response, int]:
+    """Stream a user's tree, with journal entries, as GeoJSON (default) or GPX.
+
+    Nodes are read breadth-first in batches and written as they arrive, so the
+    response never holds the whole tree in memory.
+    """
+    export_format = request.args.get("format", "geojson")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    user = get_user_query(g.db, user_id)
+    if not user or user.root_waypoint_id is None:
+        return jsonify({"error": "User or root waypoint not found"}), 404
+
+    serialize, mimetype, extension = EXPORT_FORMATS[export_format]
+    chunks = serialize(dict(user.to_dict()), _export_batches(g.db, user_id, user.root_waypoint_id))
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{user.username}.{extension}"'
+    return response, 200
+
+
+# POST /api/user/import?username=<name>
+@user_bp.route("/import", methods=["POST"])
+def import_tree() -> tuple[Response, int]:
+    """Create a user and their tree from a GeoJSON export, in one transaction.
+
+    The username defaults to the export's; pass ?username= to import under
+    another name. Waypoints get new IDs.
+    """
+    try:
+        document = json.load(request.stream)
+        exported_user, nodes = parse_geojson_tree(document)
+    except ValueError as e:
+        return jsonify({"error": f"invalid tree export: {e}"}), 400
+    del document
+
+    username = request.args.get("username") or exported_user.get("username")
+    if not username:
+        return jsonify({"error": "username is required"}), 400
+    if get_user_by_username_query(g.db, str(username)) is not None:
+        return jsonify({"error": "username already exists"}), 409
+
+    root = nodes[0]
+    user = create_user_query(
+        g.db,
+        username=str(username),
+        lat=exported_user["lat"],
+        lon=exported_user["lon"],
+        commit=False,
+    )
+    new_ids = import_waypoint_tree(g.db, nodes, owner_id=user.id, commit=False)
+    user.root_waypoint_id = new_ids[root["id"]]
+    bulk_create_journal_entries(
+        g.db, user.id, {new_ids[node["id"]]: node["journal"] for node in nodes if node["journal"]}, commit=False
+    )
+    g.db.commit()
+    logger.info(f"Imported {len(nodes)} waypoints for user '{username}' (id={user.id})")
+    return jsonify({"user": user.to_dict(), "waypoints": len(nodes)}), 201
@@ -0,0 +1,40 @@
+"""Query-string parsing and cursors shared by the visit-timeline routes."""
+
+from collections.abc import Mapping
+from datetime import datetime
+
+from backend.models.waypoint import Waypoint
+
+VisitCursor = tuple[datetime, int]
+
+
+def parse_visit_page_args(
+    args: Mapping[str, str], default_limit: int, max_limit: int
+) -> tuple[int, VisitCursor | None, datetime | None, datetime | None]:
+    """Return (limit, before cursor, since, until) from `limit`, `before`, `before_id`, `since`, `until`.
+
+    Raises ValueError with a client-facing message on malformed values.
+    """
+    try:
+        limit = max(1, min(int(args.get("limit", default_limit)), max_limit))
+        since, until, before = (
+            datetime.fromisoformat(args[name]) if name in args else None
+            for name in ("since", "until", "before")
+        )
+        before_id = int(args["before_id"]) if "before_id" in args else None
+    except ValueError:
+        raise ValueError("limit and before_id must be integers; since, until and before ISO timestamps") from None
+    if (before is None) != (before_id is None):
+        raise ValueError("before and before_id must be given together")
+    cursor = (before, before_id) if before is not None and before_id is not None else None
+    return limit, cursor, since, until
+
+
+def split_visit_page(visits: list[Waypoint], limit: int) -> tuple[list[Waypoint], dict]:
+    """Trim a `limit + 1` fetch to one page and return it with its next_before/next_before_id."""
+    page = visits[:limit]
+    last = page[-1] if len(visits) > limit else None
+    return page, {
+        "next_before": last.visited_at.isoformat() if last and last.visited_at else None,
+        "next_before_id": last.id if last else None,
+    }
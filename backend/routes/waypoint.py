@@ -1,22 +1,74 @@
 """Waypoint API routes."""
 
-from flask import Blueprint, g, jsonify, request, Response
+import json
+import os
+
+from flask import Blueprint, current_app, g, jsonify, request, Response
 from loguru import logger
 
+from backend.db.engines import read_only
 from backend.db.waypoint_queries import (
+    ChildAppendConflict,
     add_children_to_waypoint,
     create_waypoint,
+    create_waypoints_from_pois,
     get_waypoint as get_waypoint_query,
+    get_tree_waypoint_ids,
+    get_waypoint_clusters_in_bbox,
     get_waypoint_tree_for_user,
+    get_waypoints_by_ids,
+    get_waypoints_in_bbox,
+    list_visits,
     set_waypoint_visited,
 )
+from backend.events import RESYNC, TREE_EVENTS
+from backend.query_inspector import query_budget
+from backend.routes.visit_paging import parse_visit_page_args, split_visit_page
 from backend.services.osm import query_nearby
+from backend.services.tiles import CLUSTER_MAX_ZOOM, MAX_ZOOM, cell_size, tile_bounds
 
 waypoint_bp = Blueprint("waypoint", __name__, url_prefix="/api/waypoint")
 
+MAX_VIEWPORT_WAYPOINTS = 1000  # Beyond this, even high-zoom viewports are clustered
+MAX_VIEWPORT_GRID = 32  # Cells per axis at most, so a clustered payload stays under ~1k entries
+DEFAULT_RECENT_PAGE_SIZE = 50
+MAX_RECENT_PAGE_SIZE = 200
+TREE_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("TREE_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+
+def _viewport_payload(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int, owner_id: int | None
+) -> dict:
+    """Return waypoints inside a viewport, clustered server-side when zoomed out or dense."""
+    if zoom >= CLUSTER_MAX_ZOOM:
+        waypoints = get_waypoints_in_bbox(
+            g.db, min_lat, min_lon, max_lat, max_lon, limit=MAX_VIEWPORT_WAYPOINTS + 1, owner_id=owner_id
+        )
+        if len(waypoints) <= MAX_VIEWPORT_WAYPOINTS:
+            return {"zoom": zoom, "waypoints": [w.to_dict() for w in waypoints], "clusters": []}
+
+    cell_lat, cell_lon = cell_size(zoom, (min_lat + max_lat) / 2)
+    # A bbox much larger than the zoom's screen area would otherwise split into
+    # one cell per waypoint; widen the cells so the grid stays bounded.
+    cell_lat = max(cell_lat, (max_lat - min_lat) / MAX_VIEWPORT_GRID)
+    cell_lon = max(cell_lon, (max_lon - min_lon) / MAX_VIEWPORT_GRID)
+    cells = get_waypoint_clusters_in_bbox(
+        g.db, min_lat, min_lon, max_lat, max_lon, cell_lat, cell_lon, owner_id=owner_id
+    )
+    single_ids = [cell["first_id"] for cell in cells if cell["count"] == 1]
+    clusters = [
+        {"lat": cell["lat"], "lon": cell["lon"], "count": cell["count"], "bounds": cell["bounds"]}
+        for cell in cells
+        if cell["count"] > 1
+    ]
+    waypoints = get_waypoints_by_ids(g.db, single_ids)
+    return {"zoom": zoom, "waypoints": [w.to_dict() for w in waypoints], "clusters": clusters}
+
 
 # GET /api/waypoint/<id>
 @waypoint_bp.route("/<int:waypoint_id>", methods=["GET"])
+@read_only
+@query_budget(2)
 def get_waypoint(waypoint_id: int) -> tuple[Response, int]:
     """Return one waypoint by ID."""
     waypoint = get_waypoint_query(g.db, waypoint_id)
@@ -25,8 +77,72 @@ def get_waypoint(waypoint_id: int) -> tuple[Response, int]:
     return jsonify(waypoint.to_dict()), 200
 
 
+# GET /api/waypoint/bbox?min_lat=&min_lon=&max_lat=&max_lon=&zoom=&owner_id=
+@waypoint_bp.route("/bbox", methods=["GET"])
+@read_only
+@query_budget(3)
+def get_bbox() -> tuple[Response, int]:
+    """Return waypoints and clusters inside a map viewport."""
+    try:
+        min_lat = float(request.args["min_lat"])
+        min_lon = float(request.args["min_lon"])
+        max_lat = float(request.args["max_lat"])
+        max_lon = float(request.args["max_lon"])
+        zoom = int(request.args.get("zoom", CLUSTER_MAX_ZOOM))
+        owner_id = int(request.args["owner_id"]) if "owner_id" in request.args else None
+    except (KeyError, ValueError):
+        return (
+            jsonify({"error": "min_lat, min_lon, max_lat, max_lon (floats) and zoom (int) are required; owner_id is an int"}),
+            400,
+        )
+
+    if min_lat > max_lat or min_lon > max_lon:
+        return jsonify({"error": "min_lat/min_lon must not exceed max_lat/max_lon"}), 400
+    if not 0 <= zoom <= MAX_ZOOM:
+        return jsonify({"error": f"zoom must be between 0 and {MAX_ZOOM}"}), 400
+
+    return jsonify(_viewport_payload(min_lat, min_lon, max_lat, max_lon, zoom, owner_id)), 200
+
+
+# GET /api/waypoint/tiles/<z>/<x>/<y>?owner_id=
+@waypoint_bp.route("/tiles/<int:z>/<int:x>/<int:y>", methods=["GET"])
+@read_only
+@query_budget(3)
+def get_tile(z: int, x: int, y: int) -> tuple[Response, int]:
+    """Return waypoints and clusters inside one slippy-map tile."""
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2**z or not 0 <= y < 2**z:
+        return jsonify({"error": "Tile coordinates out of range"}), 400
+    try:
+        owner_id = int(request.args["owner_id"]) if "owner_id" in request.args else None
+    except ValueError:
+        return jsonify({"error": "owner_id must be an integer"}), 400
+
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    return jsonify(_viewport_payload(min_lat, min_lon, max_lat, max_lon, z, owner_id)), 200
+
+
+# GET /api/waypoint/recent?since=&until=&before=&before_id=&limit=
+@waypoint_bp.route("/recent", methods=["GET"])
+@read_only
+@query_budget(1)
+def get_recent_visits() -> tuple[Response, int]:
+    """Return the most recently visited waypoints across all users, newest first.
+
+    Each item carries `owner_id`. Filters and `next_before`/`next_before_id`
+    paging work as for GET /api/user/<id>/visits.
+    """
+    try:
+        limit, cursor, since, until = parse_visit_page_args(request.args, DEFAULT_RECENT_PAGE_SIZE, MAX_RECENT_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    page, next_cursor = split_visit_page(list_visits(g.db, None, cursor, since, until, limit + 1), limit)
+    return jsonify({"visits": [{**waypoint.to_dict(), "owner_id": waypoint.owner_id} for waypoint in page], **next_cursor}), 200
+
+
 # GET /api/waypoint/tree/<user_id>
 @waypoint_bp.route("/tree/<int:user_id>", methods=["GET"])
+@read_only
 def get_tree_by_user(user_id: int) -> tuple[Response, int]:
     """Return the full waypoint tree for a user."""
     tree = get_waypoint_tree_for_user(g.db, user_id)
@@ -35,8 +151,65 @@ def get_tree_by_user(user_id: int) -> tuple[Response, int]:
     return jsonify(tree), 200
 
 
+def _sse(event_type: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+# GET /api/waypoint/tree/<user_id>/events
+@waypoint_bp.route("/tree/<int:user_id>/events", methods=["GET"])
+def stream_tree_events(user_id: int) -> tuple[Response, int]:
+    """Stream node-level changes to a user's tree as server-sent events.
+
+    Sends `ready` first, then `visited` and `children_added` (with the new child
+    nodes in tree shape) as other requests commit them. `resync` means events were
+    missed or the root changed, and the client should refetch the whole tree.
+    """
+    subscription = TREE_EVENTS.subscribe(user_id)
+    if subscription is None:
+        return jsonify({"error": "Too many open event streams"}), 503
+    waypoint_ids = get_tree_waypoint_ids(g.db, user_id)
+    if waypoint_ids is None:
+        TREE_EVENTS.unsubscribe(subscription)
+        return jsonify({"error": "User or root waypoint not found"}), 404
+    subscription.track(waypoint_ids)
+    session_factory = current_app.extensions["db_sessionmaker"]
+
+    def stream():
+        yield "retry: 3000\n\n" + _sse("ready", {"user_id": user_id})
+        while True:
+            tree_event = subscription.get(TREE_EVENTS_KEEPALIVE_SECONDS)
+            if tree_event is None:
+                yield ": keepalive\n\n"
+                continue
+            if tree_event is not RESYNC and not subscription.wants(tree_event):
+                continue  # Queued before the tree was loaded, for another tree.
+            if tree_event["type"] == "children_added":
+                with session_factory() as session:
+                    children = get_waypoints_by_ids(session, tree_event["child_ids"])
+                # Only fresh leaves can be patched in; anything with a subtree needs a refetch.
+                if all(not child.children for child in children):
+                    nodes = [{**child.to_dict(), "children": []} for child in children]
+                    yield _sse("children_added", {"waypoint_id": tree_event["waypoint_id"], "children": nodes})
+                    continue
+                tree_event = RESYNC
+            if tree_event is RESYNC or tree_event["type"] == "root_changed":
+                with session_factory() as session:
+                    subscription.track(get_tree_waypoint_ids(session, user_id) or set())
+                yield _sse("resync", {"user_id": user_id})
+                continue
+            yield _sse(tree_event["type"], {key: value for key, value in tree_event.items() if key != "type"})
+
+    response = Response(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream.
+    response.call_on_close(lambda: TREE_EVENTS.unsubscribe(subscription))
+    return response, 200
+
+
 # PATCH /api/waypoint/<id>/visited
 @waypoint_bp.route("/<int:waypoint_id>/visited", methods=["PATCH"])
+@query_budget(4)
 def set_visited(waypoint_id: int) -> tuple[Response, int]:
     """Update visited status for one waypoint."""
     payload = request.get_json(silent=True) or {}
@@ -52,6 +225,7 @@ def set_visited(waypoint_id: int) -> tuple[Response, int]:
 
 # POST /api/waypoint
 @waypoint_bp.route("", methods=["POST"])
+@query_budget(3)
 def create_single_waypoint() -> tuple[Response, int]:
     """Create a single waypoint."""
     payload = request.get_json(silent=True) or {}
@@ -70,6 +244,7 @@ def create_single_waypoint() -> tuple[Response, int]:
 
 # PATCH /api/waypoint/<id>/children
 @waypoint_bp.route("/<int:waypoint_id>/children", methods=["PATCH"])
+@query_budget(6)
 def add_children(waypoint_id: int) -> tuple[Response, int]:
     """Add children to a waypoint."""
     payload = request.get_json(silent=True) or {}
@@ -78,7 +253,12 @@ def add_children(waypoint_id: int) -> tuple[Response, int]:
     if child_ids is None or not isinstance(child_ids, list):
         return jsonify({"error": "child_ids must be a list"}), 400
 
-    add_children_to_waypoint(g.db, waypoint_id, child_ids)
+    try:
+        add_children_to_waypoint(g.db, waypoint_id, child_ids)
+    except ChildAppendConflict as e:
+        g.db.rollback()
+        logger.warning(str(e))
+        return jsonify({"error": "Too many concurrent changes to this waypoint, try again"}), 409
     waypoint = get_waypoint_query(g.db, waypoint_id)
     if not waypoint:
         return jsonify({"error": "Waypoint not found"}), 404
@@ -88,6 +268,7 @@ def add_children(waypoint_id: int) -> tuple[Response, int]:
 
 # POST /api/waypoint/osm
 @waypoint_bp.route("/osm", methods=["POST"])
+@query_budget(4)
 def create_from_osm() -> tuple[Response, int]:
     """Query OSM for nearby POIs and create waypoints from the results."""
     payload = request.get_json(silent=True) or {}
@@ -103,12 +284,7 @@ def create_from_osm() -> tuple[Response, int]:
 
     results = query_nearby(lat, lon, limit=num, radius=radius, categories=categories)
 
-    created = []
-    for r in results:
-        waypoint = create_waypoint(
-            g.db, api_id=str(r["id"]), lat=r["lat"], lon=r["lon"], name=r["name"], category=r.get("category")
-        )
-        created.append(waypoint.to_dict())
+    created = [waypoint.to_dict() for waypoint in create_waypoints_from_pois(g.db, results)]
 
     logger.info(
         f"Created {len(created)} waypoints from OSM query at ({lat:.4f}, {lon:.4f})"
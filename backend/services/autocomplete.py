@@ -0,0 +1,235 @@
+"""Cached address autocomplete in front of Photon geocoding."""
+
+import bisect
+import csv
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from time import monotonic
+from typing import Any
+
+from loguru import logger
+
+from backend.services.osm import search_address
+
+AUTOCOMPLETE_CACHE_SIZE = int(os.getenv("AUTOCOMPLETE_CACHE_SIZE", "2048"))
+AUTOCOMPLETE_TTL_SECONDS = float(os.getenv("AUTOCOMPLETE_TTL_SECONDS", "3600"))
+AUTOCOMPLETE_MIN_UPSTREAM_CHARS = int(os.getenv("AUTOCOMPLETE_MIN_UPSTREAM_CHARS", "0"))  # 0: always ask Photon
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+
+UPSTREAM_LIMIT = 10  # Always fetch the max so cached entries can answer longer prefixes
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation, and collapse whitespace in a search query."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", query.lower())).strip()
+
+
+def _matches(label: str, tokens: list[str]) -> bool:
+    """Return True if every query token prefixes some word of the label."""
+    words = normalize_query(label).split()
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+class _CacheEntry:
+    """Upstream results for one normalized query."""
+
+    __slots__ = ("results", "complete", "expires_at")
+
+    def __init__(self, results: list[dict[str, Any]], complete: bool, expires_at: float):
+        self.results = results
+        self.complete = complete  # Upstream returned fewer than requested: nothing was truncated
+        self.expires_at = expires_at
+
+
+class AddressCache:
+    """Thread-safe LRU of normalized query → upstream results with TTL expiry."""
+
+    def __init__(self, max_size: int = AUTOCOMPLETE_CACHE_SIZE, ttl: float = AUTOCOMPLETE_TTL_SECONDS):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> _CacheEntry | None:
+        """Return a live entry for key and mark it most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, results: list[dict[str, Any]], complete: bool) -> None:
+        """Store results for key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = _CacheEntry(results, complete, monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def lookup_prefix(self, key: str, limit: int) -> list[dict[str, Any]] | None:
+        """
+        Answer key by filtering the cached results of its longest cached prefix.
+
+        A prefix entry can only be reused if it was complete (upstream had no more
+        matches to give) or still yields at least `limit` matches after filtering.
+        """
+        tokens = key.split()
+        for end in range(len(key) - 1, 0, -1):
+            entry = self.get(key[:end])
+            if entry is None:
+                continue
+            filtered = [r for r in entry.results if _matches(r["name"], tokens)]
+            if entry.complete or len(filtered) >= limit:
+                return filtered[:limit]
+        return None
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+class Gazetteer:
+    """Sorted in-memory name index over a local CSV or JSON file of common places."""
+
+    def __init__(self, places: list[dict[str, Any]]):
+        rows = sorted((normalize_query(p["name"]), p) for p in places if p.get("name"))
+        self._keys = [key for key, _ in rows]
+        self._places = [place for _, place in rows]
+
+    @classmethod
+    def from_file(cls, path: Path) -> "Gazetteer":
+        """Load places from a `.csv` (name,lat,lon columns) or `.json` list file."""
+        if path.suffix.lower() == ".csv":
+            with path.open(newline="", encoding="utf-8") as f:
+                places = [
+                    {"name": row["name"], "lat": float(row["lat"]), "lon": float(row["lon"])}
+                    for row in csv.DictReader(f)
+                ]
+        else:
+            with path.open(encoding="utf-8") as f:
+                places = [
+                    {"name": p["name"], "lat": float(p["lat"]), "lon": float(p["lon"])}
+                    for p in json.load(f)
+                ]
+        logger.info(f"Loaded {len(places)} gazetteer places from {path}")
+        return cls(places)
+
+    def search(self, key: str, limit: int) -> list[dict[str, Any]]:
+        """Return up to `limit` places whose normalized name starts with key."""
+        results: list[dict[str, Any]] = []
+        i = bisect.bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i].startswith(key) and len(results) < limit:
+            results.append(self._places[i])
+            i += 1
+        return results
+
+
+_cache = AddressCache()
+_inflight: dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_gazetteer: Gazetteer | None = None
+_gazetteer_loaded = False
+_gazetteer_lock = threading.Lock()
+
+
+def _get_gazetteer() -> Gazetteer | None:
+    """Lazily load the gazetteer configured by GAZETTEER_PATH, if any."""
+    global _gazetteer, _gazetteer_loaded
+    if _gazetteer_loaded:
+        return _gazetteer
+    with _gazetteer_lock:
+        if not _gazetteer_loaded:
+            path = Path(GAZETTEER_PATH) if GAZETTEER_PATH else None
+            if path is not None and path.exists():
+                _gazetteer = Gazetteer.from_file(path)
+            elif path is not None:
+                logger.warning(f"GAZETTEER_PATH {path} does not exist; gazetteer disabled")
+            _gazetteer_loaded = True
+    return _gazetteer
+
+
+def _fetch_coalesced(key: str) -> list[dict[str, Any]]:
+    """Fetch key from Photon, sharing one upstream call among concurrent identical queries."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        results = search_address(key, limit=UPSTREAM_LIMIT)
+        _cache.put(key, results, complete=len(results) < UPSTREAM_LIMIT)
+        future.set_result(results)
+        return results
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def autocomplete_address(query: str, limit: int = 5) -> list[dict[str, Any]]:
+    """
+    Return up to `limit` address suggestions for a partially typed query.
+
+    Lookup order: local gazetteer, exact cache hit, cached prefix reuse, and only
+    then Photon. Identical concurrent upstream queries are coalesced into one call,
+    and, if AUTOCOMPLETE_MIN_UPSTREAM_CHARS is set, shorter queries never leave the process.
+
+    Parameters
+    ----------
+    query : str
+        Raw user input.
+    limit : int, optional
+        Maximum number of suggestions (default: 5).
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        Suggestions shaped like `search_address` results: name, lat, lon.
+
+    Raises
+    ------
+    requests.RequestException
+        If the upstream Photon request fails.
+    """
+    key = normalize_query(query)
+    if not key:
+        return []
+
+    gazetteer = _get_gazetteer()
+    if gazetteer is not None:
+        local = gazetteer.search(key, limit)
+        if len(local) >= limit:
+            return local
+
+    entry = _cache.get(key)
+    if entry is not None:
+        return entry.results[:limit]
+
+    reused = _cache.lookup_prefix(key, limit)
+    if reused is not None:
+        return reused
+
+    if len(key) < AUTOCOMPLETE_MIN_UPSTREAM_CHARS:
+        return gazetteer.search(key, limit) if gazetteer is not None else []
+
+    return _fetch_coalesced(key)[:limit]
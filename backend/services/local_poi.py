@@ -0,0 +1,235 @@
+"""Offline POI provider backed by an on-disk SQLite R*Tree index.
+
+Build an index from an OSM extract, then run with POI_PROVIDER=local:
+
+    python -m backend.services.local_poi import extract.geojson --db pois.db
+    python -m backend.services.local_poi import extract.csv --db pois.db
+"""
+
+import argparse
+import csv
+import json
+import math
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from backend.services.osm import POI_CATEGORIES
+from backend.services.scoring import haversine_many, top_k_indices
+
+METERS_PER_DEGREE_LAT = 111_320
+IMPORT_BATCH_SIZE = 5_000
+
+# OSM tag → discovery category, checked in order; a value of None matches any tag value.
+_TAG_CATEGORIES: list[tuple[str, str | None, str]] = [
+    ("amenity", "restaurant", "restaurant"),
+    ("amenity", "fast_food", "restaurant"),
+    ("amenity", "cafe", "cafe"),
+    ("leisure", "park", "park"),
+    ("tourism", "museum", "museum"),
+    ("tourism", "attraction", "attraction"),
+    ("shop", None, "shop"),
+    ("natural", None, "natural"),
+    ("tourism", None, "tourism"),
+    ("historic", None, "historic"),
+    ("leisure", None, "leisure"),
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pois (
+    id INTEGER PRIMARY KEY,
+    osm_type TEXT NOT NULL,
+    osm_id INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    UNIQUE (osm_type, osm_id)
+);
+CREATE INDEX IF NOT EXISTS pois_name ON pois (name COLLATE NOCASE);
+CREATE VIRTUAL TABLE IF NOT EXISTS poi_index USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS poi_categories (
+    category TEXT NOT NULL,
+    poi_id INTEGER NOT NULL,
+    PRIMARY KEY (category, poi_id)
+) WITHOUT ROWID;
+"""
+
+
+def categories_for_tags(tags: dict[str, Any]) -> list[str]:
+    """Return the discovery categories an OSM tag set belongs to."""
+    found: list[str] = []
+    for key, value, category in _TAG_CATEGORIES:
+        tag_value = tags.get(key)
+        if tag_value is None or (value is not None and tag_value != value):
+            continue
+        if category not in found:
+            found.append(category)
+    return found
+
+
+def _feature_row(props: dict[str, Any], lat: float, lon: float) -> tuple | None:
+    """Normalize one extract record into (osm_type, osm_id, name, lat, lon, categories)."""
+    name = props.get("name")
+    osm_type = props.get("osm_type")
+    osm_id = props.get("osm_id")
+    if not all([name, osm_type, osm_id]):
+        return None
+
+    explicit = props.get("category") or props.get("categories")
+    if isinstance(explicit, str):
+        categories = [c.strip() for c in explicit.split(";") if c.strip()]
+    elif isinstance(explicit, list):
+        categories = [str(c) for c in explicit]
+    else:
+        tags = dict(props.get("tags") or {})
+        if props.get("osm_key"):
+            tags.setdefault(props["osm_key"], props.get("osm_value"))
+        for key, _, _ in _TAG_CATEGORIES:
+            if key in props:
+                tags.setdefault(key, props[key])
+        categories = categories_for_tags(tags)
+
+    categories = [c for c in categories if c in POI_CATEGORIES]
+    if not categories:
+        return None
+    return (str(osm_type), int(osm_id), str(name), float(lat), float(lon), categories)
+
+
+def iter_geojson(path: Path) -> Iterator[tuple]:
+    """Yield normalized rows from a GeoJSON FeatureCollection of Point features."""
+    with path.open(encoding="utf-8") as f:
+        collection = json.load(f)
+    for feature in collection.get("features", []):
+        coords = (feature.get("geometry") or {}).get("coordinates", [])
+        if len(coords) != 2:
+            continue
+        row = _feature_row(feature.get("properties", {}), coords[1], coords[0])
+        if row is not None:
+            yield row
+
+
+def iter_csv(path: Path) -> Iterator[tuple]:
+    """Yield normalized rows from a CSV with osm_type,osm_id,name,lat,lon,category columns."""
+    with path.open(newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            try:
+                lat, lon = float(record.pop("lat")), float(record.pop("lon"))
+            except (KeyError, TypeError, ValueError):
+                continue
+            row = _feature_row(record, lat, lon)
+            if row is not None:
+                yield row
+
+
+def _to_feature(osm_type: str, osm_id: int, name: str, lat: float, lon: float) -> dict:
+    """Shape a stored POI exactly like a Photon GeoJSON feature."""
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {"osm_type": osm_type, "osm_id": osm_id, "name": name},
+    }
+
+
+class LocalPOIIndex:
+    """On-disk spatial POI index answering nearest-k queries by category and radius."""
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def import_rows(self, rows: Iterable[tuple]) -> int:
+        """Upsert normalized rows in batched transactions and return how many were stored."""
+        conn = self._connect()
+        count = 0
+        batch: list[tuple] = []
+
+        def flush() -> None:
+            with conn:
+                for osm_type, osm_id, name, lat, lon, categories in batch:
+                    poi_id = conn.execute(
+                        "INSERT INTO pois (osm_type, osm_id, name, lat, lon) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (osm_type, osm_id) DO UPDATE SET "
+                        "name = excluded.name, lat = excluded.lat, lon = excluded.lon "
+                        "RETURNING id",
+                        (osm_type, osm_id, name, lat, lon),
+                    ).fetchone()[0]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO poi_index VALUES (?, ?, ?, ?, ?)",
+                        (poi_id, lat, lat, lon, lon),
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO poi_categories (category, poi_id) VALUES (?, ?)",
+                        [(category, poi_id) for category in categories],
+                    )
+            batch.clear()
+
+        for row in rows:
+            batch.append(row)
+            count += 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+        return count
+
+    def nearby(
+        self, category: str, lat: float, lon: float, limit: int, radius: int
+    ) -> list[dict]:
+        """Return the `limit` nearest features in category within radius meters."""
+        d_lat = radius / METERS_PER_DEGREE_LAT
+        d_lon = radius / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        rows = self._connect().execute(
+            "SELECT p.osm_type, p.osm_id, p.name, p.lat, p.lon FROM poi_index r "
+            "JOIN poi_categories c ON c.poi_id = r.id AND c.category = ? "
+            "JOIN pois p ON p.id = r.id "
+            "WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?",
+            (category, lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon),
+        ).fetchall()
+
+        distances = haversine_many(lat, lon, [row[3] for row in rows], [row[4] for row in rows])
+        in_range = [i for i, distance in enumerate(distances) if distance <= radius]
+        order = top_k_indices([distances[i] for i in in_range], limit)
+        return [_to_feature(*rows[in_range[i]]) for i in order]
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """Return up to `limit` features whose name starts with query (case-insensitive)."""
+        pattern = query.replace("%", r"\%").replace("_", r"\_") + "%"
+        rows = self._connect().execute(
+            "SELECT osm_type, osm_id, name, lat, lon FROM pois "
+            "WHERE name LIKE ? ESCAPE '\\' ORDER BY name LIMIT ?",
+            (pattern, limit),
+        ).fetchall()
+        return [_to_feature(*row) for row in rows]
+
+
+def main() -> None:
+    """Command-line entry point for building a local POI index."""
+    parser = argparse.ArgumentParser(description="Manage the offline POI index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="Import a GeoJSON or CSV POI extract")
+    import_cmd.add_argument("source", type=Path)
+    import_cmd.add_argument("--db", default="pois.db", help="Index file (default: pois.db)")
+    args = parser.parse_args()
+
+    reader = iter_csv if args.source.suffix.lower() == ".csv" else iter_geojson
+    index = LocalPOIIndex(args.db)
+    count = index.import_rows(reader(args.source))
+    logger.success(f"Imported {count} POIs from {args.source} into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 """Photon API calls for POI discovery."""
 
 import math
+import os
 import random
-from typing import Any
+from time import perf_counter
+from typing import Any, Protocol
 import requests
 from loguru import logger
 from tenacity import (
@@ -13,10 +15,26 @@ from tenacity import (
     RetryCallState,
 )
 
-PHOTON_URL = "https://photon.komoot.io/api/"
+from backend.metrics import (
+    PHOTON_REQUEST_DURATION,
+    PHOTON_REQUESTS,
+    PHOTON_RETRIES,
+    POI_CATEGORY_FETCHES,
+    POI_FEATURES,
+)
+from backend.profiling import profiled
+from backend.services.poi_stats import CategoryStat, CategoryStats, StatsKey, get_category_stats, stats_key
+from backend.services.scoring import group_points, haversine_many, nearest, score_candidates
+from backend.tracing import span
+
+PHOTON_URL = os.getenv("PHOTON_URL", "https://photon.komoot.io/api/")
+POI_PROVIDER = os.getenv("POI_PROVIDER", "photon")  # "photon" or "local"
+LOCAL_POI_DB = os.getenv("LOCAL_POI_DB", "pois.db")
 HEADERS = {"User-Agent": "BR@NCH/1.0 (Skill Tree Explorer)"}
 
-PER_CATEGORY_LIMIT = 5  # Request many results per category
+PER_CATEGORY_LIMIT = 5  # Features per category when there is no hit-rate history
+MAX_PER_CATEGORY_LIMIT = 50  # Upper bound when one query serves several leaves
+EXPLORE_GROUP_SPREAD_M = float(os.getenv("EXPLORE_GROUP_SPREAD_M", "2000"))
 
 POI_CATEGORIES = ["restaurant", "park", "museum", "cafe", "shop", "attraction",
                     "natural", "tourism", "historic", "leisure", ]
@@ -66,14 +84,38 @@ def _should_retry(retry_state: RetryCallState) -> bool:
     return isinstance(exception, requests.RequestException)
 
 
+def _before_retry_sleep(retry_state: RetryCallState) -> None:
+    """Log and count a Photon attempt that is about to be retried."""
+    PHOTON_RETRIES.inc()
+    logger.debug(
+        f"Retry {retry_state.attempt_number}/7 after "
+        f"{retry_state.outcome.exception() if retry_state.outcome else 'unknown error'}"
+    )
+
+
+def _photon_get(params: dict[str, Any]) -> dict[str, Any]:
+    """Issue one Photon request, recording its latency and outcome."""
+    start = perf_counter()
+    try:
+        with span("photon.attempt", q=params.get("q"), zoom=params.get("zoom")) as attempt_span:
+            response = requests.get(PHOTON_URL, params=params, headers=HEADERS, timeout=10)
+            attempt_span.set("http.status_code", response.status_code)
+            response.raise_for_status()
+            payload = response.json()
+    except requests.RequestException:
+        PHOTON_REQUESTS.labels("error").inc()
+        raise
+    finally:
+        PHOTON_REQUEST_DURATION.observe(perf_counter() - start)
+    PHOTON_REQUESTS.labels("ok").inc()
+    return payload
+
+
 @retry(
     stop=stop_after_attempt(7),
     wait=wait_exponential(multiplier=2, min=2, max=30),
     retry=_should_retry,
-    before_sleep=lambda retry_state: logger.debug(
-        f"Retry {retry_state.attempt_number}/7 after "
-        f"{retry_state.outcome.exception() if retry_state.outcome else 'unknown error'}"
-    ),
+    before_sleep=_before_retry_sleep,
 )
 def _fetch_category(params: dict[str, Any]) -> list[dict]:
     """
@@ -94,17 +136,88 @@ def _fetch_category(params: dict[str, Any]) -> list[dict]:
     requests.RequestException
         If request fails after all retry attempts.
     """
-    response = requests.get(PHOTON_URL, params=params, headers=HEADERS, timeout=10)
-    response.raise_for_status()
-    return response.json().get("features", [])
+    return _photon_get(params).get("features", [])
+
+
+def _parse_feature(feature: dict, category: str) -> dict[str, Any] | None:
+    """Extract a named POI candidate from a Photon feature, or None if incomplete."""
+    props = feature.get("properties", {})
+    coords = feature.get("geometry", {}).get("coordinates", [])
+    if len(coords) != 2:
+        return None
+
+    osm_type = props.get("osm_type")
+    osm_id = props.get("osm_id")
+    name = props.get("name")
+    if not all([osm_type, osm_id, name]):
+        return None
+
+    return {
+        "id": f"{osm_type}/{osm_id}",
+        "name": name,
+        "lat": coords[1],
+        "lon": coords[0],
+        "category": category,
+    }
+
+
+class POIProvider(Protocol):
+    """Source of Photon-shaped GeoJSON POI features for one category."""
+
+    def nearby(
+        self, category: str, lat: float, lon: float, limit: int, radius: int
+    ) -> list[dict]:
+        """Return up to `limit` features matching category around (lat, lon)."""
+        ...
+
+
+class PhotonProvider:
+    """POI provider backed by the Photon HTTP API at PHOTON_URL."""
+
+    def nearby(
+        self, category: str, lat: float, lon: float, limit: int, radius: int
+    ) -> list[dict]:
+        """Query Photon for category, biasing results by a zoom derived from radius."""
+        zoom = max(1, round(16 - math.log2(max(radius, 500) / 500)))
+        params = {
+            "q": category,
+            "lat": lat,
+            "lon": lon,
+            "limit": limit,
+            "zoom": zoom,
+        }
+        return _fetch_category(params)
+
+
+_provider: POIProvider | None = None
+
 
+def get_provider() -> POIProvider:
+    """Return the process-wide POI provider selected by POI_PROVIDER."""
+    global _provider
+    if _provider is None:
+        if POI_PROVIDER == "local":
+            from backend.services.local_poi import LocalPOIIndex
 
+            _provider = LocalPOIIndex(LOCAL_POI_DB)
+        elif POI_PROVIDER == "photon":
+            _provider = PhotonProvider()
+        else:
+            raise ValueError(f"Unknown POI_PROVIDER {POI_PROVIDER!r}")
+        logger.info(f"Using POI provider: {type(_provider).__name__}")
+    return _provider
+
+
+@profiled("query_nearby")
 def query_nearby(
     lat: float,
     lon: float,
     limit: int = 10,
     radius: int = 500,
     categories=None,
+    provider: POIProvider | None = None,
+    per_category_limit: int = PER_CATEGORY_LIMIT,
+    stats: CategoryStats | None = None,
 ) -> list[dict[str, Any]]:
     """
     Return up to `limit` closest named POI locations near (lat, lon).
@@ -113,6 +226,11 @@ def query_nearby(
     attractions), calculates distances, and returns the closest POIs across all
     categories, deduplicated by OSM ID.
 
+    Fetch sizes are shaped per category from the hit rates recorded for this
+    area in POI_STATS_DB (see `backend.services.poi_stats`): categories that
+    rarely land inside the radius or in the result ask for fewer features, and
+    categories that never have are skipped. Every call adds its own counts.
+
     Parameters
     ----------
     lat : float
@@ -124,6 +242,14 @@ def query_nearby(
     radius : int, optional
         Initial search radius in meters (default: 500). Doubles up to 32 km if
         too few results are found.
+    provider : POIProvider, optional
+        Feature source; defaults to the one configured by POI_PROVIDER.
+    per_category_limit : int, optional
+        Features requested per category per round while the area has no
+        history, and the most any category is asked for once it has
+        (default: PER_CATEGORY_LIMIT).
+    stats : CategoryStats, optional
+        Hit-rate store; defaults to the one at POI_STATS_DB, if enabled.
 
     Returns
     -------
@@ -144,79 +270,75 @@ def query_nearby(
     seen_ids: set[str] = set()
     results: list[dict[str, Any]] = []
     current_radius = radius
+    provider = provider or get_provider()
+    stats = stats or get_category_stats()
+    observations: dict[StatsKey, CategoryStat] = {}
+    result_keys: dict[str, StatsKey] = {}
 
     while True:
-        logger.info(
-            f"Querying POIs near ({lat:.4f}, {lon:.4f}), limit={limit}, radius={current_radius}m"
-        )
-        zoom = max(1, round(16 - math.log2(max(current_radius, 500) / 500)))
-
-        active_categories = categories if categories else POI_CATEGORIES
-        for category in active_categories:
-            params = {
-                "q": category,
-                "lat": lat,
-                "lon": lon,
-                "limit": PER_CATEGORY_LIMIT,
-                "zoom": zoom,
-            }
-
-            try:
-                features = _fetch_category(params)
-                category_count = 0
+        with span("poi.radius_round", radius=current_radius) as round_span:
+            logger.info(
+                f"Querying POIs near ({lat:.4f}, {lon:.4f}), limit={limit}, radius={current_radius}m"
+            )
+            candidates: list[dict[str, Any]] = []
+            round_ids: set[str] = set()
+            active_categories = categories if categories else POI_CATEGORIES
+            wanted = limit - len(results)
+            fetch_sizes = (
+                stats.plan(lat, lon, current_radius, active_categories, wanted, per_category_limit)
+                if stats
+                else dict.fromkeys(active_categories, per_category_limit)
+            )
+            for category in active_categories:
+                key = stats_key(lat, lon, current_radius, category)
+                observation = observations.setdefault(key, CategoryStat())
+                if category not in fetch_sizes:
+                    observation.skips += 1
+                    POI_CATEGORY_FETCHES.labels("skipped").inc()
+                    continue
+                try:
+                    with span("poi.category_fetch", category=category) as fetch_span:
+                        features = provider.nearby(
+                            category, lat, lon, fetch_sizes[category], current_radius
+                        )
+                        fetch_span.set("features", len(features))
+                except (requests.RequestException, RetryError) as e:
+                    error_msg = (
+                        str(e.last_attempt.exception())
+                        if isinstance(e, RetryError)
+                        else str(e)
+                    )
+                    logger.warning(
+                        f"  {category}: request failed ({type(e).__name__}: {error_msg})"
+                    )
+                    continue
 
+                POI_CATEGORY_FETCHES.labels("sent").inc()
+                observation.calls += 1
+                observation.fetched += len(features)
+                observation.wanted += wanted
                 for feature in features:
-                    props = feature.get("properties", {})
-                    geom = feature.get("geometry", {})
-                    coords = geom.get("coordinates", [])
-
-                    if len(coords) != 2:
-                        continue
-
-                    osm_type = props.get("osm_type")
-                    osm_id = props.get("osm_id")
-                    name = props.get("name")
-
-                    if not all([osm_type, osm_id, name]):
-                        continue
-
-                    poi_id = f"{osm_type}/{osm_id}"
-                    if poi_id in seen_ids:
+                    candidate = _parse_feature(feature, category)
+                    if candidate is None:
                         continue
-
-                    poi_lat = coords[1]
-                    poi_lon = coords[0]
-                    distance = _haversine_distance(lat, lon, poi_lat, poi_lon)
-
-                    if distance > current_radius:
+                    poi_id = candidate["id"]
+                    if poi_id in seen_ids or poi_id in round_ids:
                         continue
-
-                    seen_ids.add(poi_id)
-                    results.append(
-                        {
-                            "id": poi_id,
-                            "name": name,
-                            "lat": poi_lat,
-                            "lon": poi_lon,
-                            "distance": distance,
-                            "category": category,
-                        }
-                    )
-                    category_count += 1
-
-                if category_count > 0:
-                    logger.info(f"  {category}: found {category_count} POIs")
-
-            except (requests.RequestException, RetryError) as e:
-                error_msg = (
-                    str(e.last_attempt.exception())
-                    if isinstance(e, RetryError)
-                    else str(e)
-                )
-                logger.warning(
-                    f"  {category}: request failed ({type(e).__name__}: {error_msg})"
-                )
-                continue
+                    round_ids.add(poi_id)
+                    candidates.append(candidate)
+
+            with span("poi.score_candidates", candidates=len(candidates)):
+                found = score_candidates(lat, lon, candidates, current_radius)
+            round_span.set("found", len(found))
+            category_counts: dict[str, int] = {}
+            for poi in found:
+                seen_ids.add(poi["id"])
+                category_counts[poi["category"]] = category_counts.get(poi["category"], 0) + 1
+                result_keys[poi["id"]] = stats_key(lat, lon, current_radius, poi["category"])
+                observations[result_keys[poi["id"]]].kept += 1
+            results.extend(found)
+            for category, category_count in category_counts.items():
+                logger.info(f"  {category}: found {category_count} POIs")
 
         if len(results) >= limit or current_radius >= MAX_RADIUS:
             break
@@ -227,7 +349,6 @@ def query_nearby(
         )
         current_radius = next_radius
 
-    results.sort(key=lambda p: p["distance"])
     final_results = [
         {
             "id": poi["id"],
@@ -236,25 +357,92 @@ def query_nearby(
             "lon": poi["lon"],
             "category": poi["category"],
         }
-        for poi in results[:limit]
+        for poi in nearest(results, limit)
     ]
 
+    for poi in final_results:
+        observations[result_keys[poi["id"]]].used += 1
+    fetched = sum(observation.fetched for observation in observations.values())
+    POI_FEATURES.labels("used").inc(len(final_results))
+    POI_FEATURES.labels("unused").inc(fetched - len(final_results))
+    if stats:
+        stats.record(observations)
+
     logger.info(
         f"Returning {len(final_results)} closest POIs (sorted by distance) from {len(results)} total found"
     )
     return final_results
 
 
+def discover_for_points(
+    points: list[tuple[float, float]],
+    limit: int,
+    radius: int = 500,
+    categories=None,
+    provider: POIProvider | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Discover POIs around several points with one category fan-out per neighborhood.
+
+    Points within EXPLORE_GROUP_SPREAD_M of each other share a single
+    `query_nearby` call centered on their centroid, with the radius widened to
+    cover the group, so upstream calls grow with the area covered rather than
+    the number of points. Pair with `assign_nearest` to split the result.
+
+    Parameters
+    ----------
+    points : list[tuple[float, float]]
+        (lat, lon) of each point to explore.
+    limit : int
+        Candidates wanted per point; each group asks for limit * group size.
+    radius : int, optional
+        Search radius around each point in meters (default: 500).
+    categories : list[str], optional
+        Categories to query; all POI_CATEGORIES when omitted.
+    provider : POIProvider, optional
+        Feature source; defaults to the one configured by POI_PROVIDER.
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        POI dicts as returned by `query_nearby`, deduplicated by ID across groups.
+    """
+    provider = provider or get_provider()
+    active_categories = categories if categories else POI_CATEGORIES
+    seen_ids: set[str] = set()
+    results: list[dict[str, Any]] = []
+    for group in group_points(points, EXPLORE_GROUP_SPREAD_M):
+        lat = sum(points[i][0] for i in group) / len(group)
+        lon = sum(points[i][1] for i in group) / len(group)
+        extent = max(
+            haversine_many(lat, lon, [points[i][0] for i in group], [points[i][1] for i in group])
+        )
+        wanted = limit * len(group)
+        per_category = min(
+            MAX_PER_CATEGORY_LIMIT,
+            max(PER_CATEGORY_LIMIT, math.ceil(2 * wanted / len(active_categories))),
+        )
+        with span("poi.group_discovery", points=len(group), wanted=wanted):
+            found = query_nearby(
+                lat,
+                lon,
+                limit=wanted,
+                radius=int(radius + extent),
+                categories=categories,
+                provider=provider,
+                per_category_limit=per_category,
+            )
+        for poi in found:
+            if poi["id"] not in seen_ids:
+                seen_ids.add(poi["id"])
+                results.append(poi)
+    logger.info(f"Discovered {len(results)} POIs for {len(points)} points")
+    return results
+
+
 def search_address(query: str, limit: int = 5) -> list[dict[str, Any]]:
     """Return up to `limit` geocoded address matches from Photon."""
-    response = requests.get(
-        PHOTON_URL,
-        params={"q": query, "limit": limit},
-        headers=HEADERS,
-        timeout=10,
-    )
-    response.raise_for_status()
-    features = response.json().get("features", [])
+    features = _photon_get({"q": query, "limit": limit}).get("features", [])
 
     results: list[dict[str, Any]] = []
     for feature in features:
@@ -0,0 +1,57 @@
+"""Photon-compatible HTTP stub serving a local POI index, for offline integration runs.
+
+    python -m backend.services.photon_stub --db pois.db --port 2322
+    PHOTON_URL=http://127.0.0.1:2322/api/ python run.py
+"""
+
+import argparse
+import math
+
+from flask import Flask, jsonify, request, Response
+
+from backend.services.local_poi import LocalPOIIndex
+from backend.services.osm import POI_CATEGORIES
+
+
+def _radius_for_zoom(zoom: int) -> int:
+    """Invert PhotonProvider's radius → zoom mapping."""
+    return int(500 * math.pow(2, max(0, 16 - zoom)))
+
+
+def create_stub_app(index: LocalPOIIndex) -> Flask:
+    """Build a Flask app answering GET /api/ like Photon does."""
+    app = Flask(__name__)
+
+    @app.route("/api/", methods=["GET"])
+    def api() -> tuple[Response, int]:
+        """Category queries with lat/lon do a nearby search; anything else matches names."""
+        query = request.args.get("q", "").strip()
+        limit = request.args.get("limit", 10, type=int)
+        lat = request.args.get("lat", type=float)
+        lon = request.args.get("lon", type=float)
+        zoom = request.args.get("zoom", 16, type=int)
+        if not query:
+            return jsonify({"message": "missing search term 'q'"}), 400
+
+        if query.lower() in POI_CATEGORIES and lat is not None and lon is not None:
+            features = index.nearby(query.lower(), lat, lon, limit, _radius_for_zoom(zoom))
+        else:
+            features = index.search(query, limit)
+        return jsonify({"type": "FeatureCollection", "features": features}), 200
+
+    return app
+
+
+def main() -> None:
+    """Run the stub server."""
+    parser = argparse.ArgumentParser(description="Serve a local POI index over the Photon API.")
+    parser.add_argument("--db", default="pois.db", help="Index file (default: pois.db)")
+    parser.add_argument("--port", type=int, default=2322)
+    args = parser.parse_args()
+
+    app = create_stub_app(LocalPOIIndex(args.db))
+    app.run(host="127.0.0.1", port=args.port, debug=False, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Per-region, per-category POI hit-rate statistics used to shape discovery queries.
+
+Every category fetch in `query_nearby` is recorded against a grid cell of
+about 11 km, the radius round it ran at, and the category:
+
+    calls    fetches made
+    fetched  features returned by the provider
+    kept     features inside the search radius
+    used     features that made it into the returned results
+    wanted   results still missing when the round started, summed over calls
+    skips    rounds in which the category was not fetched
+
+From these, `plan` sizes each category's next fetch to cover its usual share of
+the results (used / wanted) at its usual in-radius rate (kept / fetched), never
+above the caller's default size: a low hit rate is cheaper to answer with the
+next, wider radius round than with a larger fetch at this one. Categories that
+have never had a feature inside the radius there are skipped. A
+skipped category is probed again after SKIP_REPROBE_AFTER skips per call made,
+so newly mapped places are picked up. Counts are held in memory and added to
+an on-disk SQLite table as deltas, so several processes can share one file;
+each re-reads the table every POI_STATS_RELOAD_SECONDS to pick up the others'
+counts. A stats file that cannot be opened, read or written only costs the
+adaptive sizing: queries fall back to the default fetch sizes.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from loguru import logger
+
+POI_STATS_DB = os.getenv("POI_STATS_DB", "poi_stats.db")  # empty string: no adaptive shaping
+POI_STATS_RELOAD_SECONDS = float(os.getenv("POI_STATS_RELOAD_SECONDS", "60"))
+STATS_CELL_DEG = 0.1  # region grid cell, about 11 km of latitude
+ADAPTIVE_MIN_CALLS = 3  # fetches observed before a cell's stats replace the default size
+SKIP_REPROBE_AFTER = 20  # skipped rounds per observed fetch before an empty category is probed again
+QUOTA_HEADROOM = 3.0  # fetch for this multiple of a category's expected share of results
+MIN_CATEGORY_FETCH = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS category_stats (
+    cell_lat INTEGER NOT NULL,
+    cell_lon INTEGER NOT NULL,
+    radius INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    kept INTEGER NOT NULL DEFAULT 0,
+    used INTEGER NOT NULL DEFAULT 0,
+    wanted INTEGER NOT NULL DEFAULT 0,
+    skips INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (cell_lat, cell_lon, radius, category)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = (
+    "INSERT INTO category_stats (cell_lat, cell_lon, radius, category, calls, fetched, kept, used, wanted, skips) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (cell_lat, cell_lon, radius, category) DO UPDATE SET "
+    "calls = calls + excluded.calls, fetched = fetched + excluded.fetched, kept = kept + excluded.kept, "
+    "used = used + excluded.used, wanted = wanted + excluded.wanted, skips = skips + excluded.skips"
+)
+
+StatsKey = tuple[int, int, int, str]
+
+
+@dataclass
+class CategoryStat:
+    """Running counts for one (cell, radius, category)."""
+
+    calls: int = 0
+    fetched: int = 0
+    kept: int = 0
+    used: int = 0
+    wanted: int = 0
+    skips: int = 0
+
+    def add(self, other: "CategoryStat") -> None:
+        self.calls += other.calls
+        self.fetched += other.fetched
+        self.kept += other.kept
+        self.used += other.used
+        self.wanted += other.wanted
+        self.skips += other.skips
+
+
+def stats_key(lat: float, lon: float, radius: int, category: str) -> StatsKey:
+    """Grid cell of (lat, lon), the radius rounded up to a power of two, and the category."""
+    radius_bucket = 1 << max(0, math.ceil(math.log2(max(radius, 1))))
+    return (math.floor(lat / STATS_CELL_DEG), math.floor(lon / STATS_CELL_DEG), radius_bucket, category)
+
+
+class CategoryStats:
+    """In-memory category hit rates backed by an on-disk SQLite table."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+        self._stats: dict[StatsKey, CategoryStat] = {}
+        self._loaded_at = 0.0
+        self.reload()
+
+    def reload(self) -> None:
+        """Replace the in-memory counts with the table, which holds every process's deltas."""
+        with self._lock:
+            self._stats = {
+                (cell_lat, cell_lon, radius, category): CategoryStat(*counts)
+                for cell_lat, cell_lon, radius, category, *counts in self._conn.execute(
+                    "SELECT cell_lat, cell_lon, radius, category, calls, fetched, kept, used, wanted, skips "
+                    "FROM category_stats"
+                )
+            }
+            self._loaded_at = time.monotonic()
+
+    def get(self, key: StatsKey) -> CategoryStat | None:
+        with self._lock:
+            stat = self._stats.get(key)
+            return CategoryStat(**vars(stat)) if stat else None
+
+    def plan(
+        self,
+        lat: float,
+        lon: float,
+        radius: int,
+        categories: list[str],
+        wanted: int,
+        default_limit: int,
+    ) -> dict[str, int]:
+        """
+        Choose how many features to request per category for one radius round.
+
+        Parameters
+        ----------
+        lat, lon : float
+            Search center.
+        radius : int
+            The round's search radius in meters.
+        categories : list[str]
+            Categories the caller would query.
+        wanted : int
+            Results still needed.
+        default_limit : int
+            Fetch size for categories without enough history, and the most any
+            category is asked for.
+
+        Returns
+        -------
+        dict[str, int]
+            Fetch size per category to query; skipped categories are absent.
+            Every category gets `default_limit` if the stats file cannot be read.
+        """
+        if time.monotonic() - self._loaded_at >= POI_STATS_RELOAD_SECONDS:
+            try:
+                self.reload()
+            except sqlite3.Error as e:
+                logger.warning(f"POI stats reload from {self.path} failed, using default fetch sizes: {e}")
+                self._loaded_at = time.monotonic()  # Retry after another interval, not on every query.
+                return dict.fromkeys(categories, default_limit)
+        plan: dict[str, int] = {}
+        for category in categories:
+            stat = self.get(stats_key(lat, lon, radius, category))
+            if stat is None or stat.calls < ADAPTIVE_MIN_CALLS:
+                plan[category] = default_limit
+            elif stat.kept == 0:
+                if stat.skips >= SKIP_REPROBE_AFTER * stat.calls:
+                    plan[category] = default_limit
+            else:
+                share = stat.used / stat.wanted if stat.wanted else 0.0
+                hit_rate = stat.kept / stat.fetched
+                size = math.ceil(QUOTA_HEADROOM * share * wanted / hit_rate)
+                plan[category] = max(min(MIN_CATEGORY_FETCH, default_limit), min(default_limit, size))
+        return plan
+
+    def record(self, observations: dict[StatsKey, CategoryStat]) -> None:
+        """Add one query's counts to memory and to the on-disk table.
+
+        A failed write (e.g. a locked or read-only file) is logged and the counts
+        are kept in memory only.
+        """
+        if not observations:
+            return
+        with self._lock:
+            for key, delta in observations.items():
+                self._stats.setdefault(key, CategoryStat()).add(delta)
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        _UPSERT,
+                        [
+                            (*key, delta.calls, delta.fetched, delta.kept, delta.used, delta.wanted, delta.skips)
+                            for key, delta in observations.items()
+                        ],
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"POI stats write to {self.path} failed, counts kept in memory only: {e}")
+
+
+_stats: CategoryStats | None = None
+_stats_failed = False
+_stats_lock = threading.Lock()
+
+
+def get_category_stats() -> CategoryStats | None:
+    """Return the process-wide stats store at POI_STATS_DB, or None when disabled or unusable."""
+    global _stats, _stats_failed
+    if not POI_STATS_DB:
+        return None
+    with _stats_lock:
+        if _stats is None and not _stats_failed:
+            try:
+                _stats = CategoryStats(POI_STATS_DB)
+            except sqlite3.Error as e:
+                _stats_failed = True
+                logger.warning(f"POI stats disabled, cannot open {POI_STATS_DB}: {e}")
+    return _stats
@@ -0,0 +1,193 @@
+"""Batched distance scoring and top-k selection for POI candidates.
+
+Uses NumPy when it is installed and the batch is large enough to amortize array
+construction; otherwise falls back to a pure-Python loop with hoisted constants.
+NumPy is imported on the first large batch, not at startup.
+"""
+
+import heapq
+import math
+from collections.abc import Sequence
+from typing import Any
+
+EARTH_RADIUS_M = 6371000
+NUMPY_MIN_BATCH = 64  # Below this, array setup costs more than the scalar loop
+
+_numpy_module: Any = None
+_numpy_checked = False
+
+
+def numpy_module() -> Any:
+    """Return the numpy module, or None if it is not installed; imported on first call."""
+    global _numpy_module, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - optional dependency
+            numpy = None
+        _numpy_module, _numpy_checked = numpy, True
+    return _numpy_module
+
+
+def haversine_many(
+    lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]
+) -> list[float]:
+    """
+    Return distances in meters from (lat, lon) to every (lats[i], lons[i]).
+
+    Parameters
+    ----------
+    lat, lon : float
+        Origin coordinates.
+    lats, lons : Sequence[float]
+        Candidate coordinates, equal length.
+
+    Returns
+    -------
+    list[float]
+        Distances in meters, aligned with the inputs.
+    """
+    np = numpy_module() if len(lats) >= NUMPY_MIN_BATCH else None
+    if np is not None:
+        phi1 = math.radians(lat)
+        phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+        d_lambda = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+        a = (
+            np.sin((phi2 - phi1) / 2) ** 2
+            + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        )
+        return (2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+    phi1 = math.radians(lat)
+    cos_phi1 = math.cos(phi1)
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    distances: list[float] = []
+    for cand_lat, cand_lon in zip(lats, lons):
+        phi2 = radians(cand_lat)
+        a = sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * cos(phi2) * sin(radians(cand_lon - lon) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_M * asin(sqrt(min(a, 1.0))))
+    return distances
+
+
+def top_k_indices(distances: Sequence[float], k: int) -> list[int]:
+    """Return indices of the k smallest distances in ascending order, without a full sort."""
+    n = len(distances)
+    if k <= 0 or n == 0:
+        return []
+    if k >= n:
+        return sorted(range(n), key=distances.__getitem__)
+    np = numpy_module() if n >= NUMPY_MIN_BATCH else None
+    if np is not None:
+        arr = np.asarray(distances, dtype=np.float64)
+        part = np.argpartition(arr, k - 1)[:k]
+        return part[np.argsort(arr[part], kind="stable")].tolist()
+    return heapq.nsmallest(k, range(n), key=distances.__getitem__)
+
+
+def score_candidates(
+    lat: float,
+    lon: float,
+    candidates: list[dict[str, Any]],
+    radius: float,
+) -> list[dict[str, Any]]:
+    """
+    Attach a `distance` to each candidate and drop those beyond radius.
+
+    Candidates must carry `lat` and `lon`; order is preserved.
+    """
+    if not candidates:
+        return []
+    distances = haversine_many(
+        lat, lon, [c["lat"] for c in candidates], [c["lon"] for c in candidates]
+    )
+    kept: list[dict[str, Any]] = []
+    for candidate, distance in zip(candidates, distances):
+        if distance <= radius:
+            candidate["distance"] = distance
+            kept.append(candidate)
+    return kept
+
+
+def nearest(candidates: list[dict[str, Any]], k: int) -> list[dict[str, Any]]:
+    """Return the k candidates with the smallest `distance`, closest first."""
+    distances = [c["distance"] for c in candidates]
+    return [candidates[i] for i in top_k_indices(distances, k)]
+
+
+def group_points(points: Sequence[tuple[float, float]], max_spread_m: float) -> list[list[int]]:
+    """
+    Greedily cluster points so every member lies within max_spread_m of its group's first point.
+
+    Parameters
+    ----------
+    points : Sequence[tuple[float, float]]
+        (lat, lon) pairs.
+    max_spread_m : float
+        Maximum distance from a group's anchor (its first point) to any member.
+
+    Returns
+    -------
+    list[list[int]]
+        Indices into `points`, one list per group, in input order.
+    """
+    groups: list[list[int]] = []
+    anchors: list[tuple[float, float]] = []
+    for index, (lat, lon) in enumerate(points):
+        if anchors:
+            distances = haversine_many(lat, lon, [a[0] for a in anchors], [a[1] for a in anchors])
+            closest = min(range(len(anchors)), key=distances.__getitem__)
+            if distances[closest] <= max_spread_m:
+                groups[closest].append(index)
+                continue
+        anchors.append((lat, lon))
+        groups.append([index])
+    return groups
+
+
+def assign_nearest(
+    points: Sequence[tuple[float, float]],
+    counts: Sequence[int],
+    candidates: list[dict[str, Any]],
+) -> list[list[dict[str, Any]]]:
+    """
+    Give each point up to counts[i] distinct candidates, closest pairs first.
+
+    Every (point, candidate) pair is ranked by distance and taken greedily, so a
+    candidate goes to the point it is nearest to unless that point is already full.
+
+    Parameters
+    ----------
+    points : Sequence[tuple[float, float]]
+        (lat, lon) pairs.
+    counts : Sequence[int]
+        Wanted candidates per point, aligned with `points`.
+    candidates : list[dict[str, Any]]
+        Candidates carrying `lat` and `lon`.
+
+    Returns
+    -------
+    list[list[dict[str, Any]]]
+        Assigned candidates per point, closest first. No candidate appears twice.
+    """
+    lats = [c["lat"] for c in candidates]
+    lons = [c["lon"] for c in candidates]
+    pairs = [
+        (distance, point_index, candidate_index)
+        for point_index, (lat, lon) in enumerate(points)
+        if counts[point_index] > 0
+        for candidate_index, distance in enumerate(haversine_many(lat, lon, lats, lons))
+    ]
+    pairs.sort()
+
+    assigned: list[list[dict[str, Any]]] = [[] for _ in points]
+    taken: set[int] = set()
+    remaining = sum(max(0, count) for count in counts)
+    for _, point_index, candidate_index in pairs:
+        if remaining == 0:
+            break
+        if candidate_index in taken or len(assigned[point_index]) >= counts[point_index]:
+            continue
+        taken.add(candidate_index)
+        assigned[point_index].append(candidates[candidate_index])
+        remaining -= 1
+    return assigned
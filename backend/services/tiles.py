@@ -0,0 +1,43 @@
+"""Slippy-map tile math and cluster sizing for viewport waypoint queries."""
+
+import math
+
+CLUSTER_CELL_PX = 64  # Points closer than this many screen pixels share a cluster
+CLUSTER_MAX_ZOOM = 15  # At or above this zoom, points are returned individually
+MAX_ZOOM = 22
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Return (min_lat, min_lon, max_lat, max_lon) covered by slippy-map tile z/x/y."""
+    n = 2**z
+
+    def lat_at(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat_at(y + 1), x / n * 360.0 - 180.0, lat_at(y), (x + 1) / n * 360.0 - 180.0
+
+
+def cell_size(zoom: int, center_lat: float, cell_px: int = CLUSTER_CELL_PX) -> tuple[float, float]:
+    """
+    Return the (lat, lon) degree size of a `cell_px` screen cell at zoom.
+
+    Web Mercator stretches latitude by 1/cos(lat), so the latitude step is
+    shrunk by cos(center_lat) to keep cells roughly square on screen.
+
+    Parameters
+    ----------
+    zoom : int
+        Map zoom level the client is rendering.
+    center_lat : float
+        Latitude of the viewport center.
+    cell_px : int, optional
+        Grid cell edge in screen pixels (default: CLUSTER_CELL_PX).
+
+    Returns
+    -------
+    tuple[float, float]
+        Cell height and width in degrees.
+    """
+    d_lon = cell_px / (256 * 2**zoom) * 360.0
+    d_lat = d_lon * max(math.cos(math.radians(center_lat)), 0.01)
+    return d_lat, d_lon
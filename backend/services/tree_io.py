@@ -0,0 +1,193 @@
+"""GeoJSON and GPX serialization of waypoint trees for export and import.
+
+Exports are produced as an iterator of text chunks so a route can stream a tree
+of any size; each exported node carries its parent ID and depth, which is all
+`parse_geojson_tree` needs to rebuild the tree elsewhere.
+"""
+
+import json
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import Any
+from xml.sax.saxutils import escape, quoteattr
+
+GPX_NAMESPACE = "urn:branch:gpx:1"  # Extension elements carrying tree structure
+
+
+def geojson_chunks(user: dict[str, Any], batches: Iterable[list[dict[str, Any]]]) -> Iterator[str]:
+    """
+    Serialize a tree as one GeoJSON FeatureCollection, a batch of features per chunk.
+
+    Parameters
+    ----------
+    user : dict[str, Any]
+        The owner's `to_dict()`; written as a top-level "user" member.
+    batches : Iterable[list[dict[str, Any]]]
+        Export nodes (id, parent_id, depth, lat, lon, name, api_id, category,
+        visited, visited_at, journal) in breadth-first order.
+
+    Yields
+    ------
+    str
+        Consecutive pieces of the JSON document.
+    """
+    yield '{"type":"FeatureCollection","user":' + json.dumps(user, separators=(",", ":")) + ',"features":['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        features = [
+            {
+                "type": "Feature",
+                "id": node["id"],
+                "geometry": {"type": "Point", "coordinates": [node["lon"], node["lat"]]},
+                "properties": {key: value for key, value in node.items() if key not in ("id", "lat", "lon")},
+            }
+            for node in batch
+        ]
+        # One encoder call per batch; strip the list brackets to splice into the open array.
+        yield ("" if first else ",") + json.dumps(features, separators=(",", ":"))[1:-1]
+        first = False
+    yield "]}\n"
+
+
+def gpx_chunks(user: dict[str, Any], batches: Iterable[list[dict[str, Any]]]) -> Iterator[str]:
+    """
+    Serialize a tree as GPX 1.1 waypoints, a batch of <wpt> elements per chunk.
+
+    Name, category (<type>) and visit time (<time>) use standard GPX elements;
+    the node ID, parent ID, depth and visited flag go in namespaced extensions.
+
+    Parameters
+    ----------
+    user : dict[str, Any]
+        The owner's `to_dict()`; its username becomes the metadata name.
+    batches : Iterable[list[dict[str, Any]]]
+        Export nodes, as for `geojson_chunks`.
+
+    Yields
+    ------
+    str
+        Consecutive pieces of the XML document.
+    """
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<gpx version="1.1" creator="BR@NCH" xmlns="http://www.topografix.com/GPX/1/1" xmlns:branch="{GPX_NAMESPACE}">\n'
+        f"<metadata><name>{escape(str(user['username']))}</name></metadata>\n"
+    )
+    for batch in batches:
+        parts = []
+        for node in batch:
+            parts.append(f"<wpt lat={quoteattr(repr(node['lat']))} lon={quoteattr(repr(node['lon']))}>")
+            if node["visited_at"]:
+                parts.append(f"<time>{escape(node['visited_at'])}Z</time>")
+            parts.append(f"<name>{escape(node['name'])}</name>")
+            if node["journal"]:
+                parts.append(f"<desc>{escape(node['journal'])}</desc>")
+            if node["category"]:
+                parts.append(f"<type>{escape(node['category'])}</type>")
+            parent = "" if node["parent_id"] is None else f"<branch:parent>{node['parent_id']}</branch:parent>"
+            parts.append(
+                f"<extensions><branch:id>{node['id']}</branch:id>{parent}"
+                f"<branch:depth>{node['depth']}</branch:depth>"
+                f"<branch:visited>{str(node['visited']).lower()}</branch:visited></extensions></wpt>\n"
+            )
+        yield "".join(parts)
+    yield "</gpx>\n"
+
+
+def _parse_time(value: Any) -> datetime | None:
+    if value in (None, ""):
+        return None
+    return datetime.fromisoformat(str(value).removesuffix("Z"))
+
+
+def parse_geojson_tree(document: Any) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    Validate an exported GeoJSON tree and return its owner and nodes in import order.
+
+    Parameters
+    ----------
+    document : Any
+        Decoded JSON as written by `geojson_chunks`.
+
+    Returns
+    -------
+    tuple[dict[str, Any], list[dict[str, Any]]]
+        The exported user's "username" (None if absent) and float "lat"/"lon"
+        (the root's position if absent), and one node dict per feature, with
+        "depth" recomputed from the parent links.
+
+    Raises
+    ------
+    ValueError
+        If the document is not a FeatureCollection of Point features forming a
+        single tree with unique IDs, or its "user" member has invalid fields.
+    """
+    if not isinstance(document, dict) or document.get("type") != "FeatureCollection":
+        raise ValueError("expected a GeoJSON FeatureCollection")
+    features = document.get("features")
+    if not isinstance(features, list) or not features:
+        raise ValueError("features must be a non-empty list")
+
+    nodes: dict[int, dict[str, Any]] = {}
+    children_of: dict[int | None, list[int]] = {}
+    for index, feature in enumerate(features):
+        try:
+            properties = feature.get("properties") or {}
+            geometry = feature["geometry"]
+            if geometry.get("type") != "Point":
+                raise ValueError("geometry must be a Point")
+            lon, lat = (float(value) for value in geometry["coordinates"][:2])
+            node_id = int(feature["id"])
+            parent_id = None if properties.get("parent_id") is None else int(properties["parent_id"])
+            node = {
+                "id": node_id,
+                "parent_id": parent_id,
+                "lat": lat,
+                "lon": lon,
+                "name": str(properties["name"]),
+                "api_id": str(properties.get("api_id") or f"import/{node_id}"),
+                "category": properties.get("category"),
+                "visited": bool(properties.get("visited", False)),
+                "visited_at": _parse_time(properties.get("visited_at")),
+                "journal": properties.get("journal") or None,
+            }
+            if node["journal"] is not None and not isinstance(node["journal"], str):
+                raise ValueError("journal must be a string")
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+            raise ValueError(f"feature {index}: {e}") from None
+        if node_id in nodes:
+            raise ValueError(f"feature {index}: duplicate id {node_id}")
+        nodes[node_id] = node
+        children_of.setdefault(parent_id, []).append(node_id)
+
+    roots = children_of.get(None, [])
+    if len(roots) != 1:
+        raise ValueError(f"expected exactly one root feature (parent_id null), found {len(roots)}")
+
+    ordered: list[dict[str, Any]] = []
+    frontier, depth = roots, 0
+    while frontier:
+        next_frontier: list[int] = []
+        for node_id in frontier:
+            nodes[node_id]["depth"] = depth
+            ordered.append(nodes[node_id])
+            next_frontier.extend(children_of.get(node_id, []))
+        frontier, depth = next_frontier, depth + 1
+    if len(ordered) != len(nodes):
+        raise ValueError(f"{len(nodes) - len(ordered)} features are not connected to the root")
+
+    exported = document.get("user") if isinstance(document.get("user"), dict) else {}
+    root = ordered[0]
+    try:
+        user = {
+            "username": exported.get("username"),
+            "lat": float(exported.get("lat", root["lat"])),
+            "lon": float(exported.get("lon", root["lon"])),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("user lat and lon must be numbers") from None
+    if user["username"] is not None and not isinstance(user["username"], str):
+        raise ValueError("user username must be a string")
+    return user, ordered
@@ -0,0 +1,167 @@
+"""Lightweight span tracing with a local JSONL exporter.
+
+Set TRACE_EXPORT to a file path to record spans; each finished span is written as
+one JSON line using OpenTelemetry field names (traceId, spanId, parentSpanId,
+startTimeUnixNano, ...) so the file can later be replayed into a collector.
+
+    with span("photon.attempt", category=category) as s:
+        ...
+        s.set("features", len(features))
+
+With TRACE_EXPORT unset, `span()` returns a shared no-op object: one global check
+and no allocation, clock reads or context switches per call.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Any
+
+from flask import Flask, Response, g, request
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file, one line per span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_exporter: JsonlExporter | None = JsonlExporter(TRACE_EXPORT) if TRACE_EXPORT else None
+_current: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: JsonlExporter | None) -> None:
+    """Replace the process-wide exporter; None disables tracing."""
+    global _exporter
+    _exporter = exporter
+
+
+class Span:
+    """One timed operation; nested spans opened inside it become its children."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "error", "_start", "_token")
+
+    def __init__(self, name: str, attributes: dict[str, Any]):
+        parent = _current.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.error: str | None = None
+        self._start = 0
+        self._token: Token | None = None
+
+    def set(self, key: str, value: Any) -> None:
+        """Attach or overwrite an attribute."""
+        self.attributes[key] = value
+
+    def start(self) -> "Span":
+        self._start = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def end(self) -> None:
+        end = time.time_ns()
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        exporter = _exporter
+        if exporter is None:
+            return
+        exporter.export(
+            {
+                "traceId": self.trace_id,
+                "spanId": self.span_id,
+                "parentSpanId": self.parent_id,
+                "name": self.name,
+                "startTimeUnixNano": self._start,
+                "endTimeUnixNano": end,
+                "durationMs": round((end - self._start) / 1e6, 3),
+                "attributes": self.attributes,
+                "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+            }
+        )
+
+    def __enter__(self) -> "Span":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+
+
+class _NoopSpan:
+    """Stand-in returned by `span()` while tracing is disabled."""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes: Any) -> Span | _NoopSpan:
+    """Return a context manager timing name as a child of the current span."""
+    if _exporter is None:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def init_tracing(app: Flask) -> None:
+    """Open a root span per request so route and service spans nest under it."""
+
+    @app.before_request
+    def start_request_span() -> None:
+        """Start the request's root span."""
+        if _exporter is None:
+            return
+        g.trace_span = Span(
+            "http.request", {"http.method": request.method, "http.path": request.path}
+        ).start()
+
+    @app.after_request
+    def tag_request_span(response: Response) -> Response:
+        """Record the route and status on the request span and expose its trace ID."""
+        root = g.get("trace_span")
+        if root is not None:
+            root.set("http.route", request.url_rule.rule if request.url_rule else "unmatched")
+            root.set("http.status_code", response.status_code)
+            response.headers["X-Trace-Id"] = root.trace_id
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception: BaseException | None) -> None:
+        """Finish the request's root span, marking it failed on unhandled errors."""
+        root = g.pop("trace_span", None)
+        if root is None:
+            return
+        if exception is not None:
+            root.error = f"{type(exception).__name__}: {exception}"
+        root.end()
@@ -0,0 +1,301 @@
+"""Offline benchmark suite for the API hot paths, with saved-baseline comparison.
+
+Runs `create_app()` against a throwaway SQLite database and a Photon stub serving a
+synthetic POI index, so results are reproducible without network. Scenarios:
+
+    import_app      `import backend.app` in a fresh interpreter
+    create_app      `create_app()` on an already-migrated database, fresh interpreter
+    tree_<N>        GET /api/waypoint/tree/<id> for generated trees of N nodes
+    osm             POST /api/waypoint/osm discovery end-to-end (Photon stub + insert)
+    visit_explore   the client's visit batch: discover, set_visited, add_children, get_tree
+    address_search  GET /api/user/address-search while "typing" place names
+
+Each reports p50/p95/p99 latency, throughput, and the peak Python allocation of a
+single request (tracemalloc, measured outside the timed loop).
+
+    python -m bench.bench_api                          # run everything
+    python -m bench.bench_api --save bench/baseline.json
+    python -m bench.bench_api --compare bench/baseline.json --threshold 0.25
+
+With --compare the exit status is 1 if any scenario's p50 or p95 regressed by more
+than the threshold, so it can gate a deploy.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+ORIGIN = (40.758896, -73.985130)
+ADJECTIVES = ["Old", "Little", "Grand", "Hidden", "North", "South", "Riverside", "Corner", "Golden", "Quiet"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+_STARTUP_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import backend.app
+t1 = time.perf_counter()
+backend.app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({"import_app": t1 - t0, "create_app": t2 - t1}))
+"""
+
+
+def _startup_probe() -> dict[str, float]:
+    """Time importing backend.app and calling create_app() in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", _STARTUP_PROBE], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summarize(latencies: list[float], total: float | None = None, peak: int = 0) -> dict[str, float]:
+    """Latency percentiles (ms), throughput and peak allocation for one scenario."""
+    latencies = sorted(latencies)
+    total = sum(latencies) if total is None else total
+    return {
+        "n": len(latencies),
+        "p50_ms": _percentile(latencies, 50) * 1e3,
+        "p95_ms": _percentile(latencies, 95) * 1e3,
+        "p99_ms": _percentile(latencies, 99) * 1e3,
+        "rps": len(latencies) / total if total else 0.0,
+        "peak_mib": peak / 2**20,
+    }
+
+
+def _measure(call: Callable[[int], Any], iterations: int, warmup: int = 2) -> dict[str, float]:
+    """Time `iterations` calls of call(i) and return latency percentiles and throughput."""
+    for i in range(warmup):
+        call(-1 - i)
+    latencies: list[float] = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    tracemalloc.start()
+    call(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return _summarize(latencies, total, peak)
+
+
+def _check(response, expected: int = 200):
+    if response.status_code != expected:
+        raise RuntimeError(f"{response.request.method} {response.request.path} → {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response.get_json()
+
+
+def _build_poi_index(path: Path, count: int, seed: int):
+    """Fill a local POI index with `count` named POIs scattered around ORIGIN."""
+    from backend.services.local_poi import LocalPOIIndex
+    from backend.services.osm import POI_CATEGORIES
+
+    rng = random.Random(seed)
+    index = LocalPOIIndex(path)
+    index.import_rows(
+        (
+            "node",
+            i,
+            f"{rng.choice(ADJECTIVES)} {category.title()} {i}",
+            ORIGIN[0] + rng.uniform(-0.15, 0.15),
+            ORIGIN[1] + rng.uniform(-0.15, 0.15),
+            [category],
+        )
+        for i in range(count)
+        for category in [POI_CATEGORIES[i % len(POI_CATEGORIES)]]
+    )
+    return index
+
+
+def run_suite(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    """Build fixtures, run every selected scenario, and return results by scenario name."""
+    tmp = tempfile.TemporaryDirectory()
+    port = _free_port()
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp.name) / 'bench.db'}"
+    os.environ["PHOTON_URL"] = f"http://127.0.0.1:{port}/api/"
+    os.environ["POI_STATS_DB"] = str(Path(tmp.name) / "poi_stats.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_LEVELS", "werkzeug=ERROR")
+
+    from sqlalchemy import select
+    from werkzeug.serving import make_server
+
+    from backend.app import create_app
+    from backend.models.user import User
+    from backend.services.photon_stub import create_stub_app
+    from bench.synthetic import generate, parse_distribution
+
+    index = _build_poi_index(Path(tmp.name) / "pois.db", args.pois, args.seed)
+    stub = make_server("127.0.0.1", port, create_stub_app(index), threaded=True)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    app = create_app()
+    engine = app.extensions["db_engine"]
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    results: dict[str, dict[str, float]] = {}
+    selected = set(args.only or [])
+
+    def wanted(name: str) -> bool:
+        return not selected or any(name.startswith(prefix) for prefix in selected)
+
+    def report(name: str, result: dict[str, float]) -> None:
+        results[name] = result
+        print(
+            f"{name:<16} n={result['n']:<5} p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+            f"p99={result['p99_ms']:8.2f}ms {result['rps']:8.1f} req/s peak={result['peak_mib']:7.2f} MiB",
+            flush=True,
+        )
+
+    if wanted("import_app") or wanted("create_app"):
+        startup = [_startup_probe() for _ in range(max(5, args.iterations // 5))]
+        for name in ("import_app", "create_app"):
+            if wanted(name):
+                report(name, _summarize([probe[name] for probe in startup]))
+
+    for size in args.tree_sizes:
+        name = f"tree_{size}"
+        if not wanted(name):
+            continue
+        generate(
+            engine,
+            users=1,
+            depth=parse_distribution("const:64"),
+            fanout=parse_distribution("uniform:2:4"),
+            seed=size,
+            max_nodes_per_user=size,
+            journal_rate=0.0,
+            username_prefix=f"tree{size}",
+        )
+        with engine.connect() as conn:
+            user_id = conn.scalar(select(User.id).where(User.username == f"tree{size}_{size}_0"))
+        iterations = max(3, min(args.iterations, 2_000_000 // size))
+        report(name, _measure(lambda _: _check(client.get(f"/api/waypoint/tree/{user_id}")), iterations))
+
+    if wanted("osm"):
+        def discover(_: int) -> None:
+            lat = ORIGIN[0] + rng.uniform(-0.05, 0.05)
+            lon = ORIGIN[1] + rng.uniform(-0.05, 0.05)
+            _check(client.post("/api/waypoint/osm", json={"lat": lat, "lon": lon, "num": 5}), 201)
+
+        report("osm", _measure(discover, args.iterations))
+
+    if wanted("visit_explore"):
+        user, root, _ = _check(
+            client.post(
+                "/api/batch",
+                json={
+                    "operations": [
+                        {"op": "create_user", "ref": "u", "args": {"username": "explorer", "lat": ORIGIN[0], "lon": ORIGIN[1]}},
+                        {"op": "create_waypoint", "ref": "r", "args": {"api_id": "bench/root", "lat": ORIGIN[0], "lon": ORIGIN[1], "name": "Bench Root"}},
+                        {"op": "set_root", "args": {"user_id": {"$ref": "u"}, "root_waypoint_id": {"$ref": "r"}}},
+                    ]
+                },
+            )
+        )["results"]
+        leaves = [root]
+
+        def explore(_: int) -> None:
+            leaf = leaves.pop(rng.randrange(len(leaves))) if len(leaves) > 1 else leaves[0]
+            body = _check(
+                client.post(
+                    "/api/batch",
+                    json={
+                        "operations": [
+                            {"op": "discover", "ref": "found", "args": {"lat": leaf["lat"], "lon": leaf["lon"], "num": 3, "user_id": user["id"]}},
+                            {"op": "set_visited", "args": {"waypoint_id": leaf["id"], "visited": True}},
+                            {"op": "add_children", "args": {"waypoint_id": leaf["id"], "child_ids": {"$ref": "found"}}},
+                            {"op": "get_tree", "args": {"user_id": user["id"]}},
+                        ]
+                    },
+                )
+            )
+            leaves.extend(body["results"][0])
+
+        report("visit_explore", _measure(explore, args.iterations))
+
+    if wanted("address_search"):
+        words = [f"{adjective} {category}" for adjective in ADJECTIVES for category in ("Cafe", "Park", "Museum", "Shop")]
+        typed = [word[:n] for word in rng.sample(words, len(words)) for n in range(3, len(word) + 1)]
+
+        def search(i: int) -> None:
+            _check(client.get("/api/user/address-search", query_string={"q": typed[i % len(typed)]}))
+
+        report("address_search", _measure(search, max(args.iterations, len(typed))))
+
+    stub.shutdown()
+    engine.dispose()
+    tmp.cleanup()
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> bool:
+    """Print per-scenario deltas against baseline; return True if nothing regressed."""
+    ok = True
+    print(f"\n{'scenario':<16} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<16} (no baseline)")
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_mib"):
+            before, after = base[metric], current[metric]
+            change = (after - before) / before if before else 0.0
+            regressed = metric != "peak_mib" and change > threshold
+            ok = ok and not regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<16} {metric:<8} {before:>10.2f} {after:>10.2f} {change:>+7.0%}{flag}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tree-sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per scenario (fewer for big trees)")
+    parser.add_argument("--pois", type=int, default=20_000, help="POIs in the stub's index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="Run scenarios whose names start with these prefixes")
+    parser.add_argument("--save", type=Path, help="Write results to this JSON baseline file")
+    parser.add_argument("--compare", type=Path, help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p50/p95 slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Stress test: concurrent child appends to one parent must never lose an update.
+
+Runs the old read-modify-write append and the compare-and-swap append side by side
+against a throwaway SQLite file and reports lost updates and appends per second.
+
+    python -m bench.bench_child_appends [--threads 8] [--appends 50] [--check] [--database-url URL]
+
+--check runs only the compare-and-swap append and exits non-zero if any append was
+lost or failed (a ChildAppendConflict, or a database error such as a deadlock), so it
+can gate changes to add_children_to_waypoint. --database-url runs against another
+database instead, e.g. a scratch MySQL schema; its tables are created and dropped.
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm.attributes import flag_modified
+
+from backend.db.waypoint_queries import (
+    ChildAppendConflict,
+    add_children_to_waypoint,
+    create_waypoint,
+    get_waypoint,
+)
+from backend.logging_config import setup_logging
+from backend.models.base import Base
+from backend.models.journal import JournalEntry  # noqa: F401 – registers the table
+from backend.models.user import User  # noqa: F401 – registers the table
+
+
+def _naive_append(session: Session, parent_id: int, child_ids: list[int]) -> None:
+    """The pre-versioning append: read the JSON list, extend it in Python, rewrite it."""
+    parent = get_waypoint(session, parent_id)
+    existing = set(parent.children)
+    parent.children = parent.children + [cid for cid in child_ids if cid not in existing]
+    flag_modified(parent, "children")
+    session.commit()
+
+
+def _run(
+    strategy: str, threads: int, appends: int, database_url: str | None
+) -> tuple[int, int, int, float]:
+    """Return (expected children, stored children, failed appends, seconds) for one strategy."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if database_url:
+            engine = create_engine(database_url)
+        else:
+            engine = create_engine(
+                f"sqlite:///{Path(tmp) / 'bench.db'}", connect_args={"timeout": 60}
+            )
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        session_local = sessionmaker(bind=engine, autoflush=False)
+        with session_local() as session:
+            parent_id = create_waypoint(session, "bench/parent", 0.0, 0.0, "parent").id
+
+        barrier = threading.Barrier(threads)
+        failures: list[Exception] = []
+
+        def worker(worker_id: int) -> None:
+            barrier.wait()
+            for i in range(appends):
+                child_id = worker_id * appends + i + 1_000_000
+                with session_local() as session:
+                    try:
+                        if strategy == "naive":
+                            _naive_append(session, parent_id, [child_id])
+                        else:
+                            add_children_to_waypoint(session, parent_id, [child_id])
+                    except (ChildAppendConflict, SQLAlchemyError) as e:
+                        session.rollback()
+                        failures.append(e)
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        with session_local() as session:
+            stored = len(get_waypoint(session, parent_id).children)
+        if database_url:
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+    for failure in failures[:3]:
+        print(f"{strategy}: {type(failure).__name__}: {failure}")
+    return threads * appends, stored, len(failures), elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--appends", type=int, default=50, help="Appends per thread")
+    parser.add_argument(
+        "--check", action="store_true", help="Only run compare-and-swap; exit 1 on any lost or failed append"
+    )
+    parser.add_argument("--database-url", help="Scratch database to use instead of a temporary SQLite file")
+    args = parser.parse_args()
+    setup_logging()
+
+    print(f"{'strategy':>8}  {'expected':>8}  {'stored':>6}  {'lost':>5}  {'failed':>6}  {'appends/s':>9}")
+    failed = False
+    for strategy in ("cas",) if args.check else ("naive", "cas"):
+        expected, stored, failures, elapsed = _run(strategy, args.threads, args.appends, args.database_url)
+        # A failed append was reported to its caller; a lost one claimed success but is missing.
+        lost = expected - failures - stored
+        print(
+            f"{strategy:>8}  {expected:>8}  {stored:>6}  {lost:>5}  {failures:>6}  "
+            f"{expected / elapsed:>9.0f}"
+        )
+        failed |= strategy == "cas" and (lost != 0 or failures != 0)
+    if failed:
+        raise SystemExit("compare-and-swap appends were lost or failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark: per-request logging cost on the request thread for each logging mode.
+
+One simulated request is a `query_nearby` call against an in-memory provider
+(the real INFO lines it writes per radius round and category) plus one werkzeug
+access-log record routed through InterceptHandler. Records go to a file sink;
+--sink-delay-us adds a per-write delay to mimic a slow stdout pipe or log shipper.
+
+    python -m bench.bench_logging [--requests 2000] [--sink-delay-us 0]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from time import perf_counter
+
+from loguru import logger
+
+from backend import logging_config
+from backend.services import poi_stats
+from backend.services.osm import query_nearby
+
+ORIGIN = (40.758896, -73.985130)
+
+MODES = [
+    # label, LOG_FORMAT, LOG_ASYNC, LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE
+    ("off (ERROR only)", "text", False, "ERROR", "", ""),
+    ("text, sync (default)", "text", False, "INFO", "", ""),
+    ("json, sync", "json", False, "INFO", "", ""),
+    ("json, async", "json", True, "INFO", "", ""),
+    ("json, async, osm 10% sampled", "json", True, "INFO", "", "backend.services.osm=0.1"),
+    ("json, async, osm+werkzeug WARNING", "json", True, "INFO", "backend.services.osm=WARNING,werkzeug=WARNING", ""),
+]
+
+
+class _InstantProvider:
+    """Returns a fixed handful of features per category without I/O."""
+
+    def nearby(self, category: str, lat: float, lon: float, limit: int, radius: int) -> list[dict]:
+        return [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon + i * 1e-4, lat + i * 1e-4]},
+                "properties": {"osm_type": "node", "osm_id": hash((category, i)) & 0xFFFFFFF, "name": f"{category} {i}"},
+            }
+            for i in range(limit)
+        ]
+
+
+class _SlowFile:
+    """File sink that sleeps per write to emulate back-pressure from the log consumer."""
+
+    def __init__(self, path: str, delay: float):
+        self._file = open(path, "a", encoding="utf-8")
+        self._delay = delay
+
+    def write(self, message: str) -> None:
+        if self._delay:
+            time.sleep(self._delay)
+        self._file.write(message)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+
+def _run_mode(mode: tuple, requests: int, sink_path: str, delay: float) -> float:
+    """Return mean request-thread microseconds per simulated request for one mode."""
+    _, fmt, background, level, levels, sample = mode
+    logging_config.LOG_FORMAT = fmt
+    logging_config.LOG_ASYNC = background
+    logging_config.LOG_LEVEL = level
+    logging_config.LOG_LEVELS = levels
+    logging_config.LOG_SAMPLE = sample
+    logging.getLogger("werkzeug").setLevel(logging.NOTSET)
+    logging_config.setup_logging(_SlowFile(sink_path, delay))
+
+    access = logging.getLogger("werkzeug")
+    provider = _InstantProvider()
+    start = perf_counter()
+    for _ in range(requests):
+        query_nearby(*ORIGIN, limit=5, radius=500, provider=provider)
+        access.info('127.0.0.1 - - "POST /api/waypoint/osm HTTP/1.1" 201 -')
+    elapsed = perf_counter() - start
+    logger.remove()
+    logging_config._close_writer()
+    return elapsed / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--sink-delay-us", type=float, default=0.0)
+    args = parser.parse_args()
+    poi_stats.POI_STATS_DB = ""  # Measure logging only; no hit-rate file writes per request.
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sink_path = os.path.join(tmp, "bench.log")
+        results = [
+            (mode[0], _run_mode(mode, args.requests, sink_path, args.sink_delay_us / 1e6))
+            for mode in MODES
+        ]
+
+    baseline = results[0][1]
+    print(f"{args.requests} requests, sink delay {args.sink_delay_us:g} us/write")
+    print(f"{'mode':<38}  {'us/request':>10}  {'logging us':>10}")
+    for label, micros in results:
+        print(f"{label:<38}  {micros:>10.1f}  {micros - baseline:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark: upstream calls and wasted features with and without adaptive category quotas.
+
+A synthetic provider behaves like Photon: it ranks a category's POIs by a noisy
+distance (location bias, not a filter) and returns `limit` of them however far
+away they are. Cities differ in which categories exist and how dense they are.
+The same query set runs once with fixed PER_CATEGORY_LIMIT fetches and once
+with a CategoryStats store warmed up on a separate set of queries nearby.
+
+    python -m bench.bench_poi_quota [--queries 300] [--warmup 300] [--limit 10]
+
+Reports provider calls, features fetched, features discarded, and result
+quality against the fixed-size run: results returned, mean distance, and the
+share of the fixed run's results that the adaptive run also returned.
+"""
+
+import argparse
+import math
+import random
+import tempfile
+from pathlib import Path
+
+from loguru import logger
+
+from backend.services import poi_stats
+from backend.services.osm import POI_CATEGORIES, query_nearby
+from backend.services.poi_stats import CategoryStats
+from backend.services.scoring import haversine_many
+
+METERS_PER_DEGREE_LAT = 111_320
+CITIES = [(40.7580, -73.9855), (48.8566, 2.3522), (35.6762, 139.6503), (-33.8688, 151.2093)]
+
+
+class BiasedProvider:
+    """Photon-like provider over a synthetic world: biased ranking, no radius cutoff."""
+
+    def __init__(self, seed: int, pois_per_category: int):
+        rng = random.Random(seed)
+        self.calls = 0
+        self.features = 0
+        self._pois: dict[str, list[tuple[str, float, float, float]]] = {}
+        for category in POI_CATEGORIES:
+            rows = []
+            for city_index, (city_lat, city_lon) in enumerate(CITIES):
+                # Each city lacks a couple of categories and has its own density for the rest.
+                if rng.random() < 0.2:
+                    continue
+                count = int(pois_per_category * rng.uniform(0.1, 1.0))
+                spread = rng.uniform(2_000, 8_000)
+                for n in range(count):
+                    lat = city_lat + rng.gauss(0, spread) / METERS_PER_DEGREE_LAT
+                    lon = city_lon + rng.gauss(0, spread) / (METERS_PER_DEGREE_LAT * math.cos(math.radians(city_lat)))
+                    rows.append((f"{category}-{city_index}-{n}", lat, lon, rng.lognormvariate(0, 0.6)))
+            self._pois[category] = rows
+
+    def nearby(self, category: str, lat: float, lon: float, limit: int, radius: int) -> list[dict]:
+        self.calls += 1
+        rows = self._pois[category]
+        distances = haversine_many(lat, lon, [row[1] for row in rows], [row[2] for row in rows])
+        # Relevance times distance: roughly nearest first, with some far results mixed in.
+        order = sorted(range(len(rows)), key=lambda i: (distances[i] + 200) * rows[i][3])[:limit]
+        self.features += len(order)
+        return [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [rows[i][2], rows[i][1]]},
+                "properties": {"osm_type": "node", "osm_id": rows[i][0], "name": rows[i][0]},
+            }
+            for i in order
+        ]
+
+
+def _queries(rng: random.Random, count: int) -> list[tuple[float, float]]:
+    points = []
+    for _ in range(count):
+        city_lat, city_lon = CITIES[rng.randrange(len(CITIES))]
+        points.append(
+            (city_lat + rng.gauss(0, 4_000) / METERS_PER_DEGREE_LAT, city_lon + rng.gauss(0, 4_000) / METERS_PER_DEGREE_LAT)
+        )
+    return points
+
+
+def _run(provider: BiasedProvider, points: list[tuple[float, float]], limit: int, stats: CategoryStats | None) -> list[list[dict]]:
+    provider.calls = provider.features = 0
+    return [query_nearby(lat, lon, limit=limit, radius=500, provider=provider, stats=stats) for lat, lon in points]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=300, help="Queries used to build hit-rate history")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--pois-per-category", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logger.disable("backend")
+    poi_stats.POI_STATS_DB = ""  # The fixed-size run must not pick up a shared stats file.
+    provider = BiasedProvider(args.seed, args.pois_per_category)
+    rng = random.Random(args.seed)
+    warmup, points = _queries(rng, args.warmup), _queries(rng, args.queries)
+
+    fixed = _run(provider, points, args.limit, None)
+    fixed_calls, fixed_features = provider.calls, provider.features
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = CategoryStats(str(Path(tmp) / "poi_stats.db"))
+        _run(provider, warmup, args.limit, stats)
+        adaptive = _run(provider, points, args.limit, stats)
+        adaptive_calls, adaptive_features = provider.calls, provider.features
+        stats._conn.close()
+
+    def summary(label: str, runs: list[list[dict]], calls: int, features: int) -> None:
+        returned = sum(len(run) for run in runs)
+        distances = [
+            distance
+            for (lat, lon), run in zip(points, runs)
+            for distance in haversine_many(lat, lon, [poi["lat"] for poi in run], [poi["lon"] for poi in run])
+        ]
+        print(
+            f"{label:<9} calls={calls:<6} features={features:<7} discarded={features - returned:<7} "
+            f"returned={returned / len(runs):5.2f}/query  mean distance={sum(distances) / max(len(distances), 1):7.0f} m"
+        )
+
+    summary("fixed", fixed, fixed_calls, fixed_features)
+    summary("adaptive", adaptive, adaptive_calls, adaptive_features)
+    overlap = sum(
+        len({poi["id"] for poi in a} & {poi["id"] for poi in f}) for a, f in zip(adaptive, fixed)
+    ) / max(sum(len(f) for f in fixed), 1)
+    print(
+        f"calls {adaptive_calls / fixed_calls - 1:+.0%}, features {adaptive_features / fixed_features - 1:+.0%}, "
+        f"{overlap:.0%} of fixed-size results also returned"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Micro-benchmark: batched candidate scoring vs. the scalar per-feature loop.
+
+    python -m bench.bench_scoring [--sizes 1000 10000 100000] [--limit 10]
+"""
+
+import argparse
+import random
+import timeit
+
+from backend.services import scoring
+from backend.services.osm import _haversine_distance
+
+ORIGIN = (40.758896, -73.985130)
+
+
+def _make_pool(size: int, seed: int = 0) -> list[dict]:
+    """Return `size` candidates scattered within ~5 km of ORIGIN."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"node/{i}",
+            "lat": ORIGIN[0] + rng.uniform(-0.05, 0.05),
+            "lon": ORIGIN[1] + rng.uniform(-0.05, 0.05),
+            "category": "cafe",
+        }
+        for i in range(size)
+    ]
+
+
+def _scalar(pool: list[dict], radius: float, limit: int) -> list[dict]:
+    """Reference: the original per-feature haversine, append, and full sort."""
+    results = []
+    for poi in pool:
+        distance = _haversine_distance(ORIGIN[0], ORIGIN[1], poi["lat"], poi["lon"])
+        if distance > radius:
+            continue
+        results.append({**poi, "distance": distance})
+    results.sort(key=lambda p: p["distance"])
+    return results[:limit]
+
+
+def _batched(pool: list[dict], radius: float, limit: int) -> list[dict]:
+    """Current path: one batched distance pass plus partial top-k."""
+    found = scoring.score_candidates(ORIGIN[0], ORIGIN[1], [dict(p) for p in pool], radius)
+    return scoring.nearest(found, limit)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--radius", type=float, default=4_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backend = "numpy" if scoring.numpy_module() is not None else "pure-python"
+    print(f"scoring backend: {backend}")
+    print(f"{'pool':>8}  {'scalar ms':>10}  {'batched ms':>10}  {'speedup':>7}")
+    for size in args.sizes:
+        pool = _make_pool(size)
+        expected = [p["id"] for p in _scalar(pool, args.radius, args.limit)]
+        actual = [p["id"] for p in _batched(pool, args.radius, args.limit)]
+        assert expected == actual, "batched top-k disagrees with scalar reference"
+
+        scalar = min(timeit.repeat(lambda: _scalar(pool, args.radius, args.limit), number=1, repeat=args.repeat))
+        batched = min(timeit.repeat(lambda: _batched(pool, args.radius, args.limit), number=1, repeat=args.repeat))
+        print(f"{size:>8}  {scalar * 1e3:>10.2f}  {batched * 1e3:>10.2f}  {scalar / batched:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Check: the sign-up and exploring flows stay within their routes' @query_budget.
+
+Runs the requests the frontend makes for a new user — create the user and a
+root waypoint, assign the root, attach and visit children, save a journal entry,
+and read the tree back — against a throwaway SQLite file with the query
+inspector in strict mode, and exits 1 if any route exceeds its budget.
+
+    python -m bench.check_query_budgets
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+# Read at import time by backend.app and backend.query_inspector.
+os.environ["QUERY_INSPECTOR"] = "1"
+os.environ["QUERY_INSPECTOR_STRICT"] = "1"
+
+from loguru import logger  # noqa: E402
+
+from backend.app import create_app  # noqa: E402
+from backend.query_inspector import QueryBudgetExceeded  # noqa: E402
+
+
+def main() -> None:
+    logger.disable("backend")
+    failures: list[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(f"sqlite:///{Path(tmp) / 'budgets.db'}")
+        client = app.test_client()
+
+        def call(method: str, path: str, payload: dict | None = None) -> dict:
+            try:
+                response = client.open(path=path, method=method, json=payload)
+            except QueryBudgetExceeded as e:
+                failures.append(str(e))
+                print(f"FAIL {method} {path}: {e}")
+                return {}
+            print(f"ok   {method} {path} -> {response.status_code}")
+            return response.get_json(silent=True) or {}
+
+        user = call("POST", "/api/user", {"username": "budget", "lat": 40.7589, "lon": -73.9851})
+        root = call("POST", "/api/waypoint", {"api_id": "check/root", "lat": 40.7589, "lon": -73.9851, "name": "Root"})
+        call("PATCH", f"/api/user/{user['id']}/root", {"root_waypoint_id": root["id"]})
+        child = call("POST", "/api/waypoint", {"api_id": "check/child", "lat": 40.759, "lon": -73.985, "name": "Child"})
+        call("PATCH", f"/api/waypoint/{root['id']}/children", {"child_ids": [child["id"]]})
+        call("PATCH", f"/api/waypoint/{child['id']}/visited", {"visited": True})
+        call("POST", "/api/journal", {"waypoint_id": child["id"], "user_id": user["id"], "content": "Checked"})
+        call("GET", f"/api/user/{user['id']}")
+        call("GET", f"/api/waypoint/tree/{user['id']}")
+        call("GET", f"/api/journal/user/{user['id']}")
+        app.extensions["db_engine"].dispose()
+
+    if failures:
+        raise SystemExit(f"{len(failures)} route(s) exceeded their query budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Offline bulk generator of synthetic users and waypoint trees for scale testing.
+
+Builds geographically clustered trees without Photon or the HTTP layer: users are
+spread around city centers, each explored node's children land near their parent,
+and every row is written with bulk Core inserts in large transactions. Output is
+deterministic for a given --seed on an empty database.
+
+    python -m bench.synthetic --db sqlite:///scale.db --users 10000 \\
+        --depth poisson:4 --fanout uniform:1:4 --seed 7
+
+Distributions are "const:N", "uniform:LO:HI", "poisson:MEAN" or "geometric:MEAN".
+"""
+
+import argparse
+import math
+import os
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine, create_engine, event, func, insert, select
+
+from backend.migrations import migrate
+from backend.models.journal import JournalEntry
+from backend.models.user import User
+from backend.models.waypoint import Waypoint
+from backend.services.osm import POI_CATEGORIES
+
+METERS_PER_DEGREE_LAT = 111_320
+
+CITIES = [
+    (40.7580, -73.9855),  # New York
+    (38.8977, -77.0365),  # Washington
+    (37.7886, -122.3918),  # San Francisco
+    (41.8781, -87.6298),  # Chicago
+    (51.5074, -0.1278),  # London
+    (48.8566, 2.3522),  # Paris
+    (52.5200, 13.4050),  # Berlin
+    (35.6762, 139.6503),  # Tokyo
+    (-33.8688, 151.2093),  # Sydney
+    (19.4326, -99.1332),  # Mexico City
+]
+
+ADJECTIVES = ["Old", "Little", "Grand", "Hidden", "North", "South", "Riverside", "Corner", "Golden", "Quiet"]
+
+Distribution = Callable[[random.Random], int]
+
+
+def parse_distribution(spec: str) -> Distribution:
+    """Turn "const:N", "uniform:LO:HI", "poisson:MEAN" or "geometric:MEAN" into a sampler."""
+    kind, _, rest = spec.partition(":")
+    params = [float(p) for p in rest.split(":") if p]
+    if kind == "const" and len(params) == 1:
+        value = int(params[0])
+        return lambda rng: value
+    if kind == "uniform" and len(params) == 2:
+        low, high = int(params[0]), int(params[1])
+        return lambda rng: rng.randint(low, high)
+    if kind == "poisson" and len(params) == 1:
+        threshold = math.exp(-params[0])
+
+        def poisson(rng: random.Random) -> int:
+            # Knuth's method; fine for the small means used for depth and fan-out.
+            k, p = 0, rng.random()
+            while p > threshold:
+                k += 1
+                p *= rng.random()
+            return k
+
+        return poisson
+    if kind == "geometric" and len(params) == 1:
+        p = 1 / (params[0] + 1)
+        return lambda rng: int(math.log(1 - rng.random()) / math.log(1 - p))
+    raise ValueError(f"invalid distribution {spec!r}")
+
+
+@dataclass
+class GenerationStats:
+    """Rows written per table and wall time."""
+
+    users: int = 0
+    waypoints: int = 0
+    journal_entries: int = 0
+    seconds: float = 0.0
+    max_depth: int = 0
+    root_ids: list[int] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return self.users + self.waypoints + self.journal_entries
+
+    def summary(self) -> str:
+        rate = self.rows / self.seconds if self.seconds else 0.0
+        return (
+            f"{self.users} users, {self.waypoints} waypoints, {self.journal_entries} journal entries "
+            f"(max depth {self.max_depth}) in {self.seconds:.2f}s — {rate:,.0f} rows/s"
+        )
+
+
+def _offset(rng: random.Random, lat: float, lon: float, meters: float) -> tuple[float, float]:
+    """Return a point a Gaussian distance (sigma = meters) from (lat, lon)."""
+    d_lat = rng.gauss(0, meters) / METERS_PER_DEGREE_LAT
+    d_lon = rng.gauss(0, meters) / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return max(-85.0, min(85.0, lat + d_lat)), (lon + d_lon + 180.0) % 360.0 - 180.0
+
+
+def _enable_bulk_pragmas(engine: Engine) -> None:
+    """Trade durability for speed on the generator's own SQLite connections."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, _record) -> None:
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+        cursor.close()
+
+
+def generate(
+    engine: Engine,
+    users: int,
+    depth: Distribution,
+    fanout: Distribution,
+    seed: int = 0,
+    max_nodes_per_user: int = 5_000,
+    journal_rate: float = 0.05,
+    spread_m: float = 8_000,
+    child_radius_m: float = 1_500,
+    batch_rows: int = 50_000,
+    username_prefix: str = "synth",
+) -> GenerationStats:
+    """
+    Insert `users` users, each owning one randomly grown waypoint tree.
+
+    IDs are assigned up front from the current maximum, so children lists are
+    complete when a row is first written and no UPDATE pass is needed.
+
+    Parameters
+    ----------
+    engine : Engine
+        Target database, already migrated.
+    users : int
+        Number of users (and trees) to create.
+    depth : Distribution
+        Sampler for each tree's maximum depth below its root.
+    fanout : Distribution
+        Sampler for the number of children of each explored node.
+    seed : int, optional
+        Random seed; identical arguments on an empty database give identical rows.
+    max_nodes_per_user : int, optional
+        Hard cap on one tree's size, including its root (default: 5000).
+    journal_rate : float, optional
+        Fraction of visited waypoints that get a journal entry (default: 0.05).
+    spread_m : float, optional
+        Gaussian spread of user homes around their city center (default: 8 km).
+    child_radius_m : float, optional
+        Gaussian spread of children around their parent at depth 1; halves per
+        level, like repeated exploration at shrinking radii (default: 1.5 km).
+    batch_rows : int, optional
+        Rows buffered per transaction (default: 50000).
+    username_prefix : str, optional
+        Usernames are f"{prefix}_{seed}_{n}" (default: "synth").
+
+    Returns
+    -------
+    GenerationStats
+        Row counts, elapsed time and the created root waypoint IDs.
+    """
+    rng = random.Random(seed)
+    stats = GenerationStats()
+    epoch = datetime(2024, 1, 1)
+
+    with engine.connect() as conn:
+        next_waypoint_id = (conn.scalar(select(func.max(Waypoint.id))) or 0) + 1
+        next_user_id = (conn.scalar(select(func.max(User.id))) or 0) + 1
+
+    waypoint_rows: list[dict] = []
+    user_rows: list[dict] = []
+    journal_rows: list[dict] = []
+
+    def flush() -> None:
+        # Waypoints first: users reference their root and journal entries reference both.
+        with engine.begin() as conn:
+            if waypoint_rows:
+                conn.execute(insert(Waypoint), waypoint_rows)
+            if user_rows:
+                conn.execute(insert(User), user_rows)
+            if journal_rows:
+                conn.execute(insert(JournalEntry), journal_rows)
+        stats.waypoints += len(waypoint_rows)
+        stats.users += len(user_rows)
+        stats.journal_entries += len(journal_rows)
+        waypoint_rows.clear()
+        user_rows.clear()
+        journal_rows.clear()
+
+    start = time.perf_counter()
+    for n in range(users):
+        user_id = next_user_id
+        next_user_id += 1
+        city_lat, city_lon = CITIES[rng.randrange(len(CITIES))]
+        home_lat, home_lon = _offset(rng, city_lat, city_lon, spread_m)
+        tree_depth = max(0, depth(rng))
+        visited_at = epoch + timedelta(minutes=rng.randrange(60 * 24 * 365))
+
+        root_id = next_waypoint_id
+        next_waypoint_id += 1
+        nodes = 1
+        # (id, lat, lon, depth, api_id, name, category); children filled when the node is popped.
+        frontier = [(root_id, home_lat, home_lon, 0, f"synthetic/{seed}/{root_id}", f"Home {n}", None)]
+        index = 0
+        while index < len(frontier):
+            node_id, lat, lon, level, api_id, name, category = frontier[index]
+            index += 1
+            children: list[int] = []
+            if level < tree_depth and nodes < max_nodes_per_user:
+                count = min(max(0, fanout(rng)), max_nodes_per_user - nodes)
+                radius = child_radius_m / (2 ** level)
+                for _ in range(count):
+                    child_id = next_waypoint_id
+                    next_waypoint_id += 1
+                    child_lat, child_lon = _offset(rng, lat, lon, radius)
+                    child_category = POI_CATEGORIES[rng.randrange(len(POI_CATEGORIES))]
+                    child_name = f"{ADJECTIVES[rng.randrange(len(ADJECTIVES))]} {child_category.title()} {child_id}"
+                    frontier.append(
+                        (child_id, child_lat, child_lon, level + 1, f"synthetic/{seed}/{child_id}", child_name, child_category)
+                    )
+                    children.append(child_id)
+                nodes += count
+                stats.max_depth = max(stats.max_depth, level + (1 if children else 0))
+
+            # Explored nodes were visited when their children were discovered.
+            visited = bool(children)
+            node_visited_at = visited_at + timedelta(minutes=index) if visited else None
+            waypoint_rows.append(
+                {
+                    "id": node_id,
+                    "children": children,
+                    "version": 0,
+                    "visited": visited,
+                    "visited_at": node_visited_at,
+                    "api_id": api_id,
+                    "lat": lat,
+                    "lon": lon,
+                    "name": name,
+                    "category": category,
+                    "owner_id": user_id,
+                }
+            )
+            if visited and rng.random() < journal_rate:
+                journal_rows.append(
+                    {
+                        "waypoint_id": node_id,
+                        "user_id": user_id,
+                        "content": f"Visited {name} on day {node_visited_at.timetuple().tm_yday}.",
+                        "created_at": node_visited_at,
+                    }
+                )
+
+        user_rows.append(
+            {
+                "id": user_id,
+                "username": f"{username_prefix}_{seed}_{n}",
+                "lat": home_lat,
+                "lon": home_lon,
+                "root_waypoint_id": root_id,
+            }
+        )
+        stats.root_ids.append(root_id)
+        if len(waypoint_rows) >= batch_rows:
+            flush()
+
+    flush()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.getenv("DATABASE_URL", "sqlite:///branch.db"))
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--depth", default="poisson:3", help="Tree depth distribution")
+    parser.add_argument("--fanout", default="uniform:1:4", help="Children per explored node")
+    parser.add_argument("--max-nodes-per-user", type=int, default=5_000)
+    parser.add_argument("--journal-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    engine = create_engine(args.db)
+    _enable_bulk_pragmas(engine)
+    migrate(engine)
+    stats = generate(
+        engine,
+        users=args.users,
+        depth=parse_distribution(args.depth),
+        fanout=parse_distribution(args.fanout),
+        seed=args.seed,
+        max_nodes_per_user=args.max_nodes_per_user,
+        journal_rate=args.journal_rate,
+        batch_rows=args.batch_rows,
+    )
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
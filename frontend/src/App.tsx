@@ -1,7 +1,8 @@
 import { useCallback, useEffect, useRef, useState } from 'react'
-import { type WaypointTree, getWaypointTree, setVisited, exploreWaypoint, prepareChildren, addChildren } from './api/waypoint'
-import { type User, getUser, listUsers } from './api/user'
-import { saveJournalEntry, getJournalEntry } from './api/journal'
+import { type WaypointTree, applyTreeEvent, getWaypointTree, prepareChildren, subscribeTreeEvents } from './api/waypoint'
+import { type BatchOp, ref, runBatch } from './api/batch'
+import { type User, getUser, listAllUsers } from './api/user'
+import { getAllJournalEntries } from './api/journal'
 import { Header } from './components/Header/Header'
 import { ALL_CATEGORIES, type Category } from './components/Header/CategoryFilter'
 import { Landing } from './components/Landing/Landing'
@@ -31,7 +32,8 @@ export function App() {
   const [pulseParentId, setPulseParentId] = useState<number | null>(null)
   const [pulsingIds, setPulsingIds] = useState<Set<number>>(new Set())
   const [panTarget, setPanTarget] = useState<WaypointTree | null>(null)
-  const [journal, setJournal] = useState<string | null>(null)
+  // waypointId → journal text for the current user, loaded once per user
+  const [journals, setJournals] = useState<Record<number, string>>({})
   const [sidebarOpen, setSidebarOpen] = useState(false)
   const [sidebarVisitId, setSidebarVisitId] = useState<number | null>(null)
   const [radius, setRadius] = useState(5000)
@@ -67,13 +69,31 @@ export function App() {
   }
 
   useEffect(() => {
-    listUsers()
-      .then(setUsers)
-      .catch(() => setUsers([]))
+    // Page through every user so the pickers can reach all of them; show each page as it arrives.
+    let cancelled = false
+    listAllUsers(loaded => { if (!cancelled) setUsers(loaded) })
+      .catch(() => { /* keep the users loaded so far */ })
+    return () => { cancelled = true }
   }, [])
 
   useEffect(() => { if (userId !== null) fetchTree(userId) }, [userId]) // eslint-disable-line react-hooks/exhaustive-deps
 
+  // Patch the tree in place from the server's event stream (changes from other tabs/devices).
+  // A resync, or a reconnect that may have missed events, refetches without clearing the map.
+  useEffect(() => {
+    if (userId === null) return
+    let connected = false
+    return subscribeTreeEvents(userId, event => {
+      if (event.type === 'resync' || (event.type === 'ready' && connected)) {
+        getWaypointTree(userId).then(setTree).catch(() => { /* keep the current tree */ })
+      } else if (event.type === 'ready') {
+        connected = true
+      } else {
+        setTree(prev => prev && applyTreeEvent(prev, event))
+      }
+    })
+  }, [userId])
+
   // Re-derive selected from selectedId whenever tree changes.
   // Also consume pulseParentId: add the parent's new unvisited children to pulsingIds.
   useEffect(() => {
@@ -99,14 +119,18 @@ export function App() {
     }
   }, [tree]) // eslint-disable-line react-hooks/exhaustive-deps
 
-  // Fetch journal entry when a visited waypoint is selected; clear otherwise.
+  // Load all of the user's journal entries up front instead of one request per selection.
   useEffect(() => {
-    if (selected?.visited) {
-      getJournalEntry(selected.id, userId || 0).then(entry => setJournal(entry?.content ?? null)).catch(() => setJournal(null))
-    } else {
-      setJournal(null)
-    }
-  }, [selected?.id, selected?.visited, userId]) // eslint-disable-line react-hooks/exhaustive-deps
+    setJournals({})
+    if (userId === null) return
+    let cancelled = false
+    getAllJournalEntries(userId)
+      .then(entries => { if (!cancelled) setJournals(entries) })
+      .catch(() => { /* silent — the panel just shows no journal */ })
+    return () => { cancelled = true }
+  }, [userId])
+
+  const journal = selected?.visited ? journals[selected.id] ?? null : null
 
   const handleWaypointClick = useCallback((waypoint: WaypointTree) => {
     setSelected(waypoint)
@@ -149,8 +173,9 @@ export function App() {
       category: waypoint.category, visited: waypoint.visited,
       isRoot: tree !== null && waypoint.id === tree.id,
     })
+    // Visit, explore/link children, save the journal and refetch the tree in one round-trip.
+    const ops: BatchOp[] = [{ op: 'set_visited', args: { waypoint_id: waypoint.id, visited: true } }]
     try {
-      await setVisited(waypoint.id)
       if (waypoint.children.length === 0) {
         // Wait for any in-flight pre-fetch before deciding what to do
         if (prefetchPromiseRef.current !== null) await prefetchPromiseRef.current
@@ -159,19 +184,33 @@ export function App() {
         if (childIds !== undefined) {
           // Pre-fetch completed — link the already-created children now
           delete prefetchedChildIds.current[waypoint.id]
-          if (childIds.length > 0) await addChildren(waypoint.id, childIds)
+          if (childIds.length > 0)
+            ops.push({ op: 'add_children', args: { waypoint_id: waypoint.id, child_ids: childIds } })
         } else {
           // No pre-fetch available — explore inline as fallback
           const numChildren = waypoint.id === tree?.id ? 4 : Math.floor(Math.random() * 2) + 1
-          await exploreWaypoint(userId, waypoint.id, waypoint.lat, waypoint.lon, radius, numChildren, categories)
+          ops.push(
+            {
+              op: 'discover', ref: 'found',
+              args: { lat: waypoint.lat, lon: waypoint.lon, radius, num: numChildren, categories, user_id: userId },
+            },
+            { op: 'add_children', args: { waypoint_id: waypoint.id, child_ids: ref('found') } },
+          )
         }
       }
       if (journalText)
-        await saveJournalEntry(waypoint.id, userId, journalText)
+        ops.push({ op: 'save_journal', args: { waypoint_id: waypoint.id, user_id: userId, content: journalText } })
+      ops.push({ op: 'get_tree', args: { user_id: userId } })
+
+      const results = await runBatch(ops)
+      setTree(results[results.length - 1] as WaypointTree)
+      // The first entry per waypoint wins, so only fill in a missing one.
+      if (journalText)
+        setJournals(prev => waypoint.id in prev ? prev : { ...prev, [waypoint.id]: journalText.trim() })
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Something went wrong')
-    } finally {
       await fetchTree(userId)
+    } finally {
       setVisiting(false)
       setLoadingPos(null)
     }
@@ -197,7 +236,6 @@ export function App() {
     setPulseParentId(null)
     setPulsingIds(new Set())
     setPanTarget(null)
-    setJournal(null)
     setSidebarOpen(false)
     setLoadingPos(null)
     prefetchedChildIds.current = {}
@@ -236,7 +274,7 @@ export function App() {
           <main className="flex-1 relative overflow-hidden">
             {tree ? (
               <>
-                <Map tree={tree} selectedId={selectedId} panTarget={panTarget} pulsingIds={pulsingIds} fitTarget={fitTarget} loadingPos={loadingPos} onWaypointClick={handleWaypointClick} />
+                <Map ownerId={userId!} tree={tree} selectedId={selectedId} panTarget={panTarget} pulsingIds={pulsingIds} fitTarget={fitTarget} loadingPos={loadingPos} onWaypointClick={handleWaypointClick} />
                 <SidePanel
                   tree={tree}
                   selectedId={selectedId}
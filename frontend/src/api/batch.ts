@@ -0,0 +1,37 @@
+// HTTP client wrapper for /api/batch — many operations, one request, one transaction
+
+export interface BatchRef {
+    $ref: string
+}
+
+export type BatchOpName =
+    | 'discover'
+    | 'create_waypoint'
+    | 'set_visited'
+    | 'add_children'
+    | 'save_journal'
+    | 'create_user'
+    | 'set_root'
+    | 'get_tree'
+
+export interface BatchOp {
+    op: BatchOpName
+    args: Record<string, unknown>
+    ref?: string
+}
+
+// Refer to the ID (or list of IDs) produced by an earlier operation tagged with `ref`.
+export function ref(name: string): BatchRef {
+    return { $ref: name }
+}
+
+export async function runBatch(operations: BatchOp[]): Promise<unknown[]> {
+    const res = await fetch('/api/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operations }),
+    })
+    if (!res.ok) throw new Error(`Batch failed: ${res.status}`)
+    const data = await res.json() as { results: unknown[] }
+    return data.results
+}
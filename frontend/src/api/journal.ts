@@ -31,3 +31,51 @@ export async function getJournalEntry(
     if (!res.ok) throw new Error(`Failed to fetch journal entry: ${res.status}`)
     return res.json() as Promise<JournalEntry>
 }
+
+export interface JournalPage {
+    entries: JournalEntry[]
+    next_after: number | null
+}
+
+export async function listJournalEntries(
+    userId: number,
+    waypointIds?: number[],
+    after?: number,
+): Promise<JournalPage> {
+    const params = new URLSearchParams()
+    if (waypointIds) params.set('waypoint_ids', waypointIds.join(','))
+    if (after !== undefined) params.set('after', String(after))
+    const res = await fetch(`/api/journal/user/${userId}?${params}`)
+    if (!res.ok) throw new Error(`Failed to fetch journal entries: ${res.status}`)
+    return res.json() as Promise<JournalPage>
+}
+
+// Fetch every journal entry for a user, following next_after cursors.
+export async function getAllJournalEntries(userId: number): Promise<Record<number, string>> {
+    const byWaypoint: Record<number, string> = {}
+    let after: number | undefined
+    do {
+        const page = await listJournalEntries(userId, undefined, after)
+        for (const entry of page.entries) byWaypoint[entry.waypoint_id] = entry.content
+        after = page.next_after ?? undefined
+    } while (after !== undefined)
+    return byWaypoint
+}
+
+export interface JournalSearchHit {
+    waypoint_id: number
+    snippet: string
+    score: number
+}
+
+export interface JournalSearchResult {
+    waypoint_ids: number[]
+    results: JournalSearchHit[]
+}
+
+export async function searchJournal(userId: number, q: string, limit = 20): Promise<JournalSearchResult> {
+    const params = new URLSearchParams({ q, user_id: String(userId), limit: String(limit) })
+    const res = await fetch(`/api/journal/search?${params}`)
+    if (!res.ok) throw new Error(`Failed to search journal: ${res.status}`)
+    return res.json() as Promise<JournalSearchResult>
+}
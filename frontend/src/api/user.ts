@@ -1,5 +1,7 @@
 // HTTP client wrappers for /api/user/*
 
+import { visitQueryParams, type VisitPage, type VisitQuery } from "./waypoint";
+
 export interface User {
     id: number;
     username: string;
@@ -14,14 +16,45 @@ export interface AddressSearchResult {
     lon: number;
 }
 
-export async function listUsers(): Promise<User[]> {
-    const res = await fetch(`/api/user`);
+export interface UserPage {
+    users: User[];
+    next_after_id?: number | null;
+    next_after_username?: string | null;
+}
+
+/**
+ * Fetch one page of users: by ID after `afterId`, or by username when `prefix` is set.
+ */
+export async function listUsers(
+    opts: { afterId?: number; prefix?: string; afterUsername?: string; limit?: number } = {},
+): Promise<UserPage> {
+    const params = new URLSearchParams();
+    if (opts.afterId !== undefined) params.set("after_id", String(opts.afterId));
+    if (opts.prefix) params.set("prefix", opts.prefix);
+    if (opts.afterUsername !== undefined) params.set("after_username", opts.afterUsername);
+    if (opts.limit !== undefined) params.set("limit", String(opts.limit));
+    const res = await fetch(`/api/user?${params.toString()}`);
     if (!res.ok) {
         throw new Error(`failed to list users: ${res.status}`);
     }
     return res.json();
 }
 
+/**
+ * Fetch every user, one ID-ordered page at a time, calling `onPage` with the users so far.
+ */
+export async function listAllUsers(onPage: (users: User[]) => void): Promise<User[]> {
+    const users: User[] = [];
+    let afterId: number | undefined;
+    for (;;) {
+        const page = await listUsers({ afterId, limit: 200 });
+        users.push(...page.users);
+        onPage([...users]);
+        if (page.next_after_id == null) return users;
+        afterId = page.next_after_id;
+    }
+}
+
 /**
  * Fetch a user by ID from the backend.
  *
@@ -68,3 +101,14 @@ export async function assignRootWaypoint(userId: number, waypointId: number): Pr
     }
     return res.json();
 }
+
+/**
+ * Fetch one page of a user's visited waypoints, most recent first.
+ */
+export async function listUserVisits(userId: number, opts: VisitQuery = {}): Promise<VisitPage> {
+    const res = await fetch(`/api/user/${userId}/visits?${visitQueryParams(opts).toString()}`);
+    if (!res.ok) {
+        throw new Error(`failed to list visits for user ${userId}: ${res.status}`);
+    }
+    return res.json();
+}
@@ -24,6 +24,47 @@ export interface WaypointTree {
     category: string | null;
 }
 
+export interface WaypointCluster {
+    lat: number;
+    lon: number;
+    count: number;
+    bounds: [number, number, number, number]; // [min_lat, min_lon, max_lat, max_lon]
+}
+
+export interface ViewportWaypoints {
+    zoom: number;
+    waypoints: Waypoint[];
+    clusters: WaypointCluster[];
+}
+
+// Waypoints inside a map viewport, optionally one user's; the server clusters them when zoomed out or dense.
+export async function getWaypointsInBBox(
+    minLat: number,
+    minLon: number,
+    maxLat: number,
+    maxLon: number,
+    zoom: number,
+    ownerId?: number,
+): Promise<ViewportWaypoints> {
+    const params = new URLSearchParams({
+        min_lat: String(minLat),
+        min_lon: String(minLon),
+        max_lat: String(maxLat),
+        max_lon: String(maxLon),
+        zoom: String(zoom),
+    })
+    if (ownerId !== undefined) params.set('owner_id', String(ownerId))
+    const res = await fetch(`/api/waypoint/bbox?${params.toString()}`)
+    if (!res.ok) throw new Error(`Failed to fetch waypoints in bbox: ${res.status}`)
+    return res.json() as Promise<ViewportWaypoints>
+}
+
+export async function getWaypointTile(z: number, x: number, y: number): Promise<ViewportWaypoints> {
+    const res = await fetch(`/api/waypoint/tiles/${z}/${x}/${y}`)
+    if (!res.ok) throw new Error(`Failed to fetch waypoint tile ${z}/${x}/${y}: ${res.status}`)
+    return res.json() as Promise<ViewportWaypoints>
+}
+
 export async function getWaypoint(id: number): Promise<Waypoint> {
     const res = await fetch(`/api/waypoint/${id}`)
     if (!res.ok) throw new Error(`Failed to fetch waypoint ${id}: ${res.status}`)
@@ -36,6 +77,81 @@ export async function getWaypointTree(userId: number): Promise<WaypointTree> {
     return res.json() as Promise<WaypointTree>
 }
 
+// Newest-first visits; pass nextBefore/nextBeforeId back as before/beforeId for the next page.
+export interface VisitQuery {
+    since?: string
+    until?: string
+    before?: string
+    beforeId?: number
+    limit?: number
+}
+
+export interface VisitPage<T extends Waypoint = Waypoint> {
+    visits: T[]
+    next_before: string | null
+    next_before_id: number | null
+}
+
+export function visitQueryParams(opts: VisitQuery): URLSearchParams {
+    const params = new URLSearchParams()
+    if (opts.since) params.set('since', opts.since)
+    if (opts.until) params.set('until', opts.until)
+    if (opts.before !== undefined && opts.beforeId !== undefined) {
+        params.set('before', opts.before)
+        params.set('before_id', String(opts.beforeId))
+    }
+    if (opts.limit !== undefined) params.set('limit', String(opts.limit))
+    return params
+}
+
+// Recently visited waypoints across all users.
+export async function getRecentVisits(opts: VisitQuery = {}): Promise<VisitPage<Waypoint & { owner_id: number | null }>> {
+    const res = await fetch(`/api/waypoint/recent?${visitQueryParams(opts).toString()}`)
+    if (!res.ok) throw new Error(`Failed to fetch recent visits: ${res.status}`)
+    return res.json() as Promise<VisitPage<Waypoint & { owner_id: number | null }>>
+}
+
+// Node-level changes pushed by GET /api/waypoint/tree/<user_id>/events
+export type TreeEvent =
+    | { type: 'ready'; user_id: number }
+    | { type: 'visited'; waypoint_id: number; visited: boolean; visited_at: string | null }
+    | { type: 'children_added'; waypoint_id: number; children: WaypointTree[] }
+    | { type: 'resync'; user_id: number }
+
+// Open the user's tree event stream; returns a function that closes it.
+// EventSource reconnects on its own; each reconnect starts with a fresh 'ready'.
+export function subscribeTreeEvents(userId: number, onEvent: (event: TreeEvent) => void): () => void {
+    const source = new EventSource(`/api/waypoint/tree/${userId}/events`)
+    for (const type of ['ready', 'visited', 'children_added', 'resync'] as const) {
+        source.addEventListener(type, (message: MessageEvent) => {
+            onEvent({ type, ...JSON.parse(message.data) } as TreeEvent)
+        })
+    }
+    return () => source.close()
+}
+
+// Apply a visited/children_added event, copying only the path to the changed node.
+// Returns the same tree when the event is already applied or the node is unknown.
+export function applyTreeEvent(tree: WaypointTree, event: TreeEvent): WaypointTree {
+    if (event.type !== 'visited' && event.type !== 'children_added') return tree
+    if (tree.id === event.waypoint_id) {
+        if (event.type === 'visited') {
+            if (tree.visited === event.visited) return tree
+            return { ...tree, visited: event.visited, visited_at: event.visited_at }
+        }
+        const known = new Set(tree.children.map(child => child.id))
+        const added = event.children.filter(child => !known.has(child.id))
+        return added.length ? { ...tree, children: [...tree.children, ...added] } : tree
+    }
+    let changed = false
+    const children = tree.children.map(child => {
+        const next = applyTreeEvent(child, event)
+        if (next !== child) changed = true
+        return next
+    })
+    return changed ? { ...tree, children } : tree
+}
+
 export async function setVisited(id: number, visited: boolean = true): Promise<Waypoint> {
     const res = await fetch(`/api/waypoint/${id}/visited`, {
         method: 'PATCH',
@@ -1,38 +1,30 @@
 import { useEffect, useRef } from 'react'
 import L from 'leaflet'
-import { type WaypointTree } from '@/api/waypoint'
+import { type ViewportWaypoints, type WaypointTree, getWaypointsInBBox } from '@/api/waypoint'
 import { categoryColor } from '@/lib/categoryColor'
 
-interface FlatWaypoint {
+// Wait for the map to settle before asking the server for the new viewport.
+const VIEWPORT_DEBOUNCE_MS = 150
+
+interface ShownWaypoint {
   id: number
-  name: string
   lat: number
   lon: number
   visited: boolean
-  api_id: string | null
   category: string | null
   isRoot: boolean
-  parentId: number | null
+}
+
+interface TreeEntry {
   node: WaypointTree
+  parent: WaypointTree | null
 }
 
-function flattenTree(
-  node: WaypointTree,
-  isRoot: boolean,
-  parentId: number | null,
-  result: FlatWaypoint[],
-  seenApiIds: Set<string>,
-): void {
-  if (node.api_id && seenApiIds.has(node.api_id)) return
-  if (node.api_id) seenApiIds.add(node.api_id)
-
-  result.push({
-    id: node.id, name: node.name, lat: node.lat, lon: node.lon,
-    visited: node.visited, api_id: node.api_id, category: node.category, isRoot, parentId, node,
-  })
-  node.children.forEach(child => {
-    flattenTree(child, false, node.id, result, seenApiIds)
-  })
+// The fetched tree by waypoint ID: click handlers need the node, edges need the parent.
+function indexTree(node: WaypointTree, parent: WaypointTree | null, index: Record<number, TreeEntry>): void {
+  if (index[node.id]) return
+  index[node.id] = { node, parent }
+  node.children.forEach(child => indexTree(child, node, index))
 }
 
 function makeIcon(category: string | null, visited: boolean, isRoot: boolean, pulse: boolean, selected: boolean): L.DivIcon {
@@ -49,6 +41,16 @@ function makeIcon(category: string | null, visited: boolean, isRoot: boolean, pu
   })
 }
 
+function makeClusterIcon(count: number): L.DivIcon {
+  const size = Math.round(Math.min(56, 24 + 8 * Math.log10(count)))
+  return L.divIcon({
+    className: '',
+    html: `<div style="width:${size}px;height:${size}px;border-radius:50%;background:#034078;color:#ffffff;display:flex;align-items:center;justify-content:center;font:600 11px monospace;box-shadow:0 2px 4px rgba(0,0,0,0.5);cursor:pointer;">${count}</div>`,
+    iconSize: [size, size],
+    iconAnchor: [size / 2, size / 2],
+  })
+}
+
 function makeLoadingIcon(color: string): L.DivIcon {
   return L.divIcon({
     className: '',
@@ -63,6 +65,7 @@ function makeLoadingIcon(color: string): L.DivIcon {
 }
 
 interface Props {
+  ownerId: number
   tree: WaypointTree
   selectedId: number | null
   panTarget: WaypointTree | null
@@ -72,38 +75,121 @@ interface Props {
   onWaypointClick: (waypoint: WaypointTree) => void
 }
 
-function drawPolylines(node: WaypointTree, map: L.Map, lines: L.Polyline[], seenIds: Set<number>): void {
-  if (seenIds.has(node.id)) return
-  seenIds.add(node.id)
-  node.children.forEach(child => {
-    const line = L.polyline([[node.lat, node.lon], [child.lat, child.lon]], {
-      color: 'hsl(var(--foreground))',
-      opacity: 1,
-      weight: 2,
-    }).addTo(map)
-    lines.push(line)
-    drawPolylines(child, map, lines, seenIds)
-  })
-}
-
 function tileUrl(dark: boolean) {
   return dark
     ? 'https://{s}.basemaps.cartocdn.com/dark_nolabels/{z}/{x}/{y}{r}.png'
     : 'https://{s}.basemaps.cartocdn.com/light_nolabels/{z}/{x}/{y}{r}.png'
 }
 
-export function Map({ tree, selectedId, panTarget, pulsingIds, fitTarget, loadingPos, onWaypointClick }: Props) {
+/**
+ * Leaflet map of one user's tree. Only the current viewport is drawn: on every
+ * move or zoom the map asks `/api/waypoint/bbox` for that user's waypoints in
+ * view, which the server groups into count clusters when zoomed out or dense,
+ * so payload and marker count track what is visible rather than the tree size.
+ */
+export function Map({ ownerId, tree, selectedId, panTarget, pulsingIds, fitTarget, loadingPos, onWaypointClick }: Props) {
   const containerRef = useRef<HTMLDivElement>(null)
   const mapRef = useRef<L.Map | null>(null)
   const tileLayerRef = useRef<L.TileLayer | null>(null)
   const markersRef = useRef<L.Marker[]>([])
+  const clusterMarkersRef = useRef<L.Marker[]>([])
   const polylinesRef = useRef<L.Polyline[]>([])
   const loadingMarkerRef = useRef<L.Marker | null>(null)
   const loadingInfoRef = useRef<{ category: string | null; visited: boolean; isRoot: boolean } | null>(null)
-  const flatRef = useRef<FlatWaypoint[]>([])
+  const shownRef = useRef<ShownWaypoint[]>([])
+  const treeIndexRef = useRef<Record<number, TreeEntry>>({})
+  const treeRef = useRef<WaypointTree>(tree)
+  const ownerIdRef = useRef<number>(ownerId)
+  const onWaypointClickRef = useRef(onWaypointClick)
+  const requestSeqRef = useRef(0)
   const pulsingIdsRef = useRef<Set<number>>(pulsingIds)
   const selectedIdRef = useRef<number | null>(selectedId)
 
+  function refreshIcons() {
+    shownRef.current.forEach((wp, i) => {
+      const marker = markersRef.current[i]
+      if (!marker) return
+      const pulse = pulsingIdsRef.current.has(wp.id) && !wp.visited
+      const selected = selectedIdRef.current !== null && wp.id === selectedIdRef.current
+      marker.setIcon(makeIcon(wp.category, wp.visited, wp.isRoot, pulse, selected))
+    })
+  }
+
+  // Replace what is drawn with one viewport response: waypoints, edges to their parents, clusters.
+  function drawViewport(map: L.Map, viewport: ViewportWaypoints) {
+    markersRef.current.forEach(m => m.remove())
+    markersRef.current = []
+    clusterMarkersRef.current.forEach(m => m.remove())
+    clusterMarkersRef.current = []
+    polylinesRef.current.forEach(p => p.remove())
+    polylinesRef.current = []
+
+    const index = treeIndexRef.current
+    const shown: ShownWaypoint[] = []
+    const seenApiIds = new Set<string>()
+    viewport.waypoints.forEach(waypoint => {
+      if (waypoint.api_id && seenApiIds.has(waypoint.api_id)) return
+      if (waypoint.api_id) seenApiIds.add(waypoint.api_id)
+      // Prefer the tree's copy: it already reflects this tab's optimistic updates.
+      const entry = index[waypoint.id]
+      const source = entry?.node ?? waypoint
+      const wp: ShownWaypoint = {
+        id: source.id, lat: source.lat, lon: source.lon, visited: source.visited,
+        category: source.category, isRoot: source.id === treeRef.current.id,
+      }
+      shown.push(wp)
+
+      if (entry?.parent) {
+        // Parents may be off-screen or clustered; the edge is still drawn from the tree's coordinates.
+        polylinesRef.current.push(L.polyline([[entry.parent.lat, entry.parent.lon], [wp.lat, wp.lon]], {
+          color: 'hsl(var(--foreground))',
+          opacity: 1,
+          weight: 2,
+        }).addTo(map))
+      }
+      const pulse = pulsingIdsRef.current.has(wp.id) && !wp.visited
+      const selected = selectedIdRef.current !== null && wp.id === selectedIdRef.current
+      const marker = L.marker([wp.lat, wp.lon], {
+        icon: makeIcon(wp.category, wp.visited, wp.isRoot, pulse, selected),
+      })
+        .addTo(map)
+        .on('click', () => {
+          const node = treeIndexRef.current[wp.id]?.node
+          if (node) onWaypointClickRef.current(node)
+        })
+      markersRef.current.push(marker)
+    })
+    shownRef.current = shown
+
+    viewport.clusters.forEach(cluster => {
+      const [minLat, minLon, maxLat, maxLon] = cluster.bounds
+      const marker = L.marker([cluster.lat, cluster.lon], { icon: makeClusterIcon(cluster.count) })
+        .addTo(map)
+        .on('click', () => map.fitBounds(L.latLngBounds([minLat, minLon], [maxLat, maxLon]), { padding: [40, 40], animate: true }))
+      clusterMarkersRef.current.push(marker)
+    })
+  }
+
+  function loadViewport() {
+    const map = mapRef.current
+    if (!map) return
+    const bounds = map.getBounds()
+    const seq = ++requestSeqRef.current
+    getWaypointsInBBox(
+      Math.max(-90, bounds.getSouth()),
+      Math.max(-180, bounds.getWest()),
+      Math.min(90, bounds.getNorth()),
+      Math.min(180, bounds.getEast()),
+      Math.round(map.getZoom()),
+      ownerIdRef.current,
+    )
+      .then(viewport => {
+        // A later move may have been answered first; only the newest request draws.
+        if (seq === requestSeqRef.current && mapRef.current === map) drawViewport(map, viewport)
+      })
+      .catch(() => { /* keep the current markers */ })
+  }
+
   // Initialize Leaflet map once
   useEffect(() => {
     if (!containerRef.current || mapRef.current) return
@@ -123,7 +209,16 @@ export function Map({ tree, selectedId, panTarget, pulsingIds, fitTarget, loadin
 
     mapRef.current = map
 
+    let timer: ReturnType<typeof setTimeout> | undefined
+    const scheduleLoad = () => {
+      clearTimeout(timer)
+      timer = setTimeout(loadViewport, VIEWPORT_DEBOUNCE_MS)
+    }
+    map.on('moveend zoomend', scheduleLoad)
+
     return () => {
+      clearTimeout(timer)
+      map.off('moveend zoomend', scheduleLoad)
       map.remove()
       mapRef.current = null
       tileLayerRef.current = null
@@ -135,13 +230,7 @@ export function Map({ tree, selectedId, panTarget, pulsingIds, fitTarget, loadin
     const observer = new MutationObserver(() => {
       const dark = document.documentElement.classList.contains('dark')
       tileLayerRef.current?.setUrl(tileUrl(dark))
-      flatRef.current.forEach((wp, i) => {
-        const marker = markersRef.current[i]
-        if (!marker) return
-        const pulse = pulsingIdsRef.current.has(wp.id) && !wp.visited
-        const selected = selectedIdRef.current !== null && wp.id === selectedIdRef.current
-        marker.setIcon(makeIcon(wp.category, wp.visited, wp.isRoot, pulse, selected))
-      })
+      refreshIcons()
       if (loadingMarkerRef.current && loadingInfoRef.current) {
         const { category, visited, isRoot } = loadingInfoRef.current
         loadingMarkerRef.current.setIcon(makeLoadingIcon(categoryColor(category, visited, isRoot)))
@@ -151,58 +240,29 @@ export function Map({ tree, selectedId, panTarget, pulsingIds, fitTarget, loadin
     return () => observer.disconnect()
   }, [])
 
-  // Sync markers, polylines, and fit bounds whenever tree changes
-  useEffect(() => {
-    const map = mapRef.current
-    if (!map) return
-
-    markersRef.current.forEach(m => m.remove())
-    markersRef.current = []
-    polylinesRef.current.forEach(p => p.remove())
-    polylinesRef.current = []
-
-    const flat: FlatWaypoint[] = []
-    flattenTree(tree, true, null, flat, new Set())
-    flatRef.current = flat
-
-    drawPolylines(tree, map, polylinesRef.current, new Set())
+  useEffect(() => { onWaypointClickRef.current = onWaypointClick }, [onWaypointClick])
 
-    flat.forEach(wp => {
-      const pulse = pulsingIdsRef.current.has(wp.id) && !wp.visited
-      const selected = selectedIdRef.current !== null && wp.id === selectedIdRef.current
-      const marker = L.marker([wp.lat, wp.lon], {
-        icon: makeIcon(wp.category, wp.visited, wp.isRoot, pulse, selected),
-      })
-        .addTo(map)
-        .on('click', () => onWaypointClick(wp.node))
-      markersRef.current.push(marker)
-    })
-
-  }, [tree, onWaypointClick])
+  // Re-read the viewport whenever the tree or its owner changes (new children, visits, user switch)
+  useEffect(() => {
+    treeRef.current = tree
+    ownerIdRef.current = ownerId
+    const index: Record<number, TreeEntry> = {}
+    indexTree(tree, null, index)
+    treeIndexRef.current = index
+    loadViewport()
+  }, [tree, ownerId]) // eslint-disable-line react-hooks/exhaustive-deps
 
   // Update icons only when pulsingIds changes (no full rebuild)
   useEffect(() => {
     pulsingIdsRef.current = pulsingIds
-    flatRef.current.forEach((wp, i) => {
-      const marker = markersRef.current[i]
-      if (!marker) return
-      const pulse = pulsingIds.has(wp.id) && !wp.visited
-      const selected = selectedIdRef.current !== null && wp.id === selectedIdRef.current
-      marker.setIcon(makeIcon(wp.category, wp.visited, wp.isRoot, pulse, selected))
-    })
-  }, [pulsingIds])
+    refreshIcons()
+  }, [pulsingIds]) // eslint-disable-line react-hooks/exhaustive-deps
 
   // Update icons only when selectedId changes (no full rebuild)
   useEffect(() => {
     selectedIdRef.current = selectedId
-    flatRef.current.forEach((wp, i) => {
-      const marker = markersRef.current[i]
-      if (!marker) return
-      const pulse = pulsingIdsRef.current.has(wp.id) && !wp.visited
-      const selected = selectedId !== null && wp.id === selectedId
-      marker.setIcon(makeIcon(wp.category, wp.visited, wp.isRoot, pulse, selected))
-    })
-  }, [selectedId])
+    refreshIcons()
+  }, [selectedId]) // eslint-disable-line react-hooks/exhaustive-deps
 
   // After visiting a node, fit bounds to include it and all its new children.
   useEffect(() => {
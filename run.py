@@ -6,7 +6,7 @@ import sys
 
 from loguru import logger
 
-from backend.app import DATABASE_URL, app
+from backend.app import DATABASE_URL, create_app
 from backend.logging_config import setup_logging
 
 
@@ -38,6 +38,7 @@ def main() -> None:
     port = int(os.getenv("PORT", "8000"))
     debug = os.getenv("FLASK_DEBUG", "1") == "1"
 
+    app = create_app()
     logger.info(f"Starting server on http://127.0.0.1:{port} (debug={debug})")
     app.run(host="127.0.0.1", port=port, debug=debug, use_reloader=False)
 
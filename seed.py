@@ -11,6 +11,8 @@ from loguru import logger
 from backend.logging_config import setup_logging
 from backend.models.user import User
 from backend.models.waypoint import Waypoint
+from backend.profiling import profiled
+from backend.routes.batch import MAX_EXPLORE_LEAVES
 
 PROFILES = [
     {
@@ -88,130 +90,123 @@ def _wipe_sqlite() -> None:
 
 def _explore(
     client: FlaskClient,
-    waypoint_id: int,
-    lat: float,
-    lon: float,
+    leaves: list[dict[str, Any]],
     depth: int,
     seen_api_ids: set[str],
     seen_names: set[str],
-    target: int = ROOT_TARGET,
 ) -> int:
-    """Mark waypoint visited, discover nearby POIs, attach up to target as children.
+    """Visit every leaf and attach discovered children, one tree level per request.
 
-    Recurses depth-1 for each child. Returns total nodes added (children + descendants).
+    The first level gets ROOT_TARGET children per leaf, deeper ones a random
+    CHILD_TARGET count. Nearby leaves share one server-side discovery fan-out.
+    Returns total nodes added.
     """
-    if depth == 0:
-        return 0
-
-    pool = cast(
-        list[dict[str, Any]],
-        _api(
-            client,
-            "POST",
-            "/api/waypoint/osm",
-            {"lat": lat, "lon": lon, "num": target, "radius": 5000},
-        ),
-    )
-
-    fresh = [
-        w
-        for w in pool
-        if w.get("api_id") not in seen_api_ids and w["name"] not in seen_names
-    ]
-    children = fresh[:target]
-
-    if not children:
-        return 0
-
-    _api(client, "PATCH", f"/api/waypoint/{waypoint_id}/visited", {"visited": True})
-
-    for w in children:
-        if w.get("api_id"):
-            seen_api_ids.add(w["api_id"])
-        seen_names.add(w["name"])
-
-    _api(
-        client,
-        "PATCH",
-        f"/api/waypoint/{waypoint_id}/children",
-        {"child_ids": [w["id"] for w in children]},
-    )
-
-    total = len(children)
-    for child in children:
-        total += _explore(
-            client,
-            child["id"],
-            child["lat"],
-            child["lon"],
-            depth - 1,
-            seen_api_ids,
-            seen_names,
-            target=random.randint(*CHILD_TARGET),
-        )
+    total = 0
+    level = 0
+    while level < depth and leaves:
+        next_leaves: list[dict[str, Any]] = []
+        for start in range(0, len(leaves), MAX_EXPLORE_LEAVES):
+            chunk = leaves[start : start + MAX_EXPLORE_LEAVES]
+            # Discover, link and visit the whole chunk in one request; the server skips seen POIs.
+            explored = cast(
+                dict[str, Any],
+                _api(
+                    client,
+                    "POST",
+                    "/api/batch",
+                    {
+                        "operations": [
+                            {
+                                "op": "explore",
+                                "args": {
+                                    "leaves": [
+                                        {
+                                            "waypoint_id": leaf["id"],
+                                            "lat": leaf["lat"],
+                                            "lon": leaf["lon"],
+                                            "num": ROOT_TARGET if level == 0 else random.randint(*CHILD_TARGET),
+                                        }
+                                        for leaf in chunk
+                                    ],
+                                    "radius": 5000,
+                                    "exclude_api_ids": sorted(seen_api_ids),
+                                    "exclude_names": sorted(seen_names),
+                                },
+                            },
+                            *(
+                                {"op": "set_visited", "args": {"waypoint_id": leaf["id"], "visited": True}}
+                                for leaf in chunk
+                            ),
+                        ]
+                    },
+                ),
+            )["results"][0]
+            for leaf in explored:
+                for child in leaf["children"]:
+                    if child.get("api_id"):
+                        seen_api_ids.add(child["api_id"])
+                    seen_names.add(child["name"])
+                    next_leaves.append(child)
+        total += len(next_leaves)
+        leaves = next_leaves
+        level += 1
     return total
 
 
+@profiled("seed")
 def seed() -> None:
     setup_logging()
     _wipe_sqlite()
 
-    from backend.app import SessionLocal, create_app
+    from backend.app import create_app
 
     app = create_app()
-    _reset(SessionLocal)
+    _reset(app.extensions["db_sessionmaker"])
 
     with app.test_client() as client:
         for p in PROFILES:
-            # Create user
-            user = cast(
-                dict[str, Any],
-                _api(
-                    client,
-                    "POST",
-                    "/api/user",
-                    {"username": p["username"], "lat": p["lat"], "lon": p["lon"]},
-                ),
-            )
-
-            # Create root waypoint
-            root = cast(
+            # Create user and root waypoint, then assign the root, in one request
+            user, root, _ = cast(
                 dict[str, Any],
                 _api(
                     client,
                     "POST",
-                    "/api/waypoint",
+                    "/api/batch",
                     {
-                        "api_id": p["api_id"],
-                        "lat": p["lat"],
-                        "lon": p["lon"],
-                        "name": p["name"],
+                        "operations": [
+                            {
+                                "op": "create_user",
+                                "ref": "user",
+                                "args": {"username": p["username"], "lat": p["lat"], "lon": p["lon"]},
+                            },
+                            {
+                                "op": "create_waypoint",
+                                "ref": "root",
+                                "args": {
+                                    "api_id": p["api_id"],
+                                    "lat": p["lat"],
+                                    "lon": p["lon"],
+                                    "name": p["name"],
+                                },
+                            },
+                            {
+                                "op": "set_root",
+                                "args": {
+                                    "user_id": {"$ref": "user"},
+                                    "root_waypoint_id": {"$ref": "root"},
+                                },
+                            },
+                        ]
                     },
                 ),
-            )
-
-            # Assign root to user
-            _api(
-                client,
-                "PATCH",
-                f"/api/user/{user['id']}/root",
-                {"root_waypoint_id": root["id"]},
-            )
+            )["results"]
 
             depth = p["explore_depth"]
             node_count = 1
             if depth > 0:
                 seen_api_ids = {p["api_id"]}
                 seen_names = {p["name"]}
-                node_count += _explore(
-                    client,
-                    root["id"],
-                    p["lat"],
-                    p["lon"],
-                    depth,
-                    seen_api_ids,
-                    seen_names,
-                )
+                node_count += _explore(client, [root], depth, seen_api_ids, seen_names)
 
             logger.success(
                 f"Seeded {p['username']} — root={root['id']} depth={depth} nodes={node_count}"